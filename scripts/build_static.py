@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Build the web interface assets: every file (except index.html) is copied under a
+content-hashed name, index.html is rewritten to reference the hashed names, and all
+files get precompressed .gz and .br (if the brotli module is available) variants.
+The server serves the hashed files as immutable, only index.html is revalidated.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+INDEX = "index.html"
+MANIFEST = "manifest.json"
+COMPRESSED_SUFFIXES = [".gz", ".br"]
+
+
+def write_asset(path: Path, data: bytes):
+    path.write_bytes(data)
+    # mtime=0 keeps the output reproducible
+    path.with_name(path.name + ".gz").write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        path.with_name(path.name + ".br").write_bytes(brotli.compress(data, quality=11))
+
+
+def remove_asset(path: Path):
+    for suffix in [""] + COMPRESSED_SUFFIXES:
+        path.with_name(path.name + suffix).unlink(missing_ok=True)
+
+
+def build(source: Path, target: Path):
+    target.mkdir(parents=True, exist_ok=True)
+    manifest_path = target / MANIFEST
+    if manifest_path.is_file():
+        # Remove the assets of the previous build
+        for name in json.loads(manifest_path.read_text()).values():
+            remove_asset(target / name)
+    manifest = {}
+    for path in sorted(source.iterdir()):
+        if not path.is_file() or path.name == INDEX:
+            continue
+        data = path.read_bytes()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        name = f"{path.stem}.{digest}{path.suffix}"
+        write_asset(target / name, data)
+        manifest[path.name] = name
+    index = (source / INDEX).read_text()
+    for original, name in manifest.items():
+        index = index.replace(f'"static/{original}"', f'"static/{name}"')
+    write_asset(target / INDEX, index.encode())
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the fingerprinted, precompressed web interface assets")
+    parser.add_argument("--source", help="Folder with the asset sources (static)", type=str, required=True)
+    parser.add_argument("--target", help="Output folder (the StaticFolder of the server)", type=str, required=True)
+    args = parser.parse_args()
+    manifest = build(Path(args.source), Path(args.target))
+    for original, name in manifest.items():
+        print(f"{original} -> {name}")
+    if brotli is None:
+        print("brotli module not found, only gzip variants were created")
+
+
+if __name__ == "__main__":
+    main()
@@ -38,6 +38,7 @@ rsync -avm --include='*.py' --exclude='*' "$SOURCE_DIR/" "$TARGET_DIR/"
 
 cp "$SOURCE_DIR/../network-configuration.default.conf" "$TARGET_DIR/"
 
-cp -r "$SOURCE_DIR/../static" "$TARGET_DIR/"
+# Fingerprinted and precompressed web interface assets
+python3 "$SOURCE_DIR/../scripts/build_static.py" --source "$SOURCE_DIR/../static" --target "$TARGET_DIR/static"
 
 echo "Copied all Python files from $SOURCE_DIR to $TARGET_DIR"
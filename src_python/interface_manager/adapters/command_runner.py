@@ -0,0 +1,198 @@
+import functools
+import os
+import signal
+import subprocess
+import threading
+import time
+
+
+class CommandTimeoutError(Exception):
+    pass
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Fail fast while the backend is unhealthy: after `threshold` consecutive failures (timeouts,
+    lost connection) the calls are rejected for `reset_s` seconds, then a single trial call
+    decides whether the backend has recovered.
+    """
+    STATE_CLOSED = "closed"
+    STATE_OPEN = "open"
+    STATE_HALF_OPEN = "half_open"
+
+    def __init__(self, threshold, reset_s):
+        self._threshold = threshold
+        self._reset_s = reset_s
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened = None
+        self._trial = False
+        self.last_error = None
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened is None:
+            return self.STATE_CLOSED
+        if time.monotonic() - self._opened < self._reset_s:
+            return self.STATE_OPEN
+        return self.STATE_HALF_OPEN
+
+    def before_call(self):
+        with self._lock:
+            state = self._state()
+            if state == self.STATE_OPEN or (state == self.STATE_HALF_OPEN and self._trial):
+                raise CircuitOpenError(f"Backend unhealthy, failing fast: {self.last_error}")
+            if state == self.STATE_HALF_OPEN:
+                self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened = None
+            self._trial = False
+
+    def release(self):
+        # The call says nothing about the health of the backend, a trial call is over
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self, error):
+        with self._lock:
+            self._failures += 1
+            self.last_error = f"{error}"
+            if self._trial or (self._threshold > 0 and self._failures >= self._threshold):
+                self._opened = time.monotonic()
+            self._trial = False
+
+
+class CommandRunner:
+    """
+    Run every command of an adapter under a deadline, locally (the process group is killed
+    when the deadline expires) or on the remote host. Timeouts and connection errors
+    feed a circuit breaker, commands are rejected while it is open.
+    """
+    # nmcli commands that activate a connection: they can time out without the backend being unhealthy
+    # (wrong passphrase, slow association)
+    ACTIVATIONS = [('connection', 'up'), ('wifi', 'connect'), ('wifi', 'hotspot')]
+
+    def __init__(self, timeout_s, nmcli_timeout_s, breaker_threshold, breaker_reset_s, host=None):
+        self.timeout_s = timeout_s
+        self.nmcli_timeout_s = nmcli_timeout_s
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset_s)
+        self._host = host
+        self._lock = threading.Lock()
+        self._executed = 0
+        self._timeouts = 0
+        self._rejected = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executed": self._executed,
+                "timeouts": self._timeouts,
+                "rejected": self._rejected,
+                "breaker": self.breaker.state,
+                "last_error": self.breaker.last_error
+            }
+
+    def guarded(self, function, *args, activation=False):
+        """
+        Call a function that talks to the backend through the circuit breaker
+
+        :param activation: a timeout is not a failure of the backend
+        """
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError:
+            with self._lock:
+                self._rejected += 1
+            raise
+        with self._lock:
+            self._executed += 1
+        try:
+            result = function(*args)
+        except CommandTimeoutError as e:
+            with self._lock:
+                self._timeouts += 1
+            if activation:
+                self.breaker.release()
+            else:
+                self.breaker.record_failure(e)
+            raise
+        except OSError as e:
+            # Includes the SSH errors, the command did not run
+            self.breaker.record_failure(e)
+            raise
+        except Exception:
+            # The backend answered, e.g. nmcli exited with an error
+            self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+    @staticmethod
+    def _run_process(args, timeout, shell=False, input=None, env=None):
+        # A new session, so the whole process group (sudo, shell and its children) can be killed
+        process = subprocess.Popen(args, shell=shell, env=env, start_new_session=True,
+                                   stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            stdout, stderr = process.communicate(input=input, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            process.communicate()
+            command = args if isinstance(args, str) else ' '.join(args)
+            raise CommandTimeoutError(f"'{command}' did not finish in {timeout} s, killed")
+        return process.returncode, stdout, stderr
+
+    def _nmcli_timeout(self, args):
+        # `nmcli --wait <seconds>` waits itself, the deadline comes on top
+        if '--wait' in args[:-1]:
+            try:
+                return max(self.nmcli_timeout_s, int(args[args.index('--wait') + 1]) + self.timeout_s)
+            except ValueError:
+                pass
+        return self.nmcli_timeout_s
+
+    def _is_activation(self, args):
+        return any(pair in self.ACTIVATIONS for pair in zip(args, args[1:]))
+
+    def run(self, args, input=None, capture_output=False, timeout=None, check=False, env=None, **kwargs):
+        """
+        subprocess.run() replacement for nmcli.SystemCommand, always with a deadline
+        """
+        timeout = timeout or self._nmcli_timeout(args)
+        activation = self._is_activation(args)
+        if self._host is not None:
+            return self.guarded(functools.partial(self._host.run, args, input=input, capture_output=capture_output,
+                                                   timeout=timeout, check=check), activation=activation)
+        returncode, stdout, stderr = self.guarded(self._run_process, args, timeout, False, input, env,
+                                                  activation=activation)
+        if check and returncode:
+            raise subprocess.CalledProcessError(returncode, args, output=stdout, stderr=stderr)
+        return subprocess.CompletedProcess(args, returncode, stdout, stderr)
+
+    def getoutput(self, command, timeout=None):
+        """
+        subprocess.getoutput() replacement with a deadline, stdout and stderr combined
+
+        :return:
+        The output without the trailing newline
+        """
+        timeout = timeout or self.timeout_s
+        if self._host is not None:
+            _, stdout, stderr = self.guarded(self._host.run_host_command, command, timeout)
+        else:
+            _, stdout, stderr = self.guarded(self._run_process, command, timeout, True)
+        return (stdout + stderr).decode("utf-8", errors="replace").rstrip('\n')
@@ -0,0 +1,83 @@
+import json
+import socket
+import struct
+import threading
+from .command_runner import CommandTimeoutError
+
+# Frame: 4 bytes big-endian payload length, then the JSON payload
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 1024 * 1024
+
+
+def _recv_exact(sock, size):
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise EOFError("Connection closed")
+        data += chunk
+    return data
+
+
+def send_frame(sock, message):
+    payload = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    sock.sendall(FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def recv_frame(sock):
+    (size,) = FRAME_HEADER.unpack(_recv_exact(sock, FRAME_HEADER.size))
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame of {size} bytes exceeds {MAX_FRAME_SIZE}")
+    return json.loads(_recv_exact(sock, size).decode('utf-8'))
+
+
+class HelperClient:
+    """
+    Client of the privileged helper (privileged_helper.py). One connection is kept open
+    and shared by the calls, it is reopened if the helper was restarted.
+    """
+
+    def __init__(self, socket_path, timeout_s):
+        self._socket_path = socket_path
+        self._timeout_s = timeout_s
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def _close(self):
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            sock.close()
+
+    def call(self, op, args):
+        """
+        :param op: operation, see privileged_helper.OPERATIONS
+        :param args: dictionary of the operation arguments
+        :return:
+        The output of the command
+        """
+        with self._lock:
+            for attempt in range(2):
+                reused = self._sock is not None
+                try:
+                    if self._sock is None:
+                        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                        sock.settimeout(self._timeout_s)
+                        sock.connect(self._socket_path)
+                        self._sock = sock
+                    send_frame(self._sock, {"op": op, "args": args})
+                    response = recv_frame(self._sock)
+                    break
+                except socket.timeout:
+                    self._close()
+                    raise CommandTimeoutError(f"Privileged helper did not answer {op} in {self._timeout_s} s")
+                except (BrokenPipeError, ConnectionResetError, EOFError) as e:
+                    self._close()
+                    # A connection left from before a helper restart, the request did not arrive
+                    if not reused or attempt:
+                        raise ConnectionError(f"Privileged helper connection lost: {e}") from e
+                except OSError:
+                    self._close()
+                    raise
+        if not response.get("ok"):
+            raise Exception(f"Privileged helper {op} failed: {response.get('error')}")
+        return response.get("output", "")
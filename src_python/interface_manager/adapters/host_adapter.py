@@ -1,9 +1,9 @@
 import logging
+import socket
 import subprocess
-import nmcli
-from nmcli import SystemCommand, ConnectionControl, DeviceControl, GeneralControl, NetworkingControl, RadioControl
 from paramiko.client import SSHClient
 from paramiko.ssh_exception import SSHException
+from .command_runner import CommandTimeoutError
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -13,29 +13,39 @@ class HostController:
     def __init__(self,
                  remote_host_port: int = 22,
                  remote_host_ssh_key: str = "",
-                 remote_host_hostname: str = "localhost"):
+                 remote_host_hostname: str = "localhost",
+                 connect_timeout_s: float = 10.0):
         self.remote_host_port = remote_host_port
         self.remote_host_ssh_key = remote_host_ssh_key
         self.remote_host_hostname = remote_host_hostname
+        self.connect_timeout_s = connect_timeout_s
         self.client: SSHClient | None = None
-        self.init_nmcli_interface()
 
     def ssh_connect(self):
         if self.client is None:
             try:
-                self.client = SSHClient()
-                self.client.load_system_host_keys()
+                client = SSHClient()
+                client.load_system_host_keys()
                 ssh_port = int(self.remote_host_port)
                 key_file = self.remote_host_ssh_key
                 hostname = self.remote_host_hostname
-                self.client.connect(hostname=hostname, port=ssh_port, key_filename=key_file)
+                client.connect(hostname=hostname, port=ssh_port, key_filename=key_file,
+                               timeout=self.connect_timeout_s, banner_timeout=self.connect_timeout_s,
+                               auth_timeout=self.connect_timeout_s)
+                self.client = client
                 logger.info('SSH Host connected')
             except Exception as e:
                 logger.error(f'Error connecting to the host: {e}')
+                raise ConnectionError(f'Error connecting to {self.remote_host_hostname}: {e}') from e
+
+    def ssh_disconnect(self):
+        client, self.client = self.client, None
+        if client is not None:
+            client.close()
 
     def run(self, *popenargs, input=None, capture_output=False, timeout=None, check=False, **kwargs):
         # logger.debug(f"Run nmcli with [{popenargs}] and [{kwargs}]")
-        # input and timeout are unused
+        # input is unused
         command = ''
         for arg in popenargs[0]:
             if ' ' in arg:
@@ -45,32 +55,34 @@ class HostController:
             command += ' '
         command = command[:-1]
 
-        try:
-            retcode, stdout, stderr = self.run_host_command(command)
-        except SSHException:  # Including KeyboardInterrupt, communicate handled that.
-            raise
+        retcode, stdout, stderr = self.run_host_command(command, timeout)
 
         if check and retcode:
             raise subprocess.CalledProcessError(retcode, command,
                                                 output=stdout, stderr=stderr)
         return subprocess.CompletedProcess(command, retcode, stdout, stderr)
 
-    def run_host_command(self, command):
+    def run_host_command(self, command, timeout=None):
+        """
+        :param timeout: deadline in seconds for the whole command, None to wait indefinitely
+        :return:
+        A tuple of retcode, stdout and stderr
+        """
         self.ssh_connect()
         logger.debug(f'SSH: {command}')
-        _, stdout, stderr = self.client.exec_command(command)
-        retcode = stdout.channel.recv_exit_status()
-        stdout = stdout.read()
-        stderr = stderr.read()
+        try:
+            _, stdout, stderr = self.client.exec_command(command, timeout=timeout)
+            if not stdout.channel.status_event.wait(timeout):
+                # The connection may be wedged, the next command reconnects
+                self.ssh_disconnect()
+                raise CommandTimeoutError(f"'{command}' on {self.remote_host_hostname} did not finish in {timeout} s")
+            retcode = stdout.channel.recv_exit_status()
+            stdout = stdout.read()
+            stderr = stderr.read()
+        except (SSHException, socket.timeout, EOFError) as e:
+            self.ssh_disconnect()
+            raise ConnectionError(f'SSH command failed on {self.remote_host_hostname}: {e}') from e
         logger.debug(f'retcode: {retcode}')
         logger.debug(f'OUT {stdout.decode("utf-8")}')
         logger.debug(f'ERR {stderr.decode("utf-8")}')
         return retcode, stdout, stderr
-
-    def init_nmcli_interface(self):
-        nmcli._syscmd = SystemCommand(subprocess_run=self.run)
-        nmcli.connection = ConnectionControl(nmcli._syscmd)
-        nmcli.device = DeviceControl(nmcli._syscmd)
-        nmcli.general = GeneralControl(nmcli._syscmd)
-        nmcli.networking = NetworkingControl(nmcli._syscmd)
-        nmcli.radio = RadioControl(nmcli._syscmd)
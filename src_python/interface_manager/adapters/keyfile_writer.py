@@ -0,0 +1,123 @@
+import os
+import tempfile
+import uuid
+
+
+class KeyfileWriter:
+    """
+    Render complete connection profiles as NetworkManager keyfiles and write them atomically
+    to the system connections directory, for a single `nmcli connection load`.
+    The settings use the nmcli property names (e.g. {'ipv4.method': 'manual'}).
+    """
+    # nmcli setting name to keyfile section
+    SECTIONS = {
+        '802-3-ethernet': 'ethernet',
+        '802-11-wireless': 'wifi',
+        '802-11-wireless-security': 'wifi-security'
+    }
+    # Enumerations that nmcli takes by name and the keyfile by number
+    NUMERIC_VALUES = {
+        'wifi.powersave': {'default': '0', 'ignore': '1', 'disable': '2', 'enable': '3'},
+        'wifi-security.pmf': {'default': '0', 'disable': '1', 'optional': '2', 'required': '3'}
+    }
+    # Settings that the keyfile separates with ';'
+    LIST_VALUES = ['ipv4.dns', 'ipv6.dns']
+    # Profiles written by this service get a stable UUID derived from the name
+    UUID_NAMESPACE = uuid.UUID('6c4a4bb2-3d1e-4f5f-9a0e-0c1b7d2f8e31')
+
+    def __init__(self, directory):
+        self._directory = directory
+
+    @property
+    def directory(self):
+        return self._directory
+
+    def is_writable(self):
+        return os.path.isdir(self._directory) and os.access(self._directory, os.W_OK)
+
+    @staticmethod
+    def _escape(value):
+        value = value.replace('\\', '\\\\').replace('\n', '\\n').replace('\t', '\\t')
+        if value.startswith(' '):
+            value = '\\s' + value[1:]
+        return value
+
+    def _convert(self, key, value):
+        """
+        :return:
+        A list of (key, value) for the keyfile, empty if the setting keeps its default
+        """
+        value = str(value)
+        section, name = key.split('.', 1)
+        if value == '' or value == 'ignore':
+            return []
+        if key in self.NUMERIC_VALUES:
+            return [(name, self.NUMERIC_VALUES[key].get(value, value))]
+        if section in ['ipv4', 'ipv6'] and name == 'addresses':
+            addresses = [address.strip() for address in value.split(',') if address.strip()]
+            return [(f'address{index + 1}', address) for index, address in enumerate(addresses)]
+        if key in self.LIST_VALUES:
+            return [(name, ''.join(f'{server};' for server in value.replace(',', ' ').split()))]
+        if value in ['yes', 'on']:
+            return [(name, 'true')]
+        if value in ['no', 'off']:
+            return [(name, 'false')]
+        return [(name, value)]
+
+    def render(self, name, conn_type, ifname, settings, profile_uuid=None):
+        """
+        :param conn_type: 'ethernet' or 'wifi'
+        :param profile_uuid: UUID of the existing profile that is replaced, None for a new one
+        :return:
+        The keyfile content
+        """
+        sections = {
+            'connection': {
+                'id': name,
+                'uuid': profile_uuid or str(uuid.uuid5(self.UUID_NAMESPACE, name)),
+                'type': conn_type,
+                'interface-name': ifname
+            },
+            conn_type: {}
+        }
+        for key, value in settings.items():
+            setting, property_name = key.split('.', 1)
+            section = self.SECTIONS.get(setting, setting)
+            for keyfile_key, keyfile_value in self._convert(f'{section}.{property_name}', value):
+                sections.setdefault(section, {})[keyfile_key] = keyfile_value
+        lines = []
+        for section, values in sections.items():
+            lines.append(f'[{section}]')
+            lines += [f'{key}={self._escape(value)}' for key, value in values.items()]
+            lines.append('')
+        return '\n'.join(lines)
+
+    def write(self, name, content):
+        """
+        Replace the keyfile of the profile atomically, readable by root only (it can contain secrets)
+
+        :return:
+        The path of the keyfile
+        """
+        path = os.path.join(self._directory, f"{name.replace('/', '_')}.nmconnection")
+        fd, temp_path = tempfile.mkstemp(dir=self._directory, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                file.write(content)
+                file.flush()
+                os.fsync(file.fileno())
+            os.chmod(temp_path, 0o600)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return path
+
+    def sync(self):
+        # Make the renames durable before NetworkManager is asked to load the files
+        fd = os.open(self._directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
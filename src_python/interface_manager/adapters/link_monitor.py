@@ -0,0 +1,76 @@
+import logging
+import socket
+import struct
+import threading
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+RTMGRP_LINK = 1
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+IFLA_IFNAME = 3
+
+NLMSG_HEADER = struct.Struct("=IHHII")
+IFINFO_HEADER = struct.Struct("=BxHiII")
+RTATTR_HEADER = struct.Struct("=HH")
+
+
+class LinkMonitor:
+    """
+    Listen for kernel link add/remove notifications (rtnetlink RTMGRP_LINK)
+    and report them as ('added' | 'removed', ifname) through the callback.
+    Link state changes of already known devices are not reported.
+    """
+
+    def __init__(self, callback):
+        self._callback = callback
+        self._known = {}
+        self._socket = None
+        self._thread = None
+
+    def start(self):
+        self._socket = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        self._socket.bind((0, RTMGRP_LINK))
+        self._known = {index: name for index, name in socket.if_nameindex()}
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        logger.info("Link monitor started")
+
+    def _run(self):
+        while True:
+            try:
+                data = self._socket.recv(65536)
+                for event, ifname in self._parse(data):
+                    logger.info(f"Link {ifname} {event}")
+                    self._callback(event, ifname)
+            except Exception as e:
+                logger.error(f"Exception in link monitor: {e}")
+
+    def _parse(self, data):
+        offset = 0
+        while offset + NLMSG_HEADER.size <= len(data):
+            msg_len, msg_type, _, _, _ = NLMSG_HEADER.unpack_from(data, offset)
+            if msg_len < NLMSG_HEADER.size:
+                break
+            if msg_type in (RTM_NEWLINK, RTM_DELLINK):
+                _, _, index, _, _ = IFINFO_HEADER.unpack_from(data, offset + NLMSG_HEADER.size)
+                ifname = self._ifname(data, offset + NLMSG_HEADER.size + IFINFO_HEADER.size, offset + msg_len)
+                if msg_type == RTM_NEWLINK and index not in self._known:
+                    self._known[index] = ifname
+                    yield 'added', ifname
+                elif msg_type == RTM_DELLINK and index in self._known:
+                    yield 'removed', self._known.pop(index)
+            offset += (msg_len + 3) & ~3
+
+    @staticmethod
+    def _ifname(data, offset, end):
+        while offset + RTATTR_HEADER.size <= end:
+            attr_len, attr_type = RTATTR_HEADER.unpack_from(data, offset)
+            if attr_len < RTATTR_HEADER.size:
+                break
+            if attr_type == IFLA_IFNAME:
+                return data[offset + RTATTR_HEADER.size:offset + attr_len].split(b'\0', 1)[0].decode()
+            offset += (attr_len + 3) & ~3
+        return ""
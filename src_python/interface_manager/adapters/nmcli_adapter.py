@@ -1,45 +1,128 @@
+import functools
+import json
 import logging
+import os
+import random
 import re
-import subprocess
-import nmcli
+import socket
+import struct
+import time
+from nmcli import SystemCommand, ConnectionControl, DeviceControl
 from ifconfigparser import IfconfigParser
+from .command_runner import CommandRunner
+from .helper_client import HelperClient
+from .keyfile_writer import KeyfileWriter
 from .host_adapter import HostController
+from .link_monitor import LinkMonitor
+from .single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
+def _changes_state(method):
+    # Results of the read-only queries can't be shared after the system has changed
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._queries.invalidate()
+    return wrapper
+
+
 class NMCliAdapter:
     def __init__(self, use_sudo: bool = False,
                  dry_run: bool = False,
                  remote_host: bool = False,
                  remote_host_port: int = 22,
                  remote_host_ssh_key: str = "",
-                 remote_host_hostname: str = "localhost"):
+                 remote_host_hostname: str = "localhost",
+                 query_cache_s: float = 0.0,
+                 command_timeout_s: float = 10.0,
+                 nmcli_timeout_s: float = 30.0,
+                 breaker_threshold: int = 3,
+                 breaker_reset_s: float = 30.0,
+                 helper_socket: str = "",
+                 profile_engine: str = "nmcli",
+                 keyfile_directory: str = "/etc/NetworkManager/system-connections"):
         self._use_sudo = use_sudo
-        if not self._use_sudo:
-            nmcli.disable_use_sudo()
+        self._queries = SingleFlight(ttl_s=query_cache_s)
 
         self._dry_run = dry_run
         self._remote_host = remote_host
         if self._remote_host:
-            # HostController also redirects nmcli during initialisation
-            self._host = HostController(remote_host_port, remote_host_ssh_key, remote_host_hostname)
+            self._host = HostController(remote_host_port, remote_host_ssh_key, remote_host_hostname,
+                                        connect_timeout_s=command_timeout_s)
         else:
             self._host = None
+        # Every command (nmcli included) runs under a deadline and fails fast while the backend is unhealthy
+        self._runner = CommandRunner(command_timeout_s, nmcli_timeout_s, breaker_threshold, breaker_reset_s,
+                                     host=self._host)
+        self._syscmd = SystemCommand(subprocess_run=self._runner.run)
+        # nmcli waits 90 s for an activation by default, it must give up before the deadline kills it
+        self._activation_wait_s = max(1, int(nmcli_timeout_s - command_timeout_s))
+        self._helper = None
+        if helper_socket and not self._remote_host:
+            self._helper = HelperClient(helper_socket, command_timeout_s)
+        self._keyfiles = None
+        if profile_engine == "keyfile":
+            keyfiles = KeyfileWriter(keyfile_directory)
+            if self._remote_host:
+                logger.warning("Keyfile profiles can't be written to a remote host, using nmcli")
+            elif not keyfiles.is_writable() and not self._dry_run:
+                logger.warning(f"{keyfile_directory} is not writable, using nmcli for the profiles")
+            else:
+                self._keyfiles = keyfiles
+        elif profile_engine != "nmcli":
+            raise ValueError(f"Unknown profile engine {profile_engine}, available engines are: nmcli, keyfile")
+        if not self._use_sudo:
+            self._syscmd.disable_use_sudo()
+        # Every adapter has its own nmcli controls, so adapters of several hosts can be used at the same time
+        self._nmcli_connection = ConnectionControl(self._syscmd)
+        self._nmcli_device = DeviceControl(self._syscmd)
 
     def run_command(self, command):
         prefix = ''
         if self._use_sudo:
             prefix = 'sudo '
-        logger.info(f"Run command {prefix}{command}")
-        if self._remote_host:
-            self._host.run_host_command(f'{prefix}{command}')
-        else:
-            return subprocess.getoutput(f'{prefix}{command}')
+        logger.debug(f"Run command {prefix}{command}")
+        return self._runner.getoutput(f'{prefix}{command}')
+
+    def run_privileged(self, command, op, args):
+        """
+        Run a privileged operation through the helper (privileged_helper.py) if it is used,
+        otherwise run the command
+
+        :param op: helper operation
+        :param args: dictionary of the operation arguments
+        """
+        if self._helper is None:
+            return self.run_command(command)
+        logger.debug(f"Run helper {op} {args}")
+        return self._runner.guarded(self._helper.call, op, args)
+
+    def query_stats(self):
+        """
+        Get the counters of the read-only queries
+
+        :return:
+        A dictionary with 'executed', 'deduplicated' (shared with a call in flight),
+        'cached' (served from the recent results) and 'in_flight' counters
+        """
+        return self._queries.stats()
+
+    def command_stats(self):
+        """
+        Get the counters of the external commands
+
+        :return:
+        A dictionary with 'executed', 'timeouts' and 'rejected' (while the backend was unhealthy)
+        counters, the circuit 'breaker' state (closed, open, half_open) and the 'last_error'
+        """
+        return self._runner.stats()
 
-    @staticmethod
-    def device():
+    def device(self):
         """
         Get a list of network devices
 
@@ -48,57 +131,104 @@ class NMCliAdapter:
         device_type can be 'wifi' or 'ethernet'
         device is the network adapter name (eg. wlan0, eth0, etc.)
         """
-        device = nmcli.device()
-        logger.info(f"nmcli.device: {device}")
+        device = self._queries.do('device', self._nmcli_device)
+        logger.debug(f"nmcli.device: {device}")
         return device
 
-    @staticmethod
-    def connection():
+    def link_monitor(self, callback):
+        """
+        Start watching for network devices being added or removed
+
+        :param callback: called as callback(event, ifname), event is 'added' or 'removed'
+        :return:
+        The started monitor, or None if events are not available (remote host)
+        """
+        if self._remote_host:
+            return None
+        monitor = LinkMonitor(callback)
+        monitor.start()
+        return monitor
+
+    def connection(self):
         """
         Get a list of connections
 
         :return:
         A list of 'connection' items that should have properties: 'name';
         """
-        connection = nmcli.connection()
-        logger.info(f"nmcli.connection: {connection}")
+        connection = self._queries.do('connection', self._nmcli_connection)
+        logger.debug(f"nmcli.connection: {connection}")
         return connection
 
+    @_changes_state
     def connection_add(self, conn_type, options, ifname, autoconnect, ssid=None):
         logger.info(f"nmcli.connection.add conn_type={conn_type}, options={options}, ifname={ifname}, autoconnect={autoconnect}, ssid={ssid}")
         if self._dry_run:
             return
         if ssid is None:
-            return nmcli.connection.add(conn_type=conn_type, options=options, ifname=ifname, autoconnect=autoconnect)
+            return self._nmcli_connection.add(conn_type=conn_type, options=options, ifname=ifname, autoconnect=autoconnect)
         else:
-            return nmcli.connection.add(conn_type=conn_type, options=options | {"ssid": ssid}, ifname=ifname, autoconnect=autoconnect)
+            return self._nmcli_connection.add(conn_type=conn_type, options=options | {"ssid": ssid}, ifname=ifname, autoconnect=autoconnect)
 
-    @staticmethod
-    def device_wifi(ifname):
+    def device_wifi(self, ifname):
         """
 
         :param ifname:
         :return:
         result.ssid
         """
-        return nmcli.device.wifi(ifname=ifname)
+        return self._nmcli_device.wifi(ifname=ifname)
 
-    @staticmethod
-    def device_status():
-        return nmcli.device.status()
+    def device_status(self):
+        return self._queries.do('device_status', self._nmcli_device.status)
+
+    @_changes_state
+    def provision_profiles(self, profiles):
+        """
+        Create or replace complete connection profiles in one pass. With the keyfile engine
+        all profiles are written to the system connections directory and loaded with one nmcli call,
+        otherwise every profile is added if missing and set with one modify.
+
+        :param profiles: list of dictionaries with 'name', 'type' ('ethernet' or 'wifi'), 'ifname'
+                         and 'settings' (nmcli properties, e.g. {'ipv4.method': 'manual'})
+        """
+        if not profiles:
+            return
+        logger.info(f"Provision profiles {', '.join(profile['name'] for profile in profiles)} "
+                    f"({'keyfile' if self._keyfiles is not None else 'nmcli'})")
+        if self._dry_run:
+            return
+        existing = {connection.name: connection.uuid for connection in self.connection()}
+        if self._keyfiles is not None:
+            paths = [self._keyfiles.write(profile['name'],
+                                          self._keyfiles.render(profile['name'], profile['type'], profile['ifname'],
+                                                                profile['settings'], existing.get(profile['name'])))
+                     for profile in profiles]
+            self._keyfiles.sync()
+            self._syscmd.nmcli(['connection', 'load'] + paths)
+            return
+        for profile in profiles:
+            if profile['name'] not in existing:
+                self.connection_add(conn_type=profile['type'], options={'con-name': profile['name']},
+                                    ifname=profile['ifname'], autoconnect=False,
+                                    ssid=profile['settings'].get('802-11-wireless.ssid'))
+            self.connection_modify(name=profile['name'], options=profile['settings'])
 
+    @_changes_state
     def connection_modify(self, name, options):
-        logger.info(f"nmcli.connection.modify name={name}, options={options}")
+        logged = {key: '***' if key.endswith('.psk') else value for key, value in options.items()}
+        logger.info(f"nmcli.connection.modify name={name}, options={logged}")
         if self._dry_run:
             return
-        return nmcli.connection.modify(name=name, options=options)
+        return self._nmcli_connection.modify(name=name, options=options)
 
+    @_changes_state
     def connection_down(self, name, wait, ignore_error=False):
         logger.info(f"nmcli.connection.down name={name} wait={wait}")
         if self._dry_run:
             return
         try:
-            return nmcli.connection.down(name=name, wait=wait)
+            return self._nmcli_connection.down(name=name, wait=wait)
         except Exception as e:
             if ignore_error:
                 logger.warning(f"Ignored error: {e}")
@@ -106,17 +236,18 @@ class NMCliAdapter:
             else:
                 raise e
 
+    @_changes_state
     def connection_up(self, name, wait):
         logger.info(f"nmcli.connection.up name={name} wait={wait}")
         if self._dry_run:
             return
-        return nmcli.connection.up(name=name, wait=wait)
+        return self._nmcli_connection.up(name=name, wait=wait)
 
     def connection_show(self, name):
-        logger.info(f"nmcli.connection.show name={name}")
+        logger.debug(f"nmcli.connection.show name={name}")
         if self._dry_run:
             return
-        return nmcli.connection.show(name=name)
+        return self._nmcli_connection.show(name=name)
 
     # def radio_wifi_off(self):
     #     logger.info(f"nmcli.radio.wifi_off")
@@ -130,70 +261,388 @@ class NMCliAdapter:
     #         return
     #     return nmcli.radio.wifi_on()
 
-    def device_wifi_connect(self, ssid, password):
-        logger.info(f"nmcli.device.wifi_connect ssid={ssid}, password={password}")
+    @_changes_state
+    def device_wifi_connect(self, ssid, password, ifname=None, bssid=None):
+        logger.info(f"nmcli.device.wifi_connect ssid={ssid}, password=***, ifname={ifname}, bssid={bssid}")
         if self._dry_run:
             return
-        return nmcli.device.wifi_connect(ssid=ssid, password=password)
+        if bssid is None:
+            return self._nmcli_device.wifi_connect(ssid=ssid, password=password, ifname=ifname,
+                                                   wait=self._activation_wait_s)
+        # The nmcli package does not support selecting the BSSID
+        cmd = ['--wait', str(self._activation_wait_s), 'device', 'wifi', 'connect', ssid, 'password', password,
+               'bssid', bssid]
+        if ifname is not None:
+            cmd += ['ifname', ifname]
+        output = self._syscmd.nmcli(cmd)
+        if re.search(r'Connection activation failed:', output):
+            raise Exception('Connection activation failed')
 
+    @_changes_state
+    def device_reapply(self, ifname):
+        logger.info(f"nmcli.device.reapply ifname={ifname}")
+        if self._dry_run:
+            return
+        return self._nmcli_device.reapply(ifname=ifname)
+
+    @_changes_state
     def connection_delete(self, name):
         logger.info(f"nmcli.connection.delete name={name}")
         if self._dry_run:
             return
-        return nmcli.connection.delete(name=name)
+        return self._nmcli_connection.delete(name=name)
 
-    def device_wifi_hotspot(self, con_name, ifname, ssid, password):
-        logger.info(f"nmcli.device.wifi_hotspot con_name={con_name}, ifname={ifname}, ssid={ssid}, password={password}")
+    @_changes_state
+    def device_wifi_hotspot(self, con_name, ifname, ssid, password, band=None, channel=None):
+        logger.info(f"nmcli.device.wifi_hotspot con_name={con_name}, ifname={ifname}, ssid={ssid}, password=***, band={band}, channel={channel}")
         if self._dry_run:
             return
-        nmcli.device.wifi_hotspot(con_name=con_name, ifname=ifname, ssid=ssid, password=password)
+        # The nmcli package does not support the wait option of the hotspot
+        cmd = ['--wait', str(self._activation_wait_s), 'device', 'wifi', 'hotspot', 'ifname', ifname,
+               'con-name', con_name, 'ssid', ssid, 'password', password]
+        if band is not None:
+            cmd += ['band', band]
+        if channel is not None:
+            cmd += ['channel', str(channel)]
+        self._syscmd.nmcli(cmd)
 
+    @_changes_state
     def stop_dnsmasq(self):
         if self._dry_run:
             return
         self.run_command("killall dnsmasq")
 
+    @_changes_state
     def stop_hostapd(self):
         if self._dry_run:
             return
         self.run_command("killall hostapd")
 
+    @_changes_state
     def iw_add_interface(self, phy_name, device, device_type):
         if self._dry_run:
             return
-        self.run_command(f'iw phy {phy_name} interface add {device} type {device_type}')
+        self.run_privileged(f'iw phy {phy_name} interface add {device} type {device_type}', 'add_interface',
+                            {"phy": phy_name, "device": device, "type": device_type})
 
+    @_changes_state
     def ip_link_set_dev_address(self, device, mac):
         if self._dry_run:
             return
-        self.run_command(f'ip link set dev {device} address {mac}')
+        self.run_privileged(f'ip link set dev {device} address {mac}', 'set_mac', {"device": device, "mac": mac})
 
+    @_changes_state
     def ip_link_set_up(self, device):
         if self._dry_run:
             return
-        self.run_command(f'ip link set {device} up')
+        self.run_privileged(f'ip link set {device} up', 'link_up', {"device": device})
 
+    @_changes_state
     def ip_link_set_down(self, device):
         if self._dry_run:
             return
-        self.run_command(f'ip link set {device} down')
+        self.run_privileged(f'ip link set {device} down', 'link_down', {"device": device})
 
+    @_changes_state
     def enable_ip_forward(self, enable_ip_forward):
         if self._dry_run:
             return
-        self.run_command(f'sysctl -w net.ipv4.ip_forward= {enable_ip_forward}')
+        self.run_privileged(f'sysctl -w net.ipv4.ip_forward= {enable_ip_forward}', 'sysctl',
+                            {"key": "net.ipv4.ip_forward", "value": f"{enable_ip_forward}"})
 
     def ifconfig(self, device):
-        ifconfig_output = self.run_command(f'ifconfig {device}')
+        ifconfig_output = self._queries.do(('ifconfig', device), self.run_privileged, f'ifconfig {device}',
+                                           'read_addresses', {"device": device})
         interfaces = IfconfigParser(console_output=ifconfig_output)
         iface = interfaces.get_interface(name=device)
         return iface
 
+    def interface_statistics(self, device):
+        """
+        Read the statistics counters of the device (/sys/class/net/<device>/statistics)
+
+        :return:
+        A dictionary of counter name to value, e.g. 'rx_bytes', 'tx_bytes', 'rx_packets'
+        """
+        path = f'/sys/class/net/{device}/statistics'
+        counters = {}
+        if self._remote_host:
+            output = self.run_command(f'grep -r . {path}')
+            for line in output.splitlines():
+                name, _, value = line.rpartition(':')
+                if value.isdigit():
+                    counters[name.rsplit('/', 1)[-1]] = int(value)
+            if not counters:
+                raise FileNotFoundError(f"No statistics for {device}")
+            return counters
+        for name in os.listdir(path):
+            with open(os.path.join(path, name)) as file:
+                try:
+                    counters[name] = int(file.read())
+                except (OSError, ValueError):
+                    pass
+        return counters
+
+    def read_sysfs(self, device, name):
+        """
+        Read /sys/class/net/<device>/<name>
+
+        :return:
+        The value as a string, None if it can't be read (e.g. speed of a link that is down)
+        """
+        path = f'/sys/class/net/{device}/{name}'
+        if self._remote_host:
+            output = self.run_command(f'cat {path} 2>/dev/null')
+            return output.strip() or None
+        try:
+            with open(path) as file:
+                return file.read().strip()
+        except OSError:
+            return None
+
+    def ethtool_features(self, device):
+        """
+        Get the offload features of the device (ethtool -k <device>)
+
+        :return:
+        A dictionary of feature name (e.g. 'generic-receive-offload') to a dictionary
+        with 'enabled' and 'fixed' (can't be changed) flags
+        """
+        output = self.run_command(f'ethtool -k {device}')
+        features = {}
+        for match in re.finditer(r"^\s*([\w-]+):\s*(on|off)(\s*\[fixed\])?", output, re.MULTILINE):
+            features[match.group(1)] = {"enabled": match.group(2) == "on", "fixed": match.group(3) is not None}
+        return features
+
+    def ethernet_capabilities(self, device):
+        """
+        Get what can be configured on the device
+
+        :return:
+        A dictionary with 'min_mtu', 'max_mtu' (None if unknown), 'link_modes' (a list of
+        (speed in Mb/s, 'full' | 'half')) and 'features' (see ethtool_features())
+        """
+        capabilities = {"min_mtu": None, "max_mtu": None, "link_modes": [], "features": {}}
+        output = self.run_command(f'ip -d link show dev {device}')
+        match = re.search(r"minmtu (\d+)", output)
+        if match:
+            capabilities["min_mtu"] = int(match.group(1))
+        match = re.search(r"maxmtu (\d+)", output)
+        if match:
+            capabilities["max_mtu"] = int(match.group(1))
+        output = self.run_command(f'ethtool {device}')
+        match = re.search(r"Supported link modes:(.*?)\n\s*[\w ]+:", output, re.DOTALL)
+        if match:
+            for speed, duplex in re.findall(r"(\d+)base\w+/(Full|Half)", match.group(1)):
+                mode = (int(speed), duplex.lower())
+                if mode not in capabilities["link_modes"]:
+                    capabilities["link_modes"].append(mode)
+        capabilities["features"] = self.ethtool_features(device)
+        return capabilities
+
+    def qdisc_show(self, device):
+        """
+        Get the root queue discipline of the device and its statistics (tc -s qdisc show)
+
+        :return:
+        A dictionary with 'kind' (e.g. 'fq_codel', 'cake', 'noqueue'), 'bytes', 'packets',
+        'drops', 'overlimits', 'requeues', 'backlog' (bytes) and 'qlen' (packets)
+        """
+        output = self.run_command(f'tc -s -j qdisc show dev {device} root')
+        try:
+            qdiscs = json.loads(output)
+        except ValueError:
+            raise Exception(f"Failed to read the queue discipline of {device}: {output}")
+        if not qdiscs:
+            raise Exception(f"No queue discipline on {device}")
+        qdisc = qdiscs[0]
+        status = {"kind": qdisc.get("kind")}
+        for counter in ["bytes", "packets", "drops", "overlimits", "requeues", "backlog", "qlen"]:
+            status[counter] = qdisc.get(counter)
+        return status
+
+    @_changes_state
+    def qdisc_replace(self, device, kind, bandwidth=None):
+        """
+        Set the root queue discipline of the device, bandwidth (e.g. '20mbit') is only supported by cake
+        """
+        logger.info(f"tc qdisc replace device={device} kind={kind} bandwidth={bandwidth}")
+        if self._dry_run:
+            return
+        command = f'tc qdisc replace dev {device} root {kind}'
+        if bandwidth is not None:
+            command += f' bandwidth {bandwidth}'
+        output = self.run_command(command)
+        # tc is silent on success
+        if output:
+            raise Exception(f"Failed to set the queue discipline of {device}: {output}")
+
+    @_changes_state
+    def qdisc_delete(self, device):
+        """
+        Remove the root queue discipline of the device, the kernel default is used again
+        """
+        logger.info(f"tc qdisc delete device={device}")
+        if self._dry_run:
+            return
+        self.run_command(f'tc qdisc del dev {device} root')
+
+    def bond_status(self, bond):
+        """
+        Get the state of a bond and its ports (/proc/net/bonding/<bond>)
+
+        :return:
+        A dictionary with 'mode', 'active_port' (active-backup mode, else None) and 'ports',
+        a dictionary of port name to 'mii_status', 'speed', 'duplex' and 'link_failures'
+        """
+        path = f'/proc/net/bonding/{bond}'
+        if self._remote_host:
+            output = self.run_command(f'cat {path}')
+        else:
+            with open(path) as file:
+                output = file.read()
+        status = {"mode": None, "active_port": None, "ports": {}}
+        match = re.search(r"Bonding Mode:\s*(.+)", output)
+        if match:
+            status["mode"] = match.group(1).strip()
+        match = re.search(r"Currently Active Slave:\s*(\S+)", output)
+        if match and match.group(1) != "None":
+            status["active_port"] = match.group(1)
+        for block in re.split(r"\n(?=Slave Interface:)", output)[1:]:
+            port = re.search(r"Slave Interface:\s*(\S+)", block).group(1)
+            port_status = {"mii_status": None, "speed": None, "duplex": None, "link_failures": None}
+            match = re.search(r"MII Status:\s*(\S+)", block)
+            if match:
+                port_status["mii_status"] = match.group(1)
+            match = re.search(r"Speed:\s*(\d+)", block)
+            if match:
+                port_status["speed"] = int(match.group(1))
+            match = re.search(r"Duplex:\s*(\S+)", block)
+            if match:
+                port_status["duplex"] = match.group(1)
+            match = re.search(r"Link Failure Count:\s*(\d+)", block)
+            if match:
+                port_status["link_failures"] = int(match.group(1))
+            status["ports"][port] = port_status
+        return status
+
     def iw_dev_link(self, device):
-        iw_output = self.run_command(f'iw dev {device} link')
+        return self.iw_dev_link_info(device)["ssid"]
+
+    def iw_dev_power_save(self, device):
+        """
+        Get the effective power save state of a Wi-Fi device (iw dev <device> get power_save)
+
+        :return:
+        True if power save is on, False if off, None if unknown
+        """
+        output = self.run_command(f'iw dev {device} get power_save')
+        match = re.search(r"Power save:\s*(on|off)", output)
+        if match is None:
+            return None
+        return match.group(1) == "on"
+
+    @_changes_state
+    def iw_dev_set_power_save(self, device, enabled):
+        logger.info(f"iw set power_save device={device} enabled={enabled}")
+        if self._dry_run:
+            return
+        self.run_command(f'iw dev {device} set power_save {"on" if enabled else "off"}')
+
+    def iw_dev_link_info(self, device):
+        """
+        Get the station link of the device (iw dev <device> link)
+
+        :return:
+        A dictionary with 'ssid', 'bssid' ('' if not connected), 'freq' (MHz), 'signal' (dBm),
+        'tx_bitrate' and 'rx_bitrate' (MBit/s); values not reported are None
+        """
+        iw_output = self._queries.do(('iw_dev_link', device), self.run_command, f'iw dev {device} link')
+        link = {"ssid": "", "bssid": "", "freq": None, "signal": None, "tx_bitrate": None, "rx_bitrate": None}
+        match = re.search(r"Connected to\s+([0-9a-fA-F:]{17})", iw_output)
+        if match:
+            link["bssid"] = match.group(1).lower()
         match = re.search(r"SSID:\s*(.+)", iw_output)
         if match:
-            ssid = match.group(1)
-        else:
-            ssid = ""
-        return ssid
+            link["ssid"] = match.group(1)
+        match = re.search(r"freq:\s*([\d.]+)", iw_output)
+        if match:
+            link["freq"] = round(float(match.group(1)))
+        match = re.search(r"signal:\s*(-?\d+)\s*dBm", iw_output)
+        if match:
+            link["signal"] = int(match.group(1))
+        match = re.search(r"tx bitrate:\s*([\d.]+)\s*MBit/s", iw_output)
+        if match:
+            link["tx_bitrate"] = float(match.group(1))
+        match = re.search(r"rx bitrate:\s*([\d.]+)\s*MBit/s", iw_output)
+        if match:
+            link["rx_bitrate"] = float(match.group(1))
+        return link
+
+    def probe_icmp(self, device, host, timeout):
+        """
+        Ping the host through the device
+
+        :return:
+        Round trip time in seconds or None if the host is not reachable
+        """
+        # Without sudo, ping does not need root and the sudoers rules don't allow it
+        output = self._runner.getoutput(f'ping -n -c 1 -W {max(1, round(timeout))} -I {device} {host}')
+        match = re.search(r"time=([\d.]+)\s*ms", output or "")
+        if match:
+            return float(match.group(1)) / 1000
+        return None
+
+    def probe_tcp(self, device, host, port, timeout):
+        """
+        Open a TCP connection to the host through the device (a refused connection also
+        proves that the host is reachable). ICMP is used with a remote host.
+
+        :return:
+        Connection time in seconds or None if the host is not reachable
+        """
+        if self._remote_host:
+            return self.probe_icmp(device, host, timeout)
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, device.encode())
+            sock.settimeout(timeout)
+            start = time.monotonic()
+            try:
+                sock.connect((host, port))
+            except ConnectionRefusedError:
+                pass
+            except PermissionError:
+                raise
+            except OSError:
+                return None
+            return time.monotonic() - start
+
+    def probe_dns(self, device, server, name, timeout):
+        """
+        Resolve the name (A record) with the DNS server through the device.
+        ICMP is used with a remote host.
+
+        :return:
+        Query time in seconds or None if the server did not answer
+        """
+        if self._remote_host:
+            return self.probe_icmp(device, server, timeout)
+        query_id = random.getrandbits(16)
+        query = struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0)
+        for label in name.strip('.').split('.'):
+            query += bytes([len(label)]) + label.encode()
+        query += b'\0' + struct.pack("!HH", 1, 1)
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_BINDTODEVICE, device.encode())
+            sock.settimeout(timeout)
+            start = time.monotonic()
+            try:
+                sock.sendto(query, (server, 53))
+                while True:
+                    reply = sock.recv(512)
+                    if len(reply) >= 2 and struct.unpack("!H", reply[:2])[0] == query_id:
+                        return time.monotonic() - start
+            except PermissionError:
+                raise
+            except OSError:
+                return None
@@ -0,0 +1,80 @@
+import threading
+import time
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Run at most one call per key at a time: concurrent callers with the same key
+    wait for the call in flight and share its result. Results can be kept for
+    `ttl_s` seconds, invalidate() drops them (call it after changing the system).
+    """
+
+    def __init__(self, ttl_s: float = 0.0):
+        self._ttl_s = ttl_s
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._results = {}
+        self._generation = 0
+        self._executed = 0
+        self._deduplicated = 0
+        self._cached = 0
+
+    def do(self, key, function, *args):
+        with self._lock:
+            if self._ttl_s > 0:
+                cached = self._results.get(key)
+                if cached is not None and time.monotonic() - cached[0] < self._ttl_s:
+                    self._cached += 1
+                    return cached[1]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._executed += 1
+                generation = self._generation
+            else:
+                self._deduplicated += 1
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function(*args)
+        except Exception as e:
+            call.error = e
+        finally:
+            with self._lock:
+                # invalidate() may have detached the call already
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                if call.error is None and self._ttl_s > 0 and generation == self._generation:
+                    self._results[key] = (time.monotonic(), call.result)
+            call.event.set()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._results.clear()
+            # Calls in flight started before the change, the next callers start new ones
+            self._calls.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executed": self._executed,
+                "deduplicated": self._deduplicated,
+                "cached": self._cached,
+                "in_flight": len(self._calls)
+            }
@@ -2,13 +2,15 @@ import logging
 import time
 from enum import Enum
 
+from .channel_planner import ChannelPlanner, ChannelPlanning
+from .config_watcher import ConfigWatcher
 from .network_interface_base import InterfaceTypes, NetworkInterface
 from .adapters.nmcli_adapter import NMCliAdapter
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-class APInterface(NetworkInterface):
+class APInterface(ChannelPlanning, NetworkInterface):
     WAIT_FOR_CONNECTION_UP_S = 5
 
     class ConnectionType(str, Enum):
@@ -29,9 +31,12 @@ class APInterface(NetworkInterface):
         if not device:
             device = def_config.get('AP', 'APInterfaceDevice')
         super().__init__(device, adapter, def_config)
+        self._hotspot_connection = 'hotspot'
         self._ip_read_only = False
         self._ssid = ""
         self._passphrase = ""
+        self._power_save_state = None
+        self._channel_planner = ChannelPlanner(def_config)
         self._load_defaults()
 
     def _load_defaults(self):
@@ -43,27 +48,51 @@ class APInterface(NetworkInterface):
         self._ip = self._def_config.get('AP', 'DefaultAPIP')
         self._mask = self._def_config.get('AP', 'DefaultAPMask')
         self._route = self._def_config.get('AP', 'DefaultAPRoute')
+        self._power_save = self._parse_power_save(self._def_config.get('AP', 'DefaultAPPowerSave'))
+
+    def apply_def_config(self, def_config, changed):
+        with self._lock:
+            super().apply_def_config(def_config, changed)
+            if ConfigWatcher.is_changed(changed, 'AP', 'APMAC'):
+                self._mac = def_config.get('AP', 'APMAC')
+                self._adapter.ip_link_set_dev_address(self._device, self._mac)
+            if ConfigWatcher.is_changed(changed, 'AP', 'IPForwardEnable'):
+                self._enable_ip_forward = def_config.getint('AP', 'IPForwardEnable')
+                self._adapter.enable_ip_forward(self._enable_ip_forward)
+
+    def _parse_config(self, cfg):
+        parameters = ["connection_type", "ip", "mask", "route", "ssid", "passphrase"]
+        for parameter in parameters:
+            if parameter not in cfg:
+                raise Exception(f"Configuration missing parameters: {parameter}")
+        return self._parse_qdisc(cfg) | {
+            "connection_type": self.ConnectionType.from_string(cfg["connection_type"]),
+            "ip": cfg["ip"],
+            "mask": cfg["mask"],
+            "route": cfg["route"],
+            "ssid": cfg["ssid"],
+            "passphrase": cfg["passphrase"],
+            "power_save": self._parse_power_save(cfg.get("power_save", self._power_save))
+        }
 
     def load_config(self, config):
         with self._lock:
             try:
-                cfg = config[self._device]
-                parameters = ["connection_type", "ip", "mask", "route", "ssid", "passphrase"]
-                for parameter in parameters:
-                    if parameter not in cfg:
-                        raise Exception(f"Configuration missing parameters: {parameter}")
-                self._connection_type = self.ConnectionType.from_string(cfg["connection_type"])
-                self._ip = cfg["ip"]
-                self._mask = cfg["mask"]
-                self._route = cfg["route"]
-                self._ssid = cfg["ssid"]
-                self._passphrase = cfg["passphrase"]
+                values = self._parse_config(config[self._device])
+                self._load_qdisc(values)
+                self._connection_type = values["connection_type"]
+                self._ip = values["ip"]
+                self._mask = values["mask"]
+                self._route = values["route"]
+                self._ssid = values["ssid"]
+                self._passphrase = values["passphrase"]
+                self._power_save = values["power_save"]
                 logger.info(f"Update parameters for {self._device}: {self._connection_type} | IP {self._ip} | Mask {self._mask} | Route {self._route} | SSID {self._ssid}")
             except Exception as e:
                 logger.warning(f"Failed to apply configuration {config} for {self._device}: ({e})")
                 raise Exception(f"Failed to apply configuration {config} for {self._device}: ({e})")
             self.reload()
-                
+
     def get_config(self):
         with self._lock:
             conf = {
@@ -73,18 +102,30 @@ class APInterface(NetworkInterface):
                     "ip": self._ip,
                     "mask": self._mask,
                     "route": self._route,
+                    "qdisc": self._qdisc,
+                    "qdisc_bandwidth": self._qdisc_bandwidth,
                     "ssid": self._ssid,
-                    "passphrase": self._passphrase
+                    "passphrase": self._passphrase,
+                    "power_save": self._power_save,
+                    "channel": self._channel_planner.plan["channel"] if self._channel_planner.plan else None,
+                    "channel_score": self._channel_planner.plan["score"] if self._channel_planner.plan else None
                 }
             }
             return conf
 
+    def get_status(self):
+        with self._lock:
+            status = super().get_status()
+            status[self._device]["power_save"] = self._power_save_state
+            return status
+
     def refresh(self):
         with self._lock:
             try:
                 if self._update_pending:
                     self.reload()
-                self._status_message(self.status)
+                self._refresh_status_message()
+                self._refresh_qdisc()
                 iface = self._adapter.ifconfig(self._device)
 
                 ipv4_addr = iface.ipv4_addr
@@ -101,10 +142,16 @@ class APInterface(NetworkInterface):
 
                 self._ssid = self._adapter.iw_dev_link(self._device)
 
+                if self._connection_type == self.ConnectionType.CONNECTION_TYPE_AP and self._channel_planner.reevaluate_due():
+                    self._replan_channel()
+
                 if self._connection_type == self.ConnectionType.CONNECTION_TYPE_AP:
                     self._ip = ipv4_addr
                     self._mask = ipv4_mask
                     self._route = ipv4_bcast
+                    self._power_save_state = self._adapter.iw_dev_power_save(self._device)
+                else:
+                    self._power_save_state = None
 
             except Exception as e:
                 self._status_message(f'Error checking {self._device}: {e}', error=True)
@@ -155,6 +202,36 @@ class APInterface(NetworkInterface):
             if self._passphrase != value:
                 self._passphrase = value
 
+    @property
+    def power_save(self):
+        with self._lock:
+            return self._power_save
+
+    @power_save.setter
+    def power_save(self, value):
+        with self._lock:
+            self._power_save = self._parse_power_save(value)
+            if self._connection_type == self.ConnectionType.CONNECTION_TYPE_AP:
+                self._apply_power_save()
+
+    def _ap_active(self):
+        return self._connection_type == self.ConnectionType.CONNECTION_TYPE_AP
+
+    def _station_frequency(self):
+        phy = self._adapter.read_sysfs(self._device, 'phy80211/name') or 'phy0'
+        for device in self._adapter.device():
+            if device.device_type != 'wifi' or device.device == self._device:
+                continue
+            if self._adapter.read_sysfs(device.device, 'phy80211/name') != phy:
+                continue
+            link = self._adapter.iw_dev_link_info(device.device)
+            if link["bssid"] and link["freq"]:
+                return link["freq"]
+        return None
+
+    def _power_save_connection(self):
+        return self._hotspot_connection
+
     def _reset_ap(self):
         # self._adapter.stop_dnsmasq()
         # self._adapter.stop_hostapd()
@@ -182,6 +259,7 @@ class APInterface(NetworkInterface):
                     self._update_pending = False
                     self._status_message('Disabled')
                 elif self._connection_type == self.ConnectionType.CONNECTION_TYPE_AP:
+                    plan = self._plan_channel()
                     for tries in range(2):
                         try:
                             self._status_message('Resetting...')
@@ -191,10 +269,13 @@ class APInterface(NetworkInterface):
                                 self._status_message(f'Creating access point try {tries}...')
                             else:
                                 self._status_message('Creating access point...')
-                            self._adapter.device_wifi_hotspot(con_name="hotspot", ifname=self._device, ssid=f'{self._ssid}', password=f'{self._passphrase}')
-                            self._adapter.connection_modify(name='hotspot', options={'ipv4.method': 'shared'})
-                            self._adapter.connection_modify(name='hotspot', options={'connection.autoconnect': 'yes'})
-                            self._adapter.connection_modify(name='hotspot', options={'802-11-wireless.mode': 'wpa-psk'})
+                            self._adapter.device_wifi_hotspot(con_name=self._hotspot_connection, ifname=self._device, ssid=f'{self._ssid}', password=f'{self._passphrase}',
+                                                              band=plan["band"] if plan else None,
+                                                              channel=plan["channel"] if plan else None)
+                            self._adapter.connection_modify(name=self._hotspot_connection, options={'ipv4.method': 'shared'})
+                            self._adapter.connection_modify(name=self._hotspot_connection, options={'connection.autoconnect': 'yes'})
+                            self._adapter.connection_modify(name=self._hotspot_connection, options={'802-11-wireless.mode': 'wpa-psk'})
+                            self._apply_power_save()
 
                             # Alternative:
                             # nmcli con add type wifi ifname wlan0 con-name Hostspot autoconnect yes ssid Hostspot
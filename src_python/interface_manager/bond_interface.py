@@ -0,0 +1,316 @@
+import logging
+from enum import Enum
+from netaddr import IPAddress
+from .network_interface_base import InterfaceTypes, NetworkInterface
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class BondInterface(NetworkInterface):
+    WAIT_FOR_CONNECTION_UP_S = 10
+
+    class ConnectionType(str, Enum):
+        CONNECTION_TYPE_DISABLED = "disabled"
+        CONNECTION_TYPE_STATIC_IP = "static_ip"
+        CONNECTION_TYPE_DYNAMIC_IP = "dynamic_ip"
+
+        @classmethod
+        def from_string(cls, value: str):
+            try:
+                return cls(value)
+            except ValueError:
+                available_types = ", ".join([e.value for e in cls])
+                raise ValueError(f"Invalid connection type: {value}, available types are: {available_types}")
+
+    class BondMode(str, Enum):
+        BOND_MODE_BALANCE_RR = "balance-rr"
+        BOND_MODE_ACTIVE_BACKUP = "active-backup"
+        BOND_MODE_BALANCE_XOR = "balance-xor"
+        BOND_MODE_BROADCAST = "broadcast"
+        BOND_MODE_802_3AD = "802.3ad"
+        BOND_MODE_BALANCE_TLB = "balance-tlb"
+        BOND_MODE_BALANCE_ALB = "balance-alb"
+
+        @classmethod
+        def from_string(cls, value: str):
+            try:
+                return cls(value)
+            except ValueError:
+                available_modes = ", ".join([e.value for e in cls])
+                raise ValueError(f"Invalid bond mode: {value}, available modes are: {available_modes}")
+
+    HASH_POLICIES = ["layer2", "layer2+3", "layer3+4", "encap2+3", "encap3+4"]
+    # Modes that distribute the traffic by the transmit hash
+    HASH_MODES = [BondMode.BOND_MODE_BALANCE_XOR, BondMode.BOND_MODE_802_3AD, BondMode.BOND_MODE_BALANCE_TLB]
+
+    TYPE = InterfaceTypes.INTERFACE_TYPE_BOND
+
+    def __init__(self, device, adapter, def_config, ports):
+        super().__init__(device, adapter, def_config)
+        self._ports = list(ports)
+        self.bond_connection = f'bond-{self._device}'
+        self._port_connections = {port: f'bond-port-{self._device}-{port}' for port in self._ports}
+        self._bond_status = {}
+        self._load_defaults()
+
+    def _load_defaults(self):
+        self._connection_type = self.ConnectionType.from_string(self._def_config.get('Bond', 'DefaultBondConnectionType'))
+        self._ip = self._def_config.get('Bond', 'DefaultBondIP')
+        self._mask = self._def_config.get('Bond', 'DefaultBondMask')
+        self._route = self._def_config.get('Bond', 'DefaultBondRoute')
+        self._mode = self.BondMode.from_string(self._def_config.get('Bond', 'DefaultBondMode'))
+        self._miimon = self._def_config.getint('Bond', 'DefaultBondMiimon')
+        self._hash_policy = self._def_config.get('Bond', 'DefaultBondHashPolicy')
+
+    @staticmethod
+    def parse_bonds(value):
+        """
+        Parse the bond definitions: "bond0: eth0 eth1; bond1: eth2, eth3"
+
+        :return:
+        A dictionary of bond name to the list of ports
+        """
+        bonds = {}
+        for definition in value.split(';'):
+            if not definition.strip():
+                continue
+            name, _, ports = definition.partition(':')
+            ports = ports.replace(',', ' ').split()
+            if not name.strip() or not ports:
+                raise ValueError(f"Invalid bond definition: {definition}, expected <bond>: <port> <port>")
+            bonds[name.strip()] = ports
+        return bonds
+
+    def _parse_config(self, cfg):
+        parameters = ["connection_type", "ip", "mask", "route"]
+        for parameter in parameters:
+            if parameter not in cfg:
+                raise Exception(f"Configuration missing parameters: {parameter}")
+        connection_type = self.ConnectionType.from_string(cfg["connection_type"])
+        if connection_type == self.ConnectionType.CONNECTION_TYPE_STATIC_IP:
+            IPAddress(cfg["ip"])
+            IPAddress(cfg["mask"]).netmask_bits()
+            IPAddress(cfg["route"])
+        hash_policy = cfg.get("hash_policy", self._hash_policy)
+        if hash_policy not in self.HASH_POLICIES:
+            raise ValueError(f"Invalid hash policy: {hash_policy}, available policies are: {', '.join(self.HASH_POLICIES)}")
+        miimon = int(cfg.get("miimon", self._miimon))
+        if miimon < 0:
+            raise ValueError(f"Invalid miimon: {miimon}")
+        return self._parse_qdisc(cfg) | {
+            "connection_type": connection_type,
+            "ip": cfg["ip"],
+            "mask": cfg["mask"],
+            "route": cfg["route"],
+            "mode": self.BondMode.from_string(cfg.get("mode", self._mode.value)),
+            "miimon": miimon,
+            "hash_policy": hash_policy
+        }
+
+    def load_config(self, config):
+        with self._lock:
+            try:
+                values = self._parse_config(config[self._device])
+                self._load_qdisc(values)
+                self._connection_type = values["connection_type"]
+                self._ip = values["ip"]
+                self._mask = values["mask"]
+                self._route = values["route"]
+                self._mode = values["mode"]
+                self._miimon = values["miimon"]
+                self._hash_policy = values["hash_policy"]
+                logger.info(f"Update parameters for {self._device}: {self._connection_type} | IP {self._ip} | Mask {self._mask} | Route {self._route} | Mode {self._mode.value} | Ports {self._ports}")
+            except Exception as e:
+                logger.warning(f"Failed to apply configuration {config} for {self._device}: ({e})")
+                raise Exception(f"Failed to apply configuration {config} for {self._device}: ({e})")
+            self.reload()
+
+    def get_config(self):
+        with self._lock:
+            conf = {
+                self._device: {
+                    "type": self.type.value,
+                    "connection_type": self._connection_type.value,
+                    "ip": self._ip,
+                    "mask": self._mask,
+                    "route": self._route,
+                    "qdisc": self._qdisc,
+                    "qdisc_bandwidth": self._qdisc_bandwidth,
+                    "mode": self._mode.value,
+                    "miimon": self._miimon,
+                    "hash_policy": self._hash_policy,
+                    "ports": self._ports
+                }
+            }
+            return conf
+
+    def get_status(self):
+        with self._lock:
+            status = super().get_status()
+            status[self._device]["bond"] = self._bond_status
+            return status
+
+    def _uplink_connection(self):
+        if self._connection_type == self.ConnectionType.CONNECTION_TYPE_DISABLED:
+            return None
+        return self.bond_connection
+
+    def _bond_options(self):
+        options = f'mode={self._mode.value},miimon={self._miimon}'
+        if self._mode in self.HASH_MODES:
+            options += f',xmit_hash_policy={self._hash_policy}'
+        return options
+
+    def initialise(self):
+        connections = self._adapter.connection()
+        bond_found = False
+        ports_found = set()
+        for connection in connections:
+            if connection.name == self.bond_connection:
+                if bond_found:
+                    logger.warning(f"More than one connection {connection.name} found, remove")
+                    self._adapter.connection_down(name=connection.name, wait=self.WAIT_FOR_CONNECTION_UP_S, ignore_error=True)
+                    self._adapter.connection_delete(name=connection.name)
+                    continue
+                bond_found = True
+                status = self._adapter.connection_show(name=connection.name)
+                logger.info(f"Found connection {connection.name}, status autoconnect {status['connection.autoconnect']}")
+                if status['connection.autoconnect'] == 'yes':
+                    if status.get('ipv4.method') == 'manual':
+                        self._connection_type = self.ConnectionType.CONNECTION_TYPE_STATIC_IP
+                    else:
+                        self._connection_type = self.ConnectionType.CONNECTION_TYPE_DYNAMIC_IP
+                else:
+                    self._connection_type = self.ConnectionType.CONNECTION_TYPE_DISABLED
+            elif connection.name in self._port_connections.values():
+                if connection.name in ports_found:
+                    logger.warning(f"More than one connection {connection.name} found, remove")
+                    self._adapter.connection_down(name=connection.name, wait=self.WAIT_FOR_CONNECTION_UP_S, ignore_error=True)
+                    self._adapter.connection_delete(name=connection.name)
+                    continue
+                ports_found.add(connection.name)
+
+        if not bond_found:
+            logger.info(f"{self._device} Bond connection {self.bond_connection} not found, create")
+            self._adapter.connection_add(conn_type='bond', options={'con-name': self.bond_connection, 'bond.options': self._bond_options()},
+                                         ifname=self._device, autoconnect=False)
+        for port, port_connection in self._port_connections.items():
+            if port_connection not in ports_found:
+                logger.info(f"{self._device} Port connection {port_connection} not found, create")
+                self._adapter.connection_add(conn_type='ethernet', options={'con-name': port_connection, 'master': self._device, 'slave-type': 'bond'},
+                                             ifname=port, autoconnect=False)
+        if not bond_found and self._connection_type != self.ConnectionType.CONNECTION_TYPE_DISABLED:
+            self.reload()
+        self.refresh()
+
+    def _release_ports(self):
+        # The profiles of the ports as standalone Ethernet interfaces must not take the devices
+        for port in self._ports:
+            for connection in [f'static-ip-{port}', f'dynamic-ip-{port}', f'dhcp-server-{port}']:
+                try:
+                    self._adapter.connection_modify(name=connection, options={'connection.autoconnect': 'no'})
+                    self._adapter.connection_down(name=connection, wait=self.WAIT_FOR_CONNECTION_UP_S, ignore_error=True)
+                except Exception:
+                    pass
+
+    def refresh(self):
+        with self._lock:
+            try:
+                if self._update_pending:
+                    self.reload()
+                self._refresh_status_message()
+                self._refresh_qdisc()
+                try:
+                    self._bond_status = self._adapter.bond_status(self._device)
+                except Exception:
+                    self._bond_status = {}
+                if self._connection_type == self.ConnectionType.CONNECTION_TYPE_DYNAMIC_IP:
+                    iface = self._adapter.ifconfig(self._device)
+                    self._ip = iface.ipv4_addr if iface.ipv4_addr is not None else '0.0.0.0'
+                    self._mask = iface.ipv4_mask if iface.ipv4_mask is not None else '0.0.0.0'
+                    self._route = iface.ipv4_bcast if iface.ipv4_bcast is not None else '0.0.0.0'
+            except Exception as e:
+                self._status_message(f'Error checking {self._device}: {e}', error=True)
+
+    def reload(self):
+        logging.info(f"Reload {self._device}...")
+        with self._lock:
+            try:
+                self._update_pending = True
+                if self._connection_type == self.ConnectionType.CONNECTION_TYPE_DISABLED:
+                    self._status_message('Disabling...')
+                    for port_connection in self._port_connections.values():
+                        self._adapter.connection_modify(name=port_connection, options={'connection.autoconnect': 'no'})
+                        self._adapter.connection_down(name=port_connection, wait=self.WAIT_FOR_CONNECTION_UP_S, ignore_error=True)
+                    self._adapter.connection_modify(name=self.bond_connection, options={'connection.autoconnect': 'no'})
+                    self._adapter.connection_down(name=self.bond_connection, wait=self.WAIT_FOR_CONNECTION_UP_S, ignore_error=True)
+                    self._update_pending = False
+                    self._status_message('Disabled')
+                elif self._connection_type in [self.ConnectionType.CONNECTION_TYPE_STATIC_IP, self.ConnectionType.CONNECTION_TYPE_DYNAMIC_IP]:
+                    self._status_message('Setting up bond...')
+                    self._release_ports()
+                    options = {'bond.options': self._bond_options(), 'ipv6.method': 'disabled', 'connection.autoconnect': 'yes',
+                               'connection.autoconnect-slaves': 'yes'}
+                    if self._connection_type == self.ConnectionType.CONNECTION_TYPE_STATIC_IP:
+                        mask_bits = IPAddress(self._mask).netmask_bits()
+                        options |= {'ipv4.method': 'manual', 'ipv4.addresses': f'{self._ip}/{mask_bits}', 'ipv4.gateway': self._route}
+                    else:
+                        options |= {'ipv4.method': 'auto', 'ipv4.addresses': '', 'ipv4.gateway': ''}
+                    self._adapter.connection_modify(name=self.bond_connection, options=options)
+                    for port_connection in self._port_connections.values():
+                        self._adapter.connection_modify(name=port_connection, options={'connection.autoconnect': 'yes'})
+                    self._adapter.connection_up(name=self.bond_connection, wait=self.WAIT_FOR_CONNECTION_UP_S)
+                    for port_connection in self._port_connections.values():
+                        self._adapter.connection_up(name=port_connection, wait=self.WAIT_FOR_CONNECTION_UP_S)
+                    self._update_pending = False
+                    self._status_message('Configured')
+                else:
+                    self._update_pending = False
+                    self._status_message('Unknown network type', error=True)
+            except Exception as e:
+                self._status_message(f"Bond: {e}", error=True)
+
+    @property
+    def mode(self):
+        with self._lock:
+            return self._mode.value
+
+    @mode.setter
+    def mode(self, value):
+        with self._lock:
+            if self._mode != value:
+                self._mode = self.BondMode.from_string(value)
+
+    @property
+    def miimon(self):
+        with self._lock:
+            return self._miimon
+
+    @miimon.setter
+    def miimon(self, value):
+        with self._lock:
+            if self._miimon != value:
+                self._miimon = int(value)
+
+    @property
+    def hash_policy(self):
+        with self._lock:
+            return self._hash_policy
+
+    @hash_policy.setter
+    def hash_policy(self, value):
+        with self._lock:
+            if value not in self.HASH_POLICIES:
+                raise ValueError(f"Invalid hash policy: {value}, available policies are: {', '.join(self.HASH_POLICIES)}")
+            self._hash_policy = value
+
+    @property
+    def ports(self):
+        with self._lock:
+            return list(self._ports)
+
+    @property
+    def bond_status(self):
+        with self._lock:
+            return self._bond_status
@@ -0,0 +1,183 @@
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class ChannelPlanner:
+    """
+    Score the access point channels by the networks seen in the scan results and
+    pick the least congested one. Every BSS adds its signal (0-1) weighted by how
+    much its channel overlaps the scored one, lower scores are better.
+    With the `default` channel nothing is planned, NetworkManager selects the channel.
+    """
+    CHANNELS = {
+        # Non-overlapping 2.4 GHz channels
+        "bg": [1, 6, 11],
+        # 5 GHz channels without DFS
+        "a": [36, 40, 44, 48, 149, 153, 157, 161, 165]
+    }
+
+    def __init__(self, def_config):
+        self._band = def_config.get('AP', 'APBand')
+        self._channel = def_config.get('AP', 'APChannel')
+        self._reevaluate_s = def_config.getfloat('AP', 'APChannelReevaluateSec')
+        self._min_improvement = def_config.getfloat('AP', 'APChannelMinImprovement')
+        if self._band not in ["auto", "bg", "a"]:
+            raise ValueError(f"Invalid AP band: {self._band}, available bands are: auto, bg, a")
+        if self._channel not in ["default", "auto"] and not self._channel.isdigit():
+            raise ValueError(f"Invalid AP channel: {self._channel}, expected a channel number, auto or default")
+        self.plan = None
+
+    @property
+    def enabled(self):
+        return self._channel != "default"
+
+    @property
+    def auto(self):
+        return self._channel == "auto"
+
+    @staticmethod
+    def _overlap(band, channel, other):
+        if band == "bg":
+            # 20 MHz wide channels, 5 MHz apart
+            return max(0.0, 1 - abs(channel - other) / 5)
+        return 1.0 if channel == other else 0.0
+
+    @staticmethod
+    def _band_of(freq):
+        return "bg" if freq < 3000 else "a"
+
+    @staticmethod
+    def _channel_of(freq):
+        if freq == 2484:
+            return 14
+        return (freq - 2407) // 5 if freq < 3000 else (freq - 5000) // 5
+
+    def pin(self, freq):
+        """
+        Use the channel of the station on the same radio, a single radio can only be on one channel
+
+        :param freq: frequency of the station link in MHz
+        :return:
+        The plan with 'band', 'channel' and 'pinned'
+        """
+        channel = self._channel_of(freq)
+        if self.plan is None or self.plan["channel"] != channel:
+            logger.info(f"AP channel pinned to the station channel {channel}")
+        self.plan = {"band": self._band_of(freq), "channel": channel, "score": None, "bss_count": None,
+                     "pinned": True, "time": time.time()}
+        return self.plan
+
+    def score(self, scan_results, band):
+        scores = {}
+        for channel in self.CHANNELS[band]:
+            score = 0.0
+            bss_count = 0
+            for result in scan_results:
+                if self._band_of(result.freq) != band:
+                    continue
+                overlap = self._overlap(band, channel, result.chan)
+                if overlap > 0:
+                    bss_count += 1
+                    score += overlap * result.signal / 100
+            scores[channel] = {"score": round(score, 2), "bss_count": bss_count}
+        return scores
+
+    def select(self, scan_results):
+        """
+        :return:
+        The plan with 'band', 'channel', 'score' and 'bss_count' (no score for a fixed channel),
+        None with the default channel
+        """
+        if not self.enabled:
+            self.plan = None
+            return None
+        if not self.auto:
+            channel = int(self._channel)
+            self.plan = {"band": "a" if channel > 14 else "bg", "channel": channel,
+                         "score": None, "bss_count": None, "time": time.time()}
+            return self.plan
+        bands = ["bg", "a"] if self._band == "auto" else [self._band]
+        best = None
+        for band in bands:
+            for channel, score in self.score(scan_results, band).items():
+                if best is None or score["score"] < best["score"]:
+                    best = {"band": band, "channel": channel} | score
+        if self.plan is not None and not self.plan["pinned"] and self.plan["channel"] != best["channel"]:
+            current = self.score(scan_results, self.plan["band"]).get(self.plan["channel"])
+            # Changing the channel disconnects the clients, only do it for a clear improvement
+            if current is not None and current["score"] - best["score"] <= self._min_improvement:
+                best = {"band": self.plan["band"], "channel": self.plan["channel"]} | current
+        logger.info(f"AP channel plan: {best}")
+        self.plan = best | {"pinned": False, "time": time.time()}
+        return self.plan
+
+    def reevaluate_due(self):
+        return self.enabled and self._reevaluate_s > 0 and self.plan is not None and \
+            time.time() - self.plan["time"] >= self._reevaluate_s
+
+
+class ChannelPlanning:
+    """
+    Channel planning of an interface that runs an access point on the `_hotspot_connection` profile,
+    mixed into the NetworkInterface. The interface tells if its access point is active and can pin
+    the channel to a station on the same radio.
+    """
+
+    def _ap_active(self):
+        raise NotImplementedError
+
+    def _station_frequency(self):
+        """
+        :return:
+        The frequency (MHz) of an associated station on the radio of the access point, None if there is none
+        """
+        return None
+
+    def _channel_scan_results(self):
+        return self._adapter.device_wifi(ifname=self._device)
+
+    @property
+    def channel_plan(self):
+        with self._lock:
+            return self._channel_planner.plan
+
+    @channel_plan.setter
+    def channel_plan(self, value):
+        # Any write re-evaluates the channel now
+        with self._lock:
+            if self._ap_active():
+                self._replan_channel()
+
+    def _plan_channel(self):
+        if not self._channel_planner.enabled:
+            return None
+        try:
+            # Moving away from the channel of the station would take down the station or the access point
+            station_freq = self._station_frequency()
+            if station_freq:
+                return self._channel_planner.pin(station_freq)
+            scan_results = []
+            if self._channel_planner.auto:
+                scan_results = self._channel_scan_results()
+            return self._channel_planner.select(scan_results)
+        except Exception as e:
+            logger.warning(f"AP channel planning failed on {self._device}: {e}")
+            return None
+
+    def _replan_channel(self):
+        previous = self._channel_planner.plan
+        plan = self._plan_channel()
+        if plan is None or (previous is not None and previous["channel"] == plan["channel"]):
+            return
+        self._status_message(f'Moving access point to channel {plan["channel"]}...')
+        try:
+            self._adapter.connection_modify(name=self._hotspot_connection,
+                                            options={'802-11-wireless.band': plan["band"],
+                                                     '802-11-wireless.channel': str(plan["channel"])})
+            self._adapter.connection_up(name=self._hotspot_connection, wait=self.WAIT_FOR_CONNECTION_UP_S)
+            self._status_message(f'{self.status}')
+        except Exception as e:
+            self._status_message(f'Hotspot: {e}', error=True)
@@ -0,0 +1,89 @@
+import logging
+import os
+import signal
+import threading
+from configparser import ConfigParser
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class ConfigWatcher:
+    """
+    Re-read the configuration files when they change (polled by modification time)
+    or when SIGHUP is received, and report the changed options through the callback
+    as callback(def_config, changed), where changed is a set of (section, option).
+    """
+
+    def __init__(self, files, def_config: ConfigParser, callback, period_s: float = 5):
+        self._files = [file for file in files if file]
+        self._def_config = def_config
+        self._callback = callback
+        self._period_s = period_s
+        self._reload_event = threading.Event()
+        self._mtimes = self._read_mtimes()
+
+    def start(self):
+        try:
+            signal.signal(signal.SIGHUP, lambda signum, frame: self._reload_event.set())
+        except ValueError:
+            # Signals can only be installed from the main thread
+            logger.warning("SIGHUP reload is not available")
+        watcher_thread = threading.Thread(target=self._run)
+        watcher_thread.daemon = True
+        watcher_thread.start()
+
+    def reload(self):
+        self._reload_event.set()
+
+    def _read_mtimes(self):
+        mtimes = {}
+        for file in self._files:
+            try:
+                mtimes[file] = os.stat(file).st_mtime_ns
+            except OSError:
+                mtimes[file] = None
+        return mtimes
+
+    def _run(self):
+        while True:
+            timeout = self._period_s if self._period_s > 0 else None
+            forced = self._reload_event.wait(timeout)
+            self._reload_event.clear()
+            mtimes = self._read_mtimes()
+            if not forced and mtimes == self._mtimes:
+                continue
+            try:
+                self._load()
+            except Exception as e:
+                # The files are read again on the next poll, the options that failed are applied again
+                logger.error(f"Failed to reload the configuration: {e}")
+                continue
+            self._mtimes = mtimes
+
+    def _load(self):
+        def_config = ConfigParser()
+        def_config.read(self._files)
+        changed = self.diff(self._def_config, def_config)
+        if not changed:
+            logger.info("Configuration reloaded, no changes")
+            return
+        logger.info(f"Configuration changed: {', '.join(f'{section}.{option}' for section, option in sorted(changed))}")
+        self._callback(def_config, changed)
+        # Only an applied configuration is the base of the next diff
+        self._def_config = def_config
+
+    @staticmethod
+    def diff(old: ConfigParser, new: ConfigParser):
+        changed = set()
+        for section in set(old.sections()) | set(new.sections()):
+            old_items = dict(old.items(section, raw=True)) if old.has_section(section) else {}
+            new_items = dict(new.items(section, raw=True)) if new.has_section(section) else {}
+            for option in set(old_items) | set(new_items):
+                if old_items.get(option) != new_items.get(option):
+                    changed.add((section, option))
+        return changed
+
+    @staticmethod
+    def is_changed(changed, section, *options):
+        return any((section, option.lower()) in changed for option in options)
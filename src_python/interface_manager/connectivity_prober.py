@@ -0,0 +1,185 @@
+import logging
+import threading
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+
+from .adapters.nmcli_adapter import NMCliAdapter
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class ProbeTarget:
+    KINDS = ["tcp", "icmp", "dns"]
+
+    def __init__(self, spec: str):
+        parts = spec.strip().split(':')
+        if len(parts) < 2 or parts[0] not in self.KINDS:
+            raise ValueError(f"Invalid probe target: {spec}, expected tcp:<host>:<port>, icmp:<host> or dns:<server>")
+        self.spec = spec.strip()
+        self.kind = parts[0]
+        self.host = parts[1]
+        self.port = int(parts[2]) if self.kind == "tcp" else 0
+        if self.kind == "tcp" and len(parts) != 3:
+            raise ValueError(f"Invalid probe target: {spec}, TCP probes require a port")
+
+    def probe(self, adapter: NMCliAdapter, device, timeout, dns_name):
+        if self.kind == "tcp":
+            return adapter.probe_tcp(device, self.host, self.port, timeout)
+        elif self.kind == "dns":
+            return adapter.probe_dns(device, self.host, dns_name, timeout)
+        return adapter.probe_icmp(device, self.host, timeout)
+
+
+class ProbeStats:
+    """
+    Rolling statistics of the last probe rounds of one interface. A round succeeds if any target answered.
+    """
+
+    def __init__(self, window):
+        self._window = window
+        self._rounds = deque(maxlen=window)
+        self._targets = {}
+
+    def add_round(self, results):
+        rtts = []
+        for target, rtt in results.items():
+            self._targets.setdefault(target, deque(maxlen=self._window)).append(rtt)
+            if rtt is not None:
+                rtts.append(rtt)
+        self._rounds.append(min(rtts) if rtts else None)
+
+    @staticmethod
+    def _summary(samples):
+        rtts = [rtt for rtt in samples if rtt is not None]
+        return {
+            "loss": round(1 - len(rtts) / len(samples), 3) if samples else None,
+            "rtt_ms": round(sum(rtts) / len(rtts) * 1000, 1) if rtts else None,
+            "rtt_min_ms": round(min(rtts) * 1000, 1) if rtts else None,
+            "rtt_max_ms": round(max(rtts) * 1000, 1) if rtts else None
+        }
+
+    @property
+    def loss(self):
+        if not self._rounds:
+            return None
+        return sum(1 for rtt in self._rounds if rtt is None) / len(self._rounds)
+
+    @property
+    def rtt(self):
+        rtts = [rtt for rtt in self._rounds if rtt is not None]
+        if not rtts:
+            return None
+        return sum(rtts) / len(rtts)
+
+    def get_status(self, max_loss):
+        status = self._summary(self._rounds)
+        status["usable"] = self.usable(max_loss)
+        status["targets"] = {target: self._summary(samples) for target, samples in self._targets.items()}
+        return status
+
+    def usable(self, max_loss):
+        loss = self.loss
+        return loss is None or loss <= max_loss
+
+
+class ConnectivityProber:
+    """
+    Periodically check that the uplink interfaces reach the configured targets,
+    all interfaces and targets are probed concurrently
+    """
+
+    def __init__(self, adapter: NMCliAdapter, def_config, get_interfaces, budget=None):
+        """
+        :param budget: semaphore limiting the concurrent commands of the fleet hosts, None for no limit
+        """
+        self._adapter = adapter
+        self._get_interfaces = get_interfaces
+        self._budget = budget
+        self._lock = threading.RLock()
+        self._stats = {}
+        self._wakeup = threading.Event()
+        self._executor = None
+        self._load_settings(def_config)
+
+    def _load_settings(self, def_config):
+        self._period_s = def_config.getfloat('Probes', 'ProbePeriodSec')
+        self._timeout_s = def_config.getfloat('Probes', 'ProbeTimeoutSec')
+        self._window = def_config.getint('Probes', 'ProbeWindow')
+        self._max_loss = def_config.getfloat('Probes', 'ProbeMaxLoss')
+        self._dns_name = def_config.get('Probes', 'ProbeDNSName')
+        self._targets = [ProbeTarget(spec) for spec in def_config.get('Probes', 'ProbeTargets').split(',') if spec.strip()]
+
+    def apply_def_config(self, def_config, changed):
+        with self._lock:
+            self._load_settings(def_config)
+            self._stats = {}
+        self._wakeup.set()
+
+    def start(self):
+        self._executor = ThreadPoolExecutor(thread_name_prefix="probe")
+        probe_thread = threading.Thread(target=self._run)
+        probe_thread.daemon = True
+        probe_thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self._budget or nullcontext():
+                    self.probe()
+            except Exception as e:
+                logger.error(f"Exception while probing: {e}")
+            self._wakeup.wait(self._period_s)
+            self._wakeup.clear()
+
+    def _probe_target(self, device, target: ProbeTarget):
+        try:
+            return target.probe(self._adapter, device, self._timeout_s, self._dns_name)
+        except Exception as e:
+            # The probe could not run (e.g. no permission), this is not a lost probe
+            logger.warning(f"Probe {target.spec} on {device} failed: {e}")
+            raise
+
+    def probe(self):
+        devices = [interface.device for interface in self._get_interfaces()]
+        targets = self._targets
+        futures = {(device, target.spec): self._executor.submit(self._probe_target, device, target)
+                   for device in devices for target in targets}
+        results = {}
+        for (device, spec), future in futures.items():
+            try:
+                results.setdefault(device, {})[spec] = future.result()
+            except Exception:
+                pass
+        with self._lock:
+            # Interfaces that are not probed (disconnected, removed) start over
+            self._stats = {device: self._stats[device] for device in devices if device in self._stats}
+            for device, device_results in results.items():
+                if device not in self._stats:
+                    self._stats[device] = ProbeStats(self._window)
+                self._stats[device].add_round(device_results)
+
+    def is_usable(self, device):
+        with self._lock:
+            stats = self._stats.get(device)
+            return stats is None or stats.usable(self._max_loss)
+
+    def get_stats(self, device):
+        """
+        :return:
+        A snapshot (rtt in seconds, loss ratio) of the device, None if it was not probed yet;
+        either value is None when there is no sample
+        """
+        with self._lock:
+            stats = self._stats.get(device)
+            if stats is None:
+                return None
+            return stats.rtt, stats.loss
+
+    def get_status(self, device):
+        with self._lock:
+            stats = self._stats.get(device)
+            if stats is None:
+                return None
+            return stats.get_status(self._max_loss)
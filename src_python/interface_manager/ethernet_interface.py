@@ -1,4 +1,6 @@
 import logging
+import threading
+import time
 from enum import Enum
 from netaddr import IPAddress
 from .network_interface_base import InterfaceTypes, NetworkInterface
@@ -25,11 +27,28 @@ class EthernetInterface(NetworkInterface):
 
     TYPE = InterfaceTypes.INTERFACE_TYPE_ETHERNET
 
+    # Offload parameter -> ethtool feature name
+    OFFLOADS = {
+        "gro": "generic-receive-offload",
+        "gso": "generic-segmentation-offload",
+        "tso": "tcp-segmentation-offload"
+    }
+    # Offload parameter value -> NetworkManager ethtool.feature-* value
+    OFFLOAD_VALUES = {"default": "ignore", "on": "on", "off": "off"}
+    DUPLEX_VALUES = ["auto", "full", "half"]
+
     def __init__(self, device, adapter, def_config):
         super().__init__(device, adapter, def_config)
         self.static_ip_connection = f'static-ip-{self._device}'
         self.dynamic_ip_connection = f'dynamic-ip-{self._device}'
         self.dhcp_server_connection = f'dhcp-server-{self._device}'
+        self._capabilities = None
+        self._link = {}
+        self._dns_order = None
+        self._dns_rank = []
+        self._last_dns_rank = 0.0
+        self._dns_rank_running = False
+        self._dns_generation = 0
         self._load_defaults()
 
     def _load_defaults(self):
@@ -37,26 +56,179 @@ class EthernetInterface(NetworkInterface):
         self._ip = self._def_config.get('Ethernet', 'DefaultEthernetIP')
         self._mask = self._def_config.get('Ethernet', 'DefaultEthernetMask')
         self._route = self._def_config.get('Ethernet', 'DefaultEthernetRoute')
+        self._mtu = self._parse_mtu(self._def_config.get('Ethernet', 'DefaultEthernetMTU'))
+        self._speed = self._parse_speed(self._def_config.get('Ethernet', 'DefaultEthernetSpeed'))
+        self._duplex = self._def_config.get('Ethernet', 'DefaultEthernetDuplex')
+        self._offloads = {offload: self._def_config.get('Ethernet', f'DefaultEthernet{offload.upper()}') for offload in self.OFFLOADS}
+        self._dns = self._parse_dns(self._def_config.get('Ethernet', 'DefaultEthernetDNS'))
+        self._dns_ranking = self._def_config.getboolean('Ethernet', 'DefaultEthernetDNSRanking')
+        self._dns_rank_period_s = self._def_config.getfloat('Ethernet', 'DNSRankPeriodSec')
+        self._dns_rank_samples = self._def_config.getint('Ethernet', 'DNSRankSamples')
+        self._dns_rank_timeout_s = self._def_config.getfloat('Ethernet', 'DNSRankTimeoutSec')
+        self._dns_rank_name = self._def_config.get('Ethernet', 'DNSRankQueryName')
+
+    @staticmethod
+    def _parse_mtu(value):
+        # 0 keeps the device default
+        return 0 if str(value) == "auto" else int(value)
+
+    @staticmethod
+    def _parse_dns(value):
+        if isinstance(value, str):
+            value = value.replace(',', ' ').split()
+        servers = [str(server) for server in value]
+        for server in servers:
+            IPAddress(server)
+        return servers
+
+    @staticmethod
+    def _parse_speed(value):
+        # 0 is auto-negotiation
+        return 0 if str(value) == "auto" else int(value)
+
+    def _get_capabilities(self):
+        if self._capabilities is None:
+            try:
+                self._capabilities = self._adapter.ethernet_capabilities(self._device)
+            except Exception as e:
+                logger.warning(f"Failed to read capabilities of {self._device}: {e}")
+                return None
+        return self._capabilities
+
+    def _validate_link_settings(self, mtu, speed, duplex, offloads):
+        if duplex not in self.DUPLEX_VALUES:
+            raise ValueError(f"Invalid duplex: {duplex}, available values are: {', '.join(self.DUPLEX_VALUES)}")
+        if (speed == 0) != (duplex == "auto"):
+            raise ValueError("Speed and duplex must be both auto or both set")
+        for offload, value in offloads.items():
+            if value not in self.OFFLOAD_VALUES:
+                raise ValueError(f"Invalid {offload} value: {value}, available values are: {', '.join(self.OFFLOAD_VALUES)}")
+        capabilities = self._get_capabilities()
+        if capabilities is None:
+            return
+        if mtu:
+            min_mtu = capabilities["min_mtu"] or 68
+            if mtu < min_mtu or (capabilities["max_mtu"] and mtu > capabilities["max_mtu"]):
+                raise ValueError(f"MTU {mtu} not supported by {self._device}, the range is {min_mtu}-{capabilities['max_mtu']}")
+        if speed and capabilities["link_modes"] and (speed, duplex) not in capabilities["link_modes"]:
+            modes = ", ".join(f"{mode_speed}/{mode_duplex}" for mode_speed, mode_duplex in capabilities["link_modes"])
+            raise ValueError(f"Link mode {speed}/{duplex} not supported by {self._device}, supported modes are: {modes}")
+        for offload, value in offloads.items():
+            feature = capabilities["features"].get(self.OFFLOADS[offload])
+            if value != "default" and feature is not None and feature["fixed"] and feature["enabled"] != (value == "on"):
+                raise ValueError(f"{offload} is fixed {'on' if feature['enabled'] else 'off'} on {self._device}")
+
+    def _link_options(self):
+        options = {'802-3-ethernet.mtu': str(self._mtu)}
+        if self._speed:
+            options |= {'802-3-ethernet.auto-negotiate': 'no',
+                        '802-3-ethernet.speed': str(self._speed),
+                        '802-3-ethernet.duplex': self._duplex}
+        else:
+            options |= {'802-3-ethernet.auto-negotiate': 'yes',
+                        '802-3-ethernet.speed': '0',
+                        '802-3-ethernet.duplex': ''}
+        for offload, value in self._offloads.items():
+            options[f'ethtool.feature-{offload}'] = self.OFFLOAD_VALUES[value]
+        return options
+
+    def _static_ip_settings(self):
+        mask_bits = IPAddress(self._mask).netmask_bits()
+        return {'ipv4.method': 'manual',
+                'ipv4.addresses': f'{self._ip}/{mask_bits}',
+                'ipv4.gateway': self._route,
+                'ipv4.dns': " ".join(self._dns_servers()),
+                'ipv6.method': 'disabled'} | self._link_options()
+
+    def _dynamic_ip_settings(self):
+        return {'ipv4.method': 'auto',
+                'ipv6.method': 'auto'} | self._link_options()
+
+    def _dhcp_server_settings(self):
+        mask_bits = IPAddress(self._mask).netmask_bits()
+        return {'ipv6.method': 'disabled',
+                'ipv4.method': 'shared',
+                'ipv4.addresses': f'{self._ip}/{mask_bits}',
+                'ipv4.gateway': self._route} | self._link_options()
+
+    def _read_link(self):
+        mtu = self._adapter.read_sysfs(self._device, 'mtu')
+        speed = self._adapter.read_sysfs(self._device, 'speed')
+        duplex = self._adapter.read_sysfs(self._device, 'duplex')
+        self._link = {
+            "mtu": int(mtu) if mtu and mtu.isdigit() else None,
+            # Speed is -1 and duplex unknown without a link
+            "speed": int(speed) if speed and speed.lstrip('-').isdigit() and int(speed) > 0 else None,
+            "duplex": duplex if duplex in ["full", "half"] else None,
+            "offloads": self._link.get("offloads", {})
+        }
+
+    def _read_offloads(self):
+        try:
+            features = self._adapter.ethtool_features(self._device)
+            self._link["offloads"] = {offload: "on" if features[feature]["enabled"] else "off"
+                                      for offload, feature in self.OFFLOADS.items() if feature in features}
+        except Exception as e:
+            logger.warning(f"Failed to read offloads of {self._device}: {e}")
+
+    def _parse_config(self, cfg):
+        parameters = ["connection_type", "ip", "mask", "route"]
+        for parameter in parameters:
+            if parameter not in cfg:
+                raise Exception(f"Configuration missing parameters: {parameter}")
+        connection_type = self.ConnectionType.from_string(cfg["connection_type"])
+        if connection_type in [self.ConnectionType.CONNECTION_TYPE_STATIC_IP, self.ConnectionType.CONNECTION_TYPE_DHCP_SERVER]:
+            IPAddress(cfg["ip"])
+            IPAddress(cfg["mask"]).netmask_bits()
+            IPAddress(cfg["route"])
+        # Link settings are optional
+        mtu = self._parse_mtu(cfg.get("mtu", self._mtu))
+        speed = self._parse_speed(cfg.get("speed", self._speed))
+        duplex = cfg.get("duplex", self._duplex)
+        offloads = {offload: cfg.get(offload, self._offloads[offload]) for offload in self.OFFLOADS}
+        self._validate_link_settings(mtu, speed, duplex, offloads)
+        dns = self._parse_dns(cfg.get("dns", self._dns))
+        dns_ranking = self._to_bool(cfg.get("dns_ranking", self._dns_ranking))
+        return self._parse_qdisc(cfg) | {
+            "connection_type": connection_type,
+            "ip": cfg["ip"],
+            "mask": cfg["mask"],
+            "route": cfg["route"],
+            "mtu": mtu,
+            "speed": speed,
+            "duplex": duplex,
+            "offloads": offloads,
+            "dns": dns,
+            "dns_ranking": dns_ranking
+        }
 
     def load_config(self, config):
         with self._lock:
             try:
-                cfg = config[self._device]
-                parameters = ["connection_type", "ip", "mask", "route"]
-                for parameter in parameters:
-                    if parameter not in cfg:
-                        raise Exception(f"Configuration missing parameters: {parameter}")
-                self._connection_type = self.ConnectionType.from_string(cfg["connection_type"])
-                self._ip = cfg["ip"]
-                self._mask = cfg["mask"]
-                self._route = cfg["route"]
-                logger.info(f"Update parameters for {self._device}: {self._connection_type} | IP {self._ip} | Mask {self._mask} | Route {self._route}")
-                self.reload()
+                values = self._parse_config(config[self._device])
+                self._load_qdisc(values)
+                self._connection_type = values["connection_type"]
+                self._ip = values["ip"]
+                self._mask = values["mask"]
+                self._route = values["route"]
+                self._mtu = values["mtu"]
+                self._speed = values["speed"]
+                self._duplex = values["duplex"]
+                self._offloads = values["offloads"]
+                self._set_dns(values["dns"], values["dns_ranking"])
+                logger.info(f"Update parameters for {self._device}: {self._connection_type} | IP {self._ip} | Mask {self._mask} | Route {self._route} | MTU {self._mtu} | Speed {self._speed} {self._duplex} | Offloads {self._offloads} | DNS {self._dns}")
             except Exception as e:
                 logger.warning(f"Failed to apply configuration {config} for {self._device}: ({e})")
                 raise Exception(f"Failed to apply configuration {config} for {self._device}: ({e})")
             self.reload()
 
+    def _uplink_connection(self):
+        if self._connection_type == self.ConnectionType.CONNECTION_TYPE_STATIC_IP:
+            return self.static_ip_connection
+        elif self._connection_type == self.ConnectionType.CONNECTION_TYPE_DYNAMIC_IP:
+            return self.dynamic_ip_connection
+        return None
+
     def get_config(self):
         with self._lock:
             conf = {
@@ -65,11 +237,191 @@ class EthernetInterface(NetworkInterface):
                     "connection_type": self._connection_type.value,
                     "ip": self._ip,
                     "mask": self._mask,
-                    "route": self._route
-                }
+                    "route": self._route,
+                    "qdisc": self._qdisc,
+                    "qdisc_bandwidth": self._qdisc_bandwidth,
+                    "mtu": self._mtu if self._mtu else "auto",
+                    "speed": self._speed if self._speed else "auto",
+                    "duplex": self._duplex,
+                    "dns": self._dns,
+                    "dns_ranking": self._dns_ranking
+                } | self._offloads
             }
             return conf
 
+    def get_status(self):
+        with self._lock:
+            status = super().get_status()
+            status[self._device]["link"] = self._link
+            if self._dns_rank:
+                status[self._device]["dns"] = self._dns_rank
+            return status
+
+    def _set_dns(self, dns, dns_ranking):
+        if dns != self._dns or dns_ranking != self._dns_ranking:
+            # Rank the new servers on the next refresh, a ranking in progress is discarded
+            self._dns_order = None
+            self._dns_rank = []
+            self._last_dns_rank = 0.0
+            self._dns_generation += 1
+        self._dns = dns
+        self._dns_ranking = dns_ranking
+
+    def _dns_servers(self):
+        if self._dns_ranking and self._dns_order is not None:
+            return self._dns_order
+        return self._dns
+
+    def _start_dns_rank(self):
+        # The queries take up to servers x samples x timeout, they run in the background without the lock
+        if self._dns_rank_running or time.time() - self._last_dns_rank < self._dns_rank_period_s:
+            return
+        self._last_dns_rank = time.time()
+        self._dns_rank_running = True
+        rank_thread = threading.Thread(target=self._rank_dns, args=(list(self._dns), self._dns_generation))
+        rank_thread.daemon = True
+        rank_thread.start()
+
+    def _measure_dns(self, servers):
+        rank = []
+        for server in servers:
+            rtts = []
+            for _ in range(self._dns_rank_samples):
+                rtt = self._adapter.probe_dns(self._device, server, self._dns_rank_name, self._dns_rank_timeout_s)
+                if rtt is not None:
+                    rtts.append(rtt)
+            rtts.sort()
+            rank.append({"server": server,
+                         "rtt_ms": round(rtts[len(rtts) // 2] * 1000, 1) if rtts else None,
+                         "answered": len(rtts)})
+        rank.sort(key=lambda result: (result["rtt_ms"] is None, result["rtt_ms"] or 0))
+        return rank
+
+    def _rank_dns(self, servers, generation):
+        """
+        Measure the query time of the DNS servers through the interface and list the fastest first
+        in the static IP profile. Servers that don't answer are kept last in the configured order.
+        """
+        try:
+            rank = self._measure_dns(servers)
+            with self._lock:
+                # The servers or the connection changed while measuring
+                if generation != self._dns_generation or not self._dns_ranking or self._update_pending or \
+                        self._connection_type != self.ConnectionType.CONNECTION_TYPE_STATIC_IP:
+                    return
+                self._dns_rank = rank
+                order = [result["server"] for result in rank]
+                if order != self._dns_servers():
+                    logger.info(f"DNS servers of {self._device} by query time: {', '.join(order)}")
+                    self._dns_order = order
+                    self._adapter.connection_modify(name=self.static_ip_connection, options={'ipv4.dns': " ".join(order)})
+                    # Reapply updates the resolvers of the active connection without reconnecting
+                    self._adapter.device_reapply(self._device)
+        except Exception as e:
+            logger.warning(f"Failed to rank the DNS servers of {self._device}: {e}")
+        finally:
+            with self._lock:
+                self._dns_rank_running = False
+
+    @property
+    def dns(self):
+        with self._lock:
+            return self._dns
+
+    @dns.setter
+    def dns(self, value):
+        with self._lock:
+            self._set_dns(self._parse_dns(value), self._dns_ranking)
+
+    @property
+    def dns_ranking(self):
+        with self._lock:
+            return self._dns_ranking
+
+    @dns_ranking.setter
+    def dns_ranking(self, value):
+        with self._lock:
+            self._set_dns(self._dns, self._to_bool(value))
+
+    @property
+    def mtu(self):
+        with self._lock:
+            return self._mtu if self._mtu else "auto"
+
+    @mtu.setter
+    def mtu(self, value):
+        with self._lock:
+            mtu = self._parse_mtu(value)
+            self._validate_link_settings(mtu, self._speed, self._duplex, self._offloads)
+            self._mtu = mtu
+
+    @property
+    def speed(self):
+        with self._lock:
+            return self._speed if self._speed else "auto"
+
+    @speed.setter
+    def speed(self, value):
+        with self._lock:
+            speed = self._parse_speed(value)
+            duplex = self._duplex
+            if speed == 0:
+                duplex = "auto"
+            elif duplex == "auto":
+                duplex = "full"
+            self._validate_link_settings(self._mtu, speed, duplex, self._offloads)
+            self._speed = speed
+            self._duplex = duplex
+
+    @property
+    def duplex(self):
+        with self._lock:
+            return self._duplex
+
+    @duplex.setter
+    def duplex(self, value):
+        with self._lock:
+            self._validate_link_settings(self._mtu, self._speed, value, self._offloads)
+            self._duplex = value
+
+    def _set_offload(self, offload, value):
+        with self._lock:
+            offloads = self._offloads | {offload: value}
+            self._validate_link_settings(self._mtu, self._speed, self._duplex, offloads)
+            self._offloads = offloads
+
+    @property
+    def gro(self):
+        with self._lock:
+            return self._offloads["gro"]
+
+    @gro.setter
+    def gro(self, value):
+        self._set_offload("gro", value)
+
+    @property
+    def gso(self):
+        with self._lock:
+            return self._offloads["gso"]
+
+    @gso.setter
+    def gso(self, value):
+        self._set_offload("gso", value)
+
+    @property
+    def tso(self):
+        with self._lock:
+            return self._offloads["tso"]
+
+    @tso.setter
+    def tso(self, value):
+        self._set_offload("tso", value)
+
+    @property
+    def link(self):
+        with self._lock:
+            return self._link
+
     def initialise(self):
         connections = self._adapter.connection()
 
@@ -118,21 +470,24 @@ class EthernetInterface(NetworkInterface):
         if not enabled:
             self._connection_type = self.ConnectionType.CONNECTION_TYPE_DISABLED
 
-        if not static_ip_found:
-            logger.info(f"{self._device} Static IP connection {self.static_ip_connection} not found, create")
-            self._adapter.connection_add(conn_type='ethernet', options={'con-name': self.static_ip_connection}, ifname=self._device, autoconnect=False)
-        if not dynamic_ip_found:
-            logger.info(f"{self._device} Dynamic connection {self.dynamic_ip_connection} not found, create")
-            self._adapter.connection_add(conn_type='ethernet', options={'con-name': self.dynamic_ip_connection}, ifname=self._device, autoconnect=False)
+        # The missing profiles are created complete and disabled, in one pass
+        profiles = []
         if not dhcp_found:
             logger.info(f"{self._device} DHCP connection {self.dhcp_server_connection} not found, create")
-            self._adapter.connection_add(conn_type='ethernet', options={'con-name': self.dhcp_server_connection}, ifname=self._device, autoconnect=False)
             self._ip = self._def_config.get('Ethernet', 'DefaultEthernetIP')
             self._mask = self._def_config.get('Ethernet', 'DefaultEthernetMask')
             self._route = self._def_config.get('Ethernet', 'DefaultEthernetRoute')
-            mask_bits = IPAddress(self._mask).netmask_bits()
-            self._adapter.connection_modify(name=self.dhcp_server_connection, options={'ipv4.addresses': f'{self._ip}/{mask_bits}'})
-            self._adapter.connection_modify(name=self.dhcp_server_connection, options={'ipv4.gateway': self._route})
+            profiles.append((self.dhcp_server_connection, self._dhcp_server_settings()))
+        if not static_ip_found:
+            logger.info(f"{self._device} Static IP connection {self.static_ip_connection} not found, create")
+            profiles.append((self.static_ip_connection, self._static_ip_settings()))
+        if not dynamic_ip_found:
+            logger.info(f"{self._device} Dynamic connection {self.dynamic_ip_connection} not found, create")
+            profiles.append((self.dynamic_ip_connection, self._dynamic_ip_settings()))
+        self._adapter.provision_profiles([{'name': name, 'type': 'ethernet', 'ifname': self._device,
+                                           'settings': settings | {'connection.autoconnect': 'no'}}
+                                          for name, settings in profiles])
+        self._read_offloads()
         self.refresh()
 
     def refresh(self):
@@ -140,7 +495,8 @@ class EthernetInterface(NetworkInterface):
             try:
                 if self._update_pending:
                     self.reload()
-                self._status_message(self.status)
+                self._refresh_status_message()
+                self._refresh_qdisc()
                 iface = self._adapter.ifconfig(self._device)
 
                 ipv4_addr = iface.ipv4_addr
@@ -160,6 +516,11 @@ class EthernetInterface(NetworkInterface):
                     self._mask = ipv4_mask
                     self._route = ipv4_bcast
 
+                self._read_link()
+
+                if self._connection_type == self.ConnectionType.CONNECTION_TYPE_STATIC_IP and self._dns_ranking and not self._update_pending:
+                    self._start_dns_rank()
+
             except Exception as e:
                 self._status_message(f'Error checking {self._device}: {e}', error=True)
 
@@ -168,7 +529,6 @@ class EthernetInterface(NetworkInterface):
         with self._lock:
             try:
                 self._update_pending = True
-                mask_bits = IPAddress(self._mask).netmask_bits()
                 if self._connection_type == self.ConnectionType.CONNECTION_TYPE_DISABLED:
                     self._status_message('Disabling...')
                     self._adapter.connection_modify(name=self.dynamic_ip_connection, options={'connection.autoconnect': 'no'})
@@ -186,13 +546,10 @@ class EthernetInterface(NetworkInterface):
                     self._adapter.connection_down(name=self.dynamic_ip_connection, wait=self.WAIT_FOR_CONNECTION_UP_S, ignore_error=True)
                     self._adapter.connection_modify(name=self.dhcp_server_connection, options={'connection.autoconnect': 'no'})
                     self._adapter.connection_down(name=self.dhcp_server_connection, wait=self.WAIT_FOR_CONNECTION_UP_S, ignore_error=True)
-                    self._adapter.connection_modify(name=self.static_ip_connection, options={'ipv4.method': 'manual'})
-                    self._adapter.connection_modify(name=self.static_ip_connection, options={'ipv4.addresses': f'{self._ip}/{mask_bits}'})
-                    self._adapter.connection_modify(name=self.static_ip_connection, options={'ipv4.gateway': self._route})
-                    self._adapter.connection_modify(name=self.static_ip_connection, options={'connection.autoconnect': 'yes'})
-                    self._adapter.connection_modify(name=self.static_ip_connection, options={'ipv4.dns': "8.8.8.8 4.4.4.4"})
-                    self._adapter.connection_modify(name=self.static_ip_connection, options={'ipv6.method': 'disabled'})
+                    self._adapter.connection_modify(name=self.static_ip_connection,
+                                                    options=self._static_ip_settings() | {'connection.autoconnect': 'yes'})
                     self._adapter.connection_up(name=self.static_ip_connection, wait=self.WAIT_FOR_CONNECTION_UP_S)
+                    self._read_offloads()
                     self._ip_read_only = False
                     self._update_pending = False
                     self._status_message('Configured')
@@ -202,10 +559,10 @@ class EthernetInterface(NetworkInterface):
                     self._adapter.connection_down(name=self.static_ip_connection, wait=self.WAIT_FOR_CONNECTION_UP_S, ignore_error=True)
                     self._adapter.connection_modify(name=self.dhcp_server_connection, options={'connection.autoconnect': 'no'})
                     self._adapter.connection_down(name=self.dhcp_server_connection, wait=self.WAIT_FOR_CONNECTION_UP_S, ignore_error=True)
-                    self._adapter.connection_modify(name=self.dynamic_ip_connection, options={'ipv4.method': 'auto'})
-                    self._adapter.connection_modify(name=self.dynamic_ip_connection, options={'ipv6.method': 'auto'})
-                    self._adapter.connection_modify(name=self.dynamic_ip_connection, options={'connection.autoconnect': 'yes'})
+                    self._adapter.connection_modify(name=self.dynamic_ip_connection,
+                                                    options=self._dynamic_ip_settings() | {'connection.autoconnect': 'yes'})
                     self._adapter.connection_up(name=self.dynamic_ip_connection, wait=self.WAIT_FOR_CONNECTION_UP_S)
+                    self._read_offloads()
                     self._ip_read_only = True
                     self._update_pending = False
                     self._status_message('Configured')
@@ -215,12 +572,10 @@ class EthernetInterface(NetworkInterface):
                     self._adapter.connection_down(name=self.dynamic_ip_connection, wait=self.WAIT_FOR_CONNECTION_UP_S, ignore_error=True)
                     self._adapter.connection_modify(name=self.static_ip_connection, options={'connection.autoconnect': 'no'})
                     self._adapter.connection_down(name=self.static_ip_connection, wait=self.WAIT_FOR_CONNECTION_UP_S, ignore_error=True)
-                    self._adapter.connection_modify(name=self.dhcp_server_connection, options={'ipv6.method': 'disabled'})
-                    self._adapter.connection_modify(name=self.dhcp_server_connection, options={'ipv4.method': 'shared'})
-                    self._adapter.connection_modify(name=self.dhcp_server_connection, options={'ipv4.addresses': f'{self._ip}/{mask_bits}'})
-                    self._adapter.connection_modify(name=self.dhcp_server_connection, options={'ipv4.gateway': self._route})
-                    self._adapter.connection_modify(name=self.dhcp_server_connection, options={'connection.autoconnect': 'yes'})
+                    self._adapter.connection_modify(name=self.dhcp_server_connection,
+                                                    options=self._dhcp_server_settings() | {'connection.autoconnect': 'yes'})
                     self._adapter.connection_up(name=self.dhcp_server_connection, wait=self.WAIT_FOR_CONNECTION_UP_S)
+                    self._read_offloads()
                     self._ip_read_only = False
                     self._update_pending = False
                     self._status_message('Configured')
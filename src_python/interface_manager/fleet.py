@@ -0,0 +1,159 @@
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .config_watcher import ConfigWatcher
+from .inteface_manager import InterfaceManager
+from .rollout import Rollouts
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class Fleet:
+    """
+    Manage several remote hosts, one InterfaceManager (with its own SSH adapter) per host.
+    The periodic refreshes of all hosts share a budget of `MaxConcurrentRefresh` concurrent refreshes.
+    The statistics, probes and hotplug rescans only run on the `SamplerHosts`, within the same budget.
+    A host that cannot be set up is retried every `RetryPeriodSec`.
+    """
+    HOST_NAME_PATTERN = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+    def __init__(self, def_config):
+        self.def_config = def_config
+        self._hosts = self.parse_hosts(def_config.get('Fleet', 'Hosts'),
+                                       def_config.getint('RemoteHost', 'HostSSHPort'))
+        self._max_concurrent = def_config.getint('Fleet', 'MaxConcurrentRefresh')
+        self._retry_period_s = def_config.getfloat('Fleet', 'RetryPeriodSec')
+        self._sampler_hosts = [name for name in re.split(r'[,\s]+', def_config.get('Fleet', 'SamplerHosts').strip()) if name]
+        unknown = [name for name in self._sampler_hosts if name not in self._hosts]
+        if unknown:
+            raise ValueError(f"Unknown sampler hosts: {', '.join(unknown)}. Acceptable hosts are: {', '.join(self._hosts)}")
+        self._refresh_budget = threading.BoundedSemaphore(self._max_concurrent)
+        self._lock = threading.Lock()
+        self._managers = {}
+        self._errors = {}
+        self.rollouts = Rollouts(self, def_config)
+        self._start_managers(list(self._hosts))
+        retry_thread = threading.Thread(target=self.retry_hosts)
+        retry_thread.daemon = True
+        retry_thread.start()
+
+    @classmethod
+    def parse_hosts(cls, hosts, default_port=22):
+        """
+        Parse `[<name>=]<hostname>[:<port>], ...`, the name defaults to the hostname
+
+        :return:
+        A dictionary of host name to (hostname, port)
+        """
+        result = {}
+        for entry in re.split(r'[,\s]+', hosts.strip()):
+            if not entry:
+                continue
+            name, _, address = entry.rpartition('=')
+            hostname, _, port = address.partition(':')
+            name = name or hostname
+            if not hostname or not cls.HOST_NAME_PATTERN.match(name):
+                raise ValueError(f"Invalid host '{entry}', expected [<name>=]<hostname>[:<port>]")
+            if name in result:
+                raise ValueError(f"Duplicate host name '{name}'")
+            try:
+                result[name] = (hostname, int(port) if port else default_port)
+            except ValueError:
+                raise ValueError(f"Invalid port in host '{entry}'")
+        return result
+
+    def _start_manager(self, name):
+        hostname, port = self._hosts[name]
+        logger.info(f"Starting {name} ({hostname}:{port})")
+        try:
+            manager = InterfaceManager(self.def_config, host=(hostname, port), refresh_budget=self._refresh_budget,
+                                       samplers=name in self._sampler_hosts)
+        except Exception as e:
+            logger.warning(f"Failed to start {name} ({hostname}:{port}), retry in {self._retry_period_s} s: {e}")
+            with self._lock:
+                self._errors[name] = f"{e}"
+            return
+        with self._lock:
+            self._managers[name] = manager
+            self._errors.pop(name, None)
+
+    def _start_managers(self, names):
+        # The hosts are set up in parallel, bounded by the same budget as the refreshes
+        with ThreadPoolExecutor(max_workers=max(1, min(self._max_concurrent, len(names)))) as executor:
+            list(executor.map(self._start_manager, names))
+
+    def retry_hosts(self):
+        while True:
+            time.sleep(self._retry_period_s)
+            with self._lock:
+                names = [name for name in self._hosts if name not in self._managers]
+            if names:
+                self._start_managers(names)
+
+    def hosts(self):
+        return list(self._hosts)
+
+    def get_manager(self, name):
+        with self._lock:
+            return self._managers.get(name)
+
+    def get_error(self, name):
+        with self._lock:
+            return self._errors.get(name)
+
+    def apply_def_config(self, def_config, changed):
+        for option in ['Hosts', 'MaxConcurrentRefresh', 'SamplerHosts']:
+            if ConfigWatcher.is_changed(changed, 'Fleet', option):
+                logger.warning(f"Changing Fleet.{option} requires a restart, ignored")
+        self.def_config = def_config
+        self._retry_period_s = def_config.getfloat('Fleet', 'RetryPeriodSec')
+        self.rollouts.apply_def_config(def_config, changed)
+        with self._lock:
+            managers = list(self._managers.values())
+        for manager in managers:
+            manager.apply_def_config(def_config, changed)
+
+    def _host_status(self, name):
+        hostname, port = self._hosts[name]
+        status = {"hostname": hostname, "port": port}
+        manager = self.get_manager(name)
+        if manager is None:
+            error = self.get_error(name)
+            return status | {"state": "unreachable" if error else "starting", "error": error}
+        try:
+            interfaces = manager.get_status()
+        except Exception as e:
+            return status | {"state": "error", "error": f"{e}"}
+        best_uplink = None
+        for device, interface in interfaces.items():
+            if interface.get("uplink", {}).get("best"):
+                best_uplink = device
+        return status | {
+            "state": "running",
+            "error": None,
+            "interfaces": len(interfaces),
+            "connected": [device for device, interface in interfaces.items() if interface["status"] == 'connected'],
+            "errors": {device: interface["message"] for device, interface in interfaces.items() if interface["error"]},
+            "best_uplink": best_uplink
+        }
+
+    def get_status(self):
+        """
+        Get the status of every host, collected in parallel
+
+        :return:
+        A dictionary with 'hosts' (host name to 'hostname', 'port', 'state' (running, starting,
+        unreachable or error), 'error' and for running hosts 'interfaces' (count), 'connected'
+        (devices), 'errors' (device to message) and 'best_uplink') and 'summary' (host count per state)
+        """
+        names = self.hosts()
+        with ThreadPoolExecutor(max_workers=max(1, min(self._max_concurrent, len(names)))) as executor:
+            hosts = dict(zip(names, executor.map(self._host_status, names)))
+        summary = {}
+        for host in hosts.values():
+            summary[host["state"]] = summary.get(host["state"], 0) + 1
+        return {"hosts": hosts, "summary": summary}
@@ -4,13 +4,21 @@ import os
 import threading
 import time
 import tempfile
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
 
 from .adapters.nmcli_adapter import NMCliAdapter
 
 from .ap_interface import APInterface
+from .bond_interface import BondInterface
+from .config_watcher import ConfigWatcher
+from .connectivity_prober import ConnectivityProber
+from .stats_collector import StatsCollector
+from .uplink_policy import UplinkPolicy
 from .ethernet_interface import EthernetInterface
 from .network_interface_base import InterfaceTypes
+from .parameter_changes import ParameterChanges
 from .wifi_interface import WiFiInterface
 
 logger = logging.getLogger(__name__)
@@ -19,36 +27,157 @@ logger.setLevel(logging.INFO)
 
 class InterfaceManager:
 
-    def __init__(self, def_config):
+    def __init__(self, def_config, host=None, refresh_budget=None, samplers=True):
+        """
+        :param host: (hostname, port) of the remote host to manage instead of RemoteHost.HostHostname (fleet mode)
+        :param refresh_budget: semaphore shared by the managers of a fleet to limit the concurrent refreshes,
+        the statistics, probes and hotplug rescans included
+        :param samplers: False to disable the statistics, probes and hotplug rescans (fleet hosts not in Fleet.SamplerHosts)
+        """
         self._conf = {}
         self.last_disconnected_time = time.time()
-        self._enable_ap_after_period_s = def_config.getint('Interfaces', 'EnableAPAfterBeingDisconnectedForSeconds')
-        self._ap_always_on = def_config.getboolean('Interfaces', 'AccessPointAlwaysOn')
-        self._update_period_s = def_config.getfloat('Interfaces', 'UpdatePeriodSec')
-        self._check_ethernet_for_connection = def_config.get('Interfaces', 'CheckEthernetForConnection')
+        self._load_settings(def_config)
         self._use_sudo = def_config.getboolean('Interfaces', 'UseSudo')
-        self._use_whitelist = def_config.getboolean('Interfaces', 'InterfaceUseWhitelist')
-        self._whitelist = def_config.get('Interfaces', 'InterfaceWhitelist')
         self._use_dedicated_ap = def_config.getboolean('AP', 'UseDedicatedAP')
         self._dry_run = def_config.getboolean('Global', 'DryRun')
         self._remote_host = def_config.getboolean('RemoteHost', 'EnableRemoteHost')
         self._remote_host_port = def_config.getint('RemoteHost', 'HostSSHPort')
         self._remote_host_ssh_key = def_config.get('RemoteHost', 'HostSSHKeyFile')
         self._remote_host_hostname = def_config.get('RemoteHost', 'HostHostname')
-        self.ap_interface_idx = 0
+        if host is not None:
+            self._remote_host = True
+            self._remote_host_hostname, self._remote_host_port = host
+        self._refresh_budget = refresh_budget
+        self._enable_hotplug = samplers and def_config.getboolean('Interfaces', 'EnableHotplug')
+        self._enable_probes = samplers and def_config.getboolean('Probes', 'EnableProbes')
+        self._enable_uplink_policy = def_config.getboolean('Uplinks', 'EnableMultiUplinkPolicy')
+        self._enable_stats = samplers and def_config.getboolean('Stats', 'EnableStats')
+        self._bonds = {}
+        if def_config.getboolean('Bond', 'EnableBonds'):
+            self._bonds = BondInterface.parse_bonds(def_config.get('Bond', 'Bonds'))
+        self._bond_ports = {port for ports in self._bonds.values() for port in ports}
+        self.ap_interface = None
         self.previous_connected_state = True
         self.def_config = def_config
         self.adapter = NMCliAdapter(use_sudo=self._use_sudo, dry_run=self._dry_run,
                                     remote_host=self._remote_host,
                                     remote_host_port=self._remote_host_port,
                                     remote_host_ssh_key=self._remote_host_ssh_key,
-                                    remote_host_hostname=self._remote_host_hostname)
+                                    remote_host_hostname=self._remote_host_hostname,
+                                    query_cache_s=def_config.getfloat('Interfaces', 'AdapterQueryCacheSec'),
+                                    command_timeout_s=def_config.getfloat('Interfaces', 'CommandTimeoutSec'),
+                                    nmcli_timeout_s=def_config.getfloat('Interfaces', 'NMCliTimeoutSec'),
+                                    breaker_threshold=def_config.getint('Interfaces', 'CircuitBreakerFailures'),
+                                    breaker_reset_s=def_config.getfloat('Interfaces', 'CircuitBreakerResetSec'),
+                                    helper_socket=def_config.get('Interfaces', 'PrivilegedHelperSocket'),
+                                    profile_engine=def_config.get('Interfaces', 'ProfileEngine'),
+                                    keyfile_directory=def_config.get('Interfaces', 'KeyfileDirectory'))
         self.interfaces = []
+        self.interfaces_by_device = {}
+        self._registry_lock = threading.RLock()
+        self._hotplug_event = threading.Event()
+        self._update_event = threading.Event()
+        self.parameter_changes = ParameterChanges(def_config)
+        self.prober = None
+        if self._enable_probes:
+            self.prober = ConnectivityProber(self.adapter, def_config, self._uplink_candidates, budget=refresh_budget)
+        self.uplink_policy = None
+        if self._enable_uplink_policy:
+            if self.prober is not None:
+                self.uplink_policy = UplinkPolicy(def_config)
+            else:
+                logger.warning("Multi-uplink policy requires probes (Probes.EnableProbes), disabled")
+        self.stats = None
+        if self._enable_stats:
+            self.stats = StatsCollector(self.adapter, def_config, lambda: self.interfaces, budget=refresh_budget)
         self.detect_interfaces()
         self.initialise()
+        if self.prober is not None:
+            self.prober.start()
+        if self.stats is not None:
+            self.stats.start()
         periodic_update_thread = threading.Thread(target=self.periodic_update)
         periodic_update_thread.daemon = True
         periodic_update_thread.start()
+        if self._enable_hotplug:
+            self.start_hotplug()
+
+    def _create_interface(self, device, device_type):
+        if not self._is_allowed(device):
+            logger.info(f"Skip device {device}")
+            return None
+        if device in self._bond_ports or device_type == 'bond':
+            # Bonds are created from the configuration, the ports belong to them
+            return None
+        if device_type == 'wifi':
+            return WiFiInterface(device, self.adapter, def_config=self.def_config)
+        elif device_type == 'ethernet':
+            return EthernetInterface(device, self.adapter, def_config=self.def_config)
+        logger.info(f"Skip device {device} of unknown type {device_type}")
+        return None
+
+    def _load_settings(self, def_config):
+        # Settings that can be changed while running, see apply_def_config()
+        self._enable_ap_after_period_s = def_config.getint('Interfaces', 'EnableAPAfterBeingDisconnectedForSeconds')
+        self._ap_always_on = def_config.getboolean('Interfaces', 'AccessPointAlwaysOn')
+        self._update_period_s = def_config.getfloat('Interfaces', 'UpdatePeriodSec')
+        self._check_ethernet_for_connection = def_config.getboolean('Interfaces', 'CheckEthernetForConnection')
+        self._use_whitelist = def_config.getboolean('Interfaces', 'InterfaceUseWhitelist')
+        self._whitelist = def_config.get('Interfaces', 'InterfaceWhitelist')
+        self._hotplug_rescan_period_s = def_config.getfloat('Interfaces', 'HotplugRescanPeriodSec')
+        self._hotplug_settle_s = def_config.getfloat('Interfaces', 'HotplugSettleSec')
+        self._apply_timeout_s = def_config.getfloat('Interfaces', 'ApplyTimeoutSec')
+
+    def apply_def_config(self, def_config, changed):
+        for section, option in [('Global', 'DryRun'), ('Interfaces', 'UseSudo'), ('Interfaces', 'EnableHotplug'),
+                                ('Probes', 'EnableProbes'), ('Uplinks', 'EnableMultiUplinkPolicy'),
+                                ('Stats', 'EnableStats'), ('Stats', 'StatsSamplePeriodSec'),
+                                ('Stats', 'StatsSampleHistorySec'), ('Stats', 'StatsMinuteHistoryHours'),
+                                ('AP', 'UseDedicatedAP'), ('Bond', 'EnableBonds'), ('Bond', 'Bonds'),
+                                ('Interfaces', 'CommandTimeoutSec'), ('Interfaces', 'NMCliTimeoutSec'),
+                                ('Interfaces', 'CircuitBreakerFailures'), ('Interfaces', 'CircuitBreakerResetSec'),
+                                ('Interfaces', 'PrivilegedHelperSocket'), ('Interfaces', 'ProfileEngine'),
+                                ('Interfaces', 'KeyfileDirectory'),
+                                ('RemoteHost', 'EnableRemoteHost'),
+                                ('RemoteHost', 'HostSSHPort'), ('RemoteHost', 'HostSSHKeyFile'),
+                                ('RemoteHost', 'HostHostname')]:
+            if ConfigWatcher.is_changed(changed, section, option):
+                logger.warning(f"Changing {section}.{option} requires a restart, ignored")
+        self.def_config = def_config
+        self._load_settings(def_config)
+        for interface in self.interfaces:
+            interface.apply_def_config(def_config, changed)
+        if self.prober is not None and any(section == 'Probes' for section, _ in changed):
+            self.prober.apply_def_config(def_config, changed)
+        if self.uplink_policy is not None:
+            self.uplink_policy.apply_def_config(def_config, changed)
+        self.parameter_changes.apply_def_config(def_config, changed)
+        if ConfigWatcher.is_changed(changed, 'Interfaces', 'UpdatePeriodSec'):
+            self._update_event.set()
+        if ConfigWatcher.is_changed(changed, 'Interfaces', 'InterfaceUseWhitelist', 'InterfaceWhitelist'):
+            self.rescan_interfaces()
+
+    def _is_allowed(self, device):
+        return not self._use_whitelist or (device in self._whitelist)
+
+    def _publish(self, interfaces):
+        # Publish new containers so that readers iterating the old ones are not affected
+        self.interfaces = interfaces
+        self.interfaces_by_device = {interface.device: interface for interface in interfaces}
+
+    def get_interface(self, device):
+        return self.interfaces_by_device.get(device)
+
+    def _select_ap_interface(self):
+        if self._use_dedicated_ap:
+            return
+        # If a dedicated AP is not used, select the first WiFi interface to use as an AP
+        self.ap_interface = None
+        for interface in self.interfaces:
+            if interface.type == InterfaceTypes.INTERFACE_TYPE_WIFI:
+                self.ap_interface = interface
+                logger.info(f"Dedicated AP not used, {interface.device} will be used as AP")
+                break
 
     def detect_interfaces(self):
         logger.info("Detecting interfaces...")
@@ -56,66 +185,157 @@ class InterfaceManager:
         ap_found = False
         for device in devices:
             logger.info(f"Found {device.device} type {device.device_type}")
-            if not self._use_whitelist or (device.device in self._whitelist):
-                if device.device_type == 'wifi':
-                    interface = WiFiInterface(device.device, self.adapter, def_config=self.def_config)
-                    self.interfaces.append(interface)
-                elif device.device_type == 'ethernet':
-                    interface = EthernetInterface(device.device, self.adapter, def_config=self.def_config)
-                    self.interfaces.append(interface)
-                elif device.device_type == '__ap' and self._use_dedicated_ap:
-                    if not ap_found:
-                        ap_found = True
-                        interface = APInterface(device.device, self.adapter, def_config=self.def_config)
-                        self.ap_interface_idx = len(self.interfaces)
-                        self.interfaces.append(interface)
-                    else:
-                        logger.warning(f"More than one AP device found: {device.device}, skip")
+            if device.device_type == '__ap' and self._use_dedicated_ap:
+                if not self._is_allowed(device.device):
+                    logger.info(f"Skip device {device.device}")
+                elif not ap_found:
+                    ap_found = True
+                    self.ap_interface = APInterface(device.device, self.adapter, def_config=self.def_config)
+                    self._publish(self.interfaces + [self.ap_interface])
                 else:
-                    logger.info(f"Skip device {device.device} of unknown type {device.device_type}")
+                    logger.warning(f"More than one AP device found: {device.device}, skip")
             else:
-                logger.info(f"Skip device {device.device}")
+                interface = self._create_interface(device.device, device.device_type)
+                if interface is not None:
+                    self._publish(self.interfaces + [interface])
+        for bond, ports in self._bonds.items():
+            if not self._is_allowed(bond):
+                logger.info(f"Skip bond {bond}")
+                continue
+            logger.info(f"Bond {bond} with ports {', '.join(ports)}")
+            self._publish(self.interfaces + [BondInterface(bond, self.adapter, self.def_config, ports)])
         if self._use_dedicated_ap:
             # If a dedicated AP is used, ensure that the interface is created
             if not ap_found:
                 logger.info("AP interface not found, first run? Creating the interface...")
-                interface = APInterface("", self.adapter, def_config=self.def_config)
-                self.ap_interface_idx = len(self.interfaces)
-                self.interfaces.append(interface)
+                self.ap_interface = APInterface("", self.adapter, def_config=self.def_config)
+                self._publish(self.interfaces + [self.ap_interface])
             else:
-                logger.info(f"Dedicated AP interface found, {self.interfaces[self.ap_interface_idx].device} will be used as AP")
+                logger.info(f"Dedicated AP interface found, {self.ap_interface.device} will be used as AP")
         else:
-            # If a dedicated AP is not used, select the first WiFi interface to use as an AP
-            for idx, interface in enumerate(self.interfaces):
-                if interface.type == InterfaceTypes.INTERFACE_TYPE_WIFI:
-                    self.ap_interface_idx = idx
-                    logger.info(f"Dedicated AP not used, {interface.device} will be used as AP")
-                    break
+            self._select_ap_interface()
+
+    def add_interface(self, device, device_type):
+        with self._registry_lock:
+            if device in self.interfaces_by_device:
+                return None
+            interface = self._create_interface(device, device_type)
+            if interface is None:
+                return None
+            logger.info(f"Add interface {device} type {device_type}")
+            interface.initialise()
+            self._publish(self.interfaces + [interface])
+            if self.ap_interface is None:
+                self._select_ap_interface()
+            return interface
+
+    def remove_interface(self, device):
+        with self._registry_lock:
+            interface = self.interfaces_by_device.get(device)
+            if interface is None:
+                return None
+            if interface is self.ap_interface and self._use_dedicated_ap:
+                # The dedicated AP device is created by the AP interface itself
+                return None
+            if interface.type == InterfaceTypes.INTERFACE_TYPE_BOND:
+                # The bond device only exists while the bond connection is up
+                return None
+            logger.info(f"Remove interface {device}")
+            self._publish([x for x in self.interfaces if x is not interface])
+            if interface is self.ap_interface:
+                self._select_ap_interface()
+            return interface
+
+    def rescan_interfaces(self):
+        devices = {device.device: device.device_type for device in self.adapter.device()}
+        for interface in list(self.interfaces):
+            if interface.device not in devices or not self._is_allowed(interface.device):
+                self.remove_interface(interface.device)
+        for device, device_type in devices.items():
+            if device_type in ('wifi', 'ethernet'):
+                try:
+                    self.add_interface(device, device_type)
+                except Exception as e:
+                    logger.error(f"Failed to add interface {device}: {e}")
+
+    def _on_link_event(self, event, ifname):
+        self._hotplug_event.set()
+
+    def start_hotplug(self):
+        try:
+            self.adapter.link_monitor(self._on_link_event)
+        except Exception as e:
+            logger.warning(f"Link events are not available, rescan every {self._hotplug_rescan_period_s} s: {e}")
+        hotplug_thread = threading.Thread(target=self.hotplug_update)
+        hotplug_thread.daemon = True
+        hotplug_thread.start()
+
+    def hotplug_update(self):
+        while True:
+            if self._hotplug_event.wait(self._hotplug_rescan_period_s):
+                # Give NetworkManager time to pick up the device
+                time.sleep(self._hotplug_settle_s)
+            self._hotplug_event.clear()
+            try:
+                with self._refresh_budget or nullcontext():
+                    self.rescan_interfaces()
+            except Exception as e:
+                logger.error(f"Exception while rescanning interfaces: {e}")
+
+    def _uplink_candidates(self):
+        candidates = []
+        for interface in self.interfaces:
+            if interface.type == InterfaceTypes.INTERFACE_TYPE_WIFI:
+                if interface.connection_type != WiFiInterface.ConnectionType.CONNECTION_TYPE_STATION.value:
+                    continue
+            elif interface.type == InterfaceTypes.INTERFACE_TYPE_ETHERNET:
+                if interface.connection_type not in [EthernetInterface.ConnectionType.CONNECTION_TYPE_STATIC_IP,
+                                                     EthernetInterface.ConnectionType.CONNECTION_TYPE_DYNAMIC_IP]:
+                    continue
+            elif interface.type == InterfaceTypes.INTERFACE_TYPE_BOND:
+                if interface.connection_type == BondInterface.ConnectionType.CONNECTION_TYPE_DISABLED:
+                    continue
+            else:
+                continue
+            if interface.status == 'connected':
+                candidates.append(interface)
+        return candidates
+
+    def _is_usable(self, interface):
+        # Without probe results the NetworkManager state is trusted
+        return self.prober is None or self.prober.is_usable(interface.device)
 
     def refresh_interfaces(self):
         connected = False
         for interface in self.interfaces:
             interface.refresh()
-            if interface.status == 'connected':
+            if interface.status == 'connected' and self._is_usable(interface):
                 if interface.type == InterfaceTypes.INTERFACE_TYPE_WIFI:
                     connected = True
-                elif self._check_ethernet_for_connection and interface.type == InterfaceTypes.INTERFACE_TYPE_ETHERNET:
+                elif self._check_ethernet_for_connection and interface.type in [InterfaceTypes.INTERFACE_TYPE_ETHERNET,
+                                                                                 InterfaceTypes.INTERFACE_TYPE_BOND]:
                     connected = True
+        if self.uplink_policy is not None:
+            self.uplink_policy.update(self._uplink_candidates(), self.prober)
+        ap_interface = self.ap_interface
+        if ap_interface is None:
+            self.previous_connected_state = connected
+            return
         if connected != self.previous_connected_state:
             if connected:
                 if not self._ap_always_on:
-                    self.interfaces[self.ap_interface_idx].connection_type = APInterface.ConnectionType.CONNECTION_TYPE_DISABLED.value
+                    ap_interface.connection_type = APInterface.ConnectionType.CONNECTION_TYPE_DISABLED.value
             else:
                 self.last_disconnected_time = time.time()
         self.previous_connected_state = connected
         if not connected:
             if time.time() - self.last_disconnected_time > self._enable_ap_after_period_s:
-                if self.interfaces[self.ap_interface_idx].connection_type != APInterface.ConnectionType.CONNECTION_TYPE_AP.value:
+                if ap_interface.connection_type != APInterface.ConnectionType.CONNECTION_TYPE_AP.value:
                     logger.warning("Detected broken connection, set up hotspot")
-                    self.interfaces[self.ap_interface_idx].connection_type = APInterface.ConnectionType.CONNECTION_TYPE_AP.value
-                    self.interfaces[self.ap_interface_idx].ssid = self.def_config.get('AP', 'DefaultAPSSID')
-                    self.interfaces[self.ap_interface_idx].passphrase = self.def_config.get('AP', 'DefaultAPPassphrase')
-                    self.interfaces[self.ap_interface_idx].reload()
+                    ap_interface.connection_type = APInterface.ConnectionType.CONNECTION_TYPE_AP.value
+                    ap_interface.ssid = self.def_config.get('AP', 'DefaultAPSSID')
+                    ap_interface.passphrase = self.def_config.get('AP', 'DefaultAPPassphrase')
+                    ap_interface.reload()
 
     def initialise(self):
         for interface in self.interfaces:
@@ -124,19 +344,80 @@ class InterfaceManager:
     def periodic_update(self):
         while True:
             try:
-                self.refresh_interfaces()
+                with self._refresh_budget or nullcontext():
+                    self.refresh_interfaces()
             except Exception as e:
-                logger.error(f"Exception while refreshing: {e}")
-            time.sleep(self._update_period_s)
+                logger.error(f"Exception while refreshing {self._remote_host_hostname}: {e}"
+                             if self._remote_host else f"Exception while refreshing: {e}")
+            self._update_event.wait(self._update_period_s)
+            self._update_event.clear()
 
     def reload(self):
         for interface in self.interfaces:
             interface.reload()
 
     def load_config(self, config):
-        for interface in self.interfaces:
+        interfaces = [interface for interface in self.interfaces if interface.device in config]
+        for interface in interfaces:
+            interface.validate_config(config)
+        snapshot = {}
+        for interface in interfaces:
+            snapshot |= interface.snapshot_config()
+        applied, failed, applying = self._apply_config(interfaces, config)
+        if failed or applying:
+            # An interface still applying holds its lock until it finishes, its rollback would only queue behind it
+            rollback = [interface for interface in applied if interface.device not in applying]
+            logger.warning(f"Failed to apply configuration for {', '.join(failed + applying)}, rolling back "
+                           f"{', '.join(interface.device for interface in rollback) or 'nothing'}")
+            _, rollback_failed, rollback_applying = self._apply_config(rollback, snapshot)
+            if rollback_failed or rollback_applying:
+                logger.error(f"Failed to restore configuration for {', '.join(rollback_failed + rollback_applying)}")
+            errors = []
+            if failed:
+                errors.append(f"Failed to apply configuration for {', '.join(failed)}")
+            if applying:
+                errors.append(f"{', '.join(applying)} still applying after {self._apply_timeout_s} s, not restored")
+            raise Exception(f"{'; '.join(errors)}, previous configuration restored for the others")
+
+    def _apply_config(self, interfaces, config):
+        """
+        :return:
+        The interfaces that were started, the devices that failed and the devices still applying after ApplyTimeoutSec
+        """
+        # The dedicated AP is created on the radio of a Wi-Fi interface, so it is applied after the others
+        groups = [[interface for interface in interfaces if interface.type != InterfaceTypes.INTERFACE_TYPE_WIFI_AP],
+                  [interface for interface in interfaces if interface.type == InterfaceTypes.INTERFACE_TYPE_WIFI_AP]]
+        deadline = time.time() + self._apply_timeout_s
+        applied = []
+        failed = []
+        applying = []
+        for group in groups:
+            if not group:
+                continue
+            executor = ThreadPoolExecutor(max_workers=len(group))
+            futures = {executor.submit(self._apply_interface_config, interface, config): interface for interface in group}
+            done, not_done = wait(futures, timeout=max(0.0, deadline - time.time()))
+            # The interfaces still applying can't be interrupted, they finish in the background
+            executor.shutdown(wait=False)
+            applied += group
+            for future in not_done:
+                logger.warning(f"{futures[future].device} did not apply the configuration in {self._apply_timeout_s} s")
+                applying.append(futures[future].device)
+            for future in done:
+                if not future.result():
+                    failed.append(futures[future].device)
+            if failed or applying:
+                break
+        return applied, failed, applying
+
+    @staticmethod
+    def _apply_interface_config(interface, config):
+        try:
             interface.load_config(config)
-            interface.reload()
+        except Exception as e:
+            logger.warning(f"Failed to apply configuration for {interface.device}: {e}")
+            return False
+        return interface.config_applied
 
     def get_conf(self):
         self._conf = {}
@@ -148,4 +429,9 @@ class InterfaceManager:
         status = {}
         for interface in self.interfaces:
             status |= interface.get_status()
+            if self.prober is not None:
+                status[interface.device]["probe"] = self.prober.get_status(interface.device)
+            if self.uplink_policy is not None:
+                status[interface.device]["uplink"] = self.uplink_policy.get_status(interface.device)
+                status[interface.device]["uplink"]["route_metric"] = interface.route_metric
         return status
@@ -1,4 +1,5 @@
 import logging
+import re
 import threading
 from enum import Enum
 
@@ -12,10 +13,21 @@ class InterfaceTypes(Enum):
     INTERFACE_TYPE_WIFI = "wifi"
     INTERFACE_TYPE_WIFI_AP = "ap"
     INTERFACE_TYPE_ETHERNET = "ethernet"
+    INTERFACE_TYPE_BOND = "bond"
 
 
 class NetworkInterface:
     TYPE = InterfaceTypes.INTERFACE_TYPE_UNDEFINED
+    # Root queue disciplines, default keeps the kernel one
+    QDISCS = ["default", "fq_codel", "cake"]
+    # power_save -> NetworkManager 802-11-wireless.powersave
+    POWER_SAVE = {"default": "default", "on": "enable", "off": "disable"}
+    # Parameter name -> property, built once per class
+    PARAMETERS = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.PARAMETERS = cls._build_parameters()
 
     def __init__(self, device, adapter: NMCliAdapter, def_config):
         self._connection_type = ""
@@ -31,12 +43,68 @@ class NetworkInterface:
         self._status_message_str = ""
         self._status_error = False
         self._update_pending = False
+        self._route_metric = None
+        self._qdisc = def_config.get('Interfaces', 'DefaultQdisc')
+        self._qdisc_bandwidth = def_config.get('Interfaces', 'DefaultQdiscBandwidth')
+        self._parse_qdisc({})
+        self._qdisc_applied = None
+        # (qdisc, bandwidth) that could not be set and the error, retried when the configuration changes
+        self._qdisc_failed = None
+        self._qdisc_stats = None
+
+    @staticmethod
+    def _to_bool(value):
+        if isinstance(value, str):
+            return value.strip().lower() in ["true", "yes", "on", "1"]
+        return bool(value)
+
+    def _parse_power_save(self, value):
+        value = str(value).lower()
+        if value not in self.POWER_SAVE:
+            raise ValueError(f"Invalid power save: {value}, available values are: {', '.join(self.POWER_SAVE)}")
+        return value
+
+    def _power_save_connection(self):
+        """
+        :return:
+        The profile that gets the Wi-Fi power save setting, None if there is none
+        """
+        return None
+
+    def _apply_power_save(self):
+        connection = self._power_save_connection()
+        if connection is None:
+            return
+        try:
+            self._adapter.connection_modify(name=connection, options={'802-11-wireless.powersave': self.POWER_SAVE[self._power_save]})
+            if self._power_save != "default":
+                # The profile setting is used from the next activation, change the running state now
+                self._adapter.iw_dev_set_power_save(self._device, self._power_save == "on")
+        except Exception as e:
+            logger.warning(f"Failed to set power save {self._power_save} on {self._device}: {e}")
 
     def _status_message(self, message, error=False):
-        logger.info(f"Status Message {self._device}: {message}")
+        # Only changes are logged, the status is set on every refresh
+        if message != self._status_message_str or error != self._status_error:
+            if error:
+                logger.warning(f"Status Message {self._device}: {message}")
+            else:
+                logger.info(f"Status Message {self._device}: {message}")
         self._status_message_str = message
         self._status_error = error
 
+    def _refresh_status_message(self):
+        # A queue discipline that could not be set stays reported until the configuration changes
+        if self._qdisc_failed is not None and self._qdisc_failed[0] == (self._qdisc, self._qdisc_bandwidth):
+            self._status_message(self._qdisc_failed[1], error=True)
+        else:
+            self._status_message(self.status)
+
+    def apply_def_config(self, def_config, changed):
+        # Defaults are only used for new profiles, so the running configuration is kept
+        with self._lock:
+            self._def_config = def_config
+
     def refresh(self):
         raise NotImplementedError("Refresh on the base class not implemented")
 
@@ -46,21 +114,142 @@ class NetworkInterface:
     def _reload(self):
         raise NotImplementedError("Reload on the base class not implemented")
 
+    def _uplink_connection(self):
+        """
+        Name of the active profile that provides the default route, None if the interface is not an uplink
+        """
+        return None
+
+    def set_route_metric(self, metric):
+        with self._lock:
+            connection = self._uplink_connection()
+            if connection is None or self._route_metric == (connection, metric):
+                return
+            logger.info(f"Set route metric {metric} for {self._device} ({connection})")
+            self._adapter.connection_modify(name=connection, options={'ipv4.route-metric': str(metric)})
+            # Reapply changes the routes of the active connection without reconnecting
+            self._adapter.device_reapply(self._device)
+            self._route_metric = (connection, metric)
+
+    @property
+    def route_metric(self):
+        with self._lock:
+            if self._route_metric is None:
+                return None
+            return self._route_metric[1]
+
+    def _parse_qdisc(self, cfg):
+        qdisc = cfg.get("qdisc", self._qdisc)
+        bandwidth = str(cfg.get("qdisc_bandwidth", self._qdisc_bandwidth)).strip().lower()
+        if qdisc not in self.QDISCS:
+            raise ValueError(f"Invalid queue discipline: {qdisc}, available values are: {', '.join(self.QDISCS)}")
+        if bandwidth != "unlimited":
+            if not re.fullmatch(r"\d+(\.\d+)?[kmg]?bit", bandwidth):
+                raise ValueError(f"Invalid bandwidth: {bandwidth}, expected unlimited or a rate like 20mbit")
+            if qdisc != "cake":
+                raise ValueError("A bandwidth limit requires the cake queue discipline")
+        return {"qdisc": qdisc, "qdisc_bandwidth": bandwidth}
+
+    def _load_qdisc(self, values):
+        self._qdisc = values["qdisc"]
+        self._qdisc_bandwidth = values["qdisc_bandwidth"]
+
+    def _refresh_qdisc(self):
+        """
+        Set the root queue discipline if it differs (e.g. the device was re-created) and read its statistics
+        """
+        if not self._device:
+            return
+        desired = (self._qdisc, self._qdisc_bandwidth)
+        if self._qdisc_failed is not None:
+            if self._qdisc_failed[0] == desired:
+                return
+            self._qdisc_failed = None
+        try:
+            stats = self._adapter.qdisc_show(self._device)
+            if self._qdisc != "default":
+                if stats["kind"] != self._qdisc or self._qdisc_applied != desired:
+                    logger.info(f"Set queue discipline {self._qdisc} ({self._qdisc_bandwidth}) for {self._device}")
+                    bandwidth = None if self._qdisc_bandwidth == "unlimited" else self._qdisc_bandwidth
+                    try:
+                        self._adapter.qdisc_replace(self._device, self._qdisc, bandwidth)
+                    except Exception as e:
+                        # e.g. the sch_cake module is missing, retrying can't help
+                        self._qdisc_failed = (desired, f'Queue discipline {self._qdisc}: {e}')
+                        self._qdisc_stats = None
+                        self._status_message(self._qdisc_failed[1], error=True)
+                        return
+                    self._qdisc_applied = desired
+                    stats = self._adapter.qdisc_show(self._device)
+            elif self._qdisc_applied is not None:
+                logger.info(f"Restore the default queue discipline for {self._device}")
+                self._adapter.qdisc_delete(self._device)
+                self._qdisc_applied = None
+                stats = self._adapter.qdisc_show(self._device)
+            self._qdisc_stats = stats
+        except Exception as e:
+            logger.warning(f"Queue discipline of {self._device}: {e}")
+            self._qdisc_stats = None
+
+    def _parse_config(self, cfg):
+        raise NotImplementedError("Parse config on the base class not implemented")
+
+    def validate_config(self, config):
+        try:
+            self._parse_config(config[self._device])
+        except Exception as e:
+            raise Exception(f"Invalid configuration for {self._device}: {e}")
+
+    def apply_parameters(self, values):
+        """
+        Set several parameters as one change: the configuration parameters are validated
+        together and applied with a single reload, the other parameters are set one by one
+
+        :return:
+        True if the configuration was applied
+        """
+        with self._lock:
+            snapshot = self.snapshot_config()[self._device]
+            config = {key: value for key, value in values.items() if key in snapshot}
+            candidate = {self._device: snapshot | config}
+            if config:
+                self.validate_config(candidate)
+            for key, value in values.items():
+                if key not in config:
+                    self[key] = value
+            if config:
+                self.load_config(candidate)
+            return self.config_applied
+
+    def snapshot_config(self):
+        with self._lock:
+            return self.get_config()
+
+    @property
+    def config_applied(self):
+        with self._lock:
+            return not self._update_pending and not self._status_error
+
     def get_status(self):
         with self._lock:
             status = {
                 self._device: {
                     "message": self._status_message_str,
                     "error": self._status_error,
-                    "status": self.status
+                    "status": self.status,
+                    "qdisc": self._qdisc_stats
                 }
             }
             return status
 
+    @classmethod
+    def _build_parameters(cls):
+        return {x: getattr(cls, x) for x in dir(cls)
+                if isinstance(getattr(cls, x), property)}
+
     @classmethod
     def parameters(cls):
-        return [x for x in dir(cls)
-                if isinstance( getattr(cls, x), property) ]
+        return cls.PARAMETERS
 
     @property
     def status(self):
@@ -105,6 +294,31 @@ class NetworkInterface:
             if self._connection_type != value:
                 self._connection_type = value
 
+    @property
+    def qdisc(self):
+        with self._lock:
+            return self._qdisc
+
+    @qdisc.setter
+    def qdisc(self, value):
+        with self._lock:
+            self._load_qdisc(self._parse_qdisc({"qdisc": value}))
+
+    @property
+    def qdisc_bandwidth(self):
+        with self._lock:
+            return self._qdisc_bandwidth
+
+    @qdisc_bandwidth.setter
+    def qdisc_bandwidth(self, value):
+        with self._lock:
+            self._load_qdisc(self._parse_qdisc({"qdisc_bandwidth": value}))
+
+    @property
+    def qdisc_stats(self):
+        with self._lock:
+            return self._qdisc_stats
+
     @property
     def mask(self):
         with self._lock:
@@ -128,15 +342,18 @@ class NetworkInterface:
                 self._route = value
 
     def __getitem__(self, key):
+        parameter = self.PARAMETERS.get(key)
+        if parameter is None:
+            raise KeyError(f"'{key}' not found")
         with self._lock:
-            if hasattr(self, key):
-                return getattr(self, key)
-            else:
-                raise KeyError(f"'{key}' not found")
+            return parameter.fget(self)
 
     def __setitem__(self, key, value):
+        parameter = self.PARAMETERS.get(key)
+        if parameter is None or parameter.fset is None:
+            raise KeyError(f"'{key}' not found or not writable")
         with self._lock:
-            if hasattr(self.__class__, key) and isinstance(getattr(self.__class__, key), property):
-                setattr(self, key, value)
-            else:
-                raise KeyError(f"'{key}' not found or not writable")
+            parameter.fset(self, value)
+
+
+NetworkInterface.PARAMETERS = NetworkInterface._build_parameters()
@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class ChangeSet:
+    STATE_PENDING = "pending"
+    STATE_COMMITTING = "committing"
+    STATE_APPLIED = "applied"
+    STATE_FAILED = "failed"
+
+    def __init__(self, change_id, device):
+        self.id = change_id
+        self.device = device
+        self.parameters = {}
+        self.state = self.STATE_PENDING
+        self.error = None
+        self.created = time.time()
+        self.committed = None
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "interface": self.device,
+            "parameters": list(self.parameters),
+            "state": self.state,
+            "error": self.error,
+            "created": self.created,
+            "committed": self.committed
+        }
+
+
+class ParameterChanges:
+    """
+    Collect the parameter writes of every interface until no write arrived for the debounce
+    period, then commit them as one change: validated together and applied with a single reload.
+    Writes that arrive during a commit start the next change.
+    """
+    HISTORY_SIZE = 50
+
+    def __init__(self, def_config):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._history = {}
+        self._next_id = 1
+        self._load_settings(def_config)
+
+    def _load_settings(self, def_config):
+        self._debounce_s = def_config.getfloat('Interfaces', 'ParameterDebounceSec')
+
+    def apply_def_config(self, def_config, changed):
+        self._load_settings(def_config)
+
+    def write(self, interface, parameter, value):
+        """
+        :return:
+        The ChangeSet the write belongs to
+        """
+        prop = interface.parameters().get(parameter)
+        if prop is None or prop.fset is None:
+            raise KeyError(f"'{parameter}' not found or not writable")
+        device = interface.device
+        with self._lock:
+            pending = self._pending.get(device)
+            if pending is None:
+                change = ChangeSet(self._next_id, device)
+                self._next_id += 1
+                self._history.setdefault(device, deque(maxlen=self.HISTORY_SIZE)).append(change)
+            else:
+                change, timer = pending
+                timer.cancel()
+            change.parameters[parameter] = value
+            if self._debounce_s <= 0:
+                self._pending.pop(device, None)
+            else:
+                timer = threading.Timer(self._debounce_s, self._commit, args=(interface, change))
+                timer.daemon = True
+                self._pending[device] = (change, timer)
+                timer.start()
+                return change
+        self._apply(interface, change)
+        return change
+
+    def _commit(self, interface, change):
+        with self._lock:
+            pending = self._pending.get(change.device)
+            # The timer may have fired just before a later write restarted the window
+            if pending is None or pending[1] is not threading.current_thread():
+                return
+            del self._pending[change.device]
+        self._apply(interface, change)
+
+    @staticmethod
+    def _apply(interface, change):
+        change.state = ChangeSet.STATE_COMMITTING
+        logger.info(f"Commit change {change.id} for {change.device}: {', '.join(change.parameters)}")
+        try:
+            applied = interface.apply_parameters(change.parameters)
+            change.state = ChangeSet.STATE_APPLIED if applied else ChangeSet.STATE_FAILED
+            if not applied:
+                change.error = interface.get_status()[change.device]["message"]
+        except Exception as e:
+            logger.warning(f"Change {change.id} for {change.device} failed: {e}")
+            change.state = ChangeSet.STATE_FAILED
+            change.error = f"{e}"
+        change.committed = time.time()
+
+    def get_change(self, device, change_id):
+        with self._lock:
+            for change in self._history.get(device, []):
+                if change.id == change_id:
+                    return change.to_dict()
+            return None
+
+    def get_changes(self, device):
+        with self._lock:
+            return [change.to_dict() for change in self._history.get(device, [])]
@@ -0,0 +1,265 @@
+import logging
+import math
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class Rollout:
+    STATE_RUNNING = "running"
+    STATE_COMPLETED = "completed"
+    STATE_STOPPED = "stopped"
+    STATE_ABORTED = "aborted"
+
+    HOST_PENDING = "pending"
+    HOST_APPLYING = "applying"
+    HOST_APPLIED = "applied"
+    HOST_FAILED = "failed"
+    HOST_SKIPPED = "skipped"
+
+    def __init__(self, rollout_id, config, waves, max_parallel, max_failure_ratio):
+        self.id = rollout_id
+        self.config = config
+        self.waves = waves
+        self.max_parallel = max_parallel
+        self.max_failure_ratio = max_failure_ratio
+        self.state = self.STATE_RUNNING
+        self.wave = 0
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+        self.hosts = {name: {"wave": index + 1, "state": self.HOST_PENDING, "error": None,
+                             "started": None, "finished": None, "duration_s": None}
+                      for index, wave in enumerate(waves) for name in wave}
+        self.abort_requested = False
+        self._lock = threading.Lock()
+
+    def set_host(self, name, state, error=None):
+        with self._lock:
+            host = self.hosts[name]
+            host["state"] = state
+            host["error"] = error
+            if state == self.HOST_APPLYING:
+                host["started"] = time.time()
+            elif host["started"] is not None:
+                host["finished"] = time.time()
+                host["duration_s"] = round(host["finished"] - host["started"], 3)
+
+    def failure_ratio(self):
+        with self._lock:
+            done = [host for host in self.hosts.values() if host["state"] in (self.HOST_APPLIED, self.HOST_FAILED)]
+            failed = [host for host in done if host["state"] == self.HOST_FAILED]
+        return len(failed) / len(done) if done else 0.0
+
+    def finish(self, state, error=None):
+        with self._lock:
+            for host in self.hosts.values():
+                if host["state"] == self.HOST_PENDING:
+                    host["state"] = self.HOST_SKIPPED
+            self.state = state
+            self.error = error
+            self.finished = time.time()
+
+    def to_dict(self):
+        with self._lock:
+            progress = {}
+            for host in self.hosts.values():
+                progress[host["state"]] = progress.get(host["state"], 0) + 1
+            return {
+                "id": self.id,
+                "state": self.state,
+                "error": self.error,
+                "wave": self.wave,
+                "waves": [len(wave) for wave in self.waves],
+                "max_parallel": self.max_parallel,
+                "max_failure_ratio": self.max_failure_ratio,
+                "interfaces": list(self.config),
+                "progress": progress,
+                "hosts": {name: dict(host) for name, host in self.hosts.items()},
+                "started": self.started,
+                "finished": self.finished,
+                "duration_s": round((self.finished or time.time()) - self.started, 3)
+            }
+
+
+class Rollouts:
+    """
+    Apply a configuration to many hosts of the fleet in waves: a canary, then growing shares of the hosts.
+    Every host applies it with InterfaceManager.load_config (validated, rolled back on failure), at most
+    `max_parallel` hosts at a time. The rollout stops after a wave in which the failure ratio of the
+    finished hosts exceeded `max_failure_ratio`, the remaining hosts are skipped.
+    """
+    HISTORY_SIZE = 20
+
+    def __init__(self, fleet, def_config):
+        self._fleet = fleet
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=self.HISTORY_SIZE)
+        self._next_id = 1
+        self._load_settings(def_config)
+
+    def _load_settings(self, def_config):
+        self._waves = self.parse_waves(def_config.get('Fleet', 'RolloutWaves', raw=True))
+        self._max_parallel = def_config.getint('Fleet', 'RolloutMaxParallel')
+        self._max_failure_ratio = def_config.getfloat('Fleet', 'RolloutMaxFailureRatio')
+
+    def apply_def_config(self, def_config, changed):
+        self._load_settings(def_config)
+
+    @staticmethod
+    def parse_waves(waves):
+        """
+        Parse the cumulative wave sizes, host counts or percentages of the hosts (e.g. `1, 10%, 50%, 100%`)
+
+        :return:
+        A list of (value, is_percentage)
+        """
+        if isinstance(waves, str):
+            waves = [wave for wave in re.split(r'[,\s]+', waves.strip()) if wave]
+        if not isinstance(waves, list) or not waves:
+            raise ValueError("Waves must be a non-empty list of host counts or percentages (e.g. 1, 10%, 100%)")
+        result = []
+        for wave in waves:
+            text = str(wave).strip()
+            try:
+                if text.endswith('%'):
+                    value = float(text[:-1])
+                    if not 0 < value <= 100:
+                        raise ValueError
+                    result.append((value, True))
+                else:
+                    value = int(text)
+                    if value < 1:
+                        raise ValueError
+                    result.append((value, False))
+            except ValueError:
+                raise ValueError(f"Invalid wave '{wave}', expected a host count or a percentage (e.g. 1, 10%)")
+        return result
+
+    @staticmethod
+    def plan_waves(hosts, waves):
+        """
+        Split the hosts into waves, every wave has at least one host and the last one takes the rest
+
+        :return:
+        A list of lists of host names
+        """
+        plan = []
+        done = 0
+        for value, is_percentage in waves:
+            if done == len(hosts):
+                break
+            target = math.ceil(len(hosts) * value / 100) if is_percentage else value
+            target = min(len(hosts), max(target, done + 1))
+            plan.append(hosts[done:target])
+            done = target
+        if done < len(hosts):
+            plan.append(hosts[done:])
+        return plan
+
+    def start(self, config, hosts=None, waves=None, max_parallel=None, max_failure_ratio=None):
+        """
+        :param config: configuration in the /api/config format ({interface: {parameter: value}})
+        :param hosts: host names, all hosts of the fleet if None
+        :return:
+        The started Rollout
+        """
+        if not isinstance(config, dict) or not config or \
+                not all(isinstance(value, dict) for value in config.values()):
+            raise ValueError("The config must be a non-empty dictionary of interface configurations")
+        all_hosts = self._fleet.hosts()
+        if hosts is None:
+            hosts = all_hosts
+        unknown = [host for host in hosts if host not in all_hosts]
+        if unknown:
+            raise ValueError(f"Unknown hosts: {', '.join(map(str, unknown))}. "
+                             f"Acceptable hosts are: {', '.join(all_hosts)}")
+        if not hosts:
+            raise ValueError("No hosts selected")
+        hosts = list(dict.fromkeys(hosts))
+        waves = self._waves if waves is None else self.parse_waves(waves)
+        max_parallel = self._max_parallel if max_parallel is None else int(max_parallel)
+        if max_parallel < 1:
+            raise ValueError("max_parallel must be at least 1")
+        max_failure_ratio = self._max_failure_ratio if max_failure_ratio is None else float(max_failure_ratio)
+        if not 0 <= max_failure_ratio <= 1:
+            raise ValueError("max_failure_ratio must be between 0 and 1")
+        with self._lock:
+            rollout = Rollout(self._next_id, config, self.plan_waves(hosts, waves), max_parallel, max_failure_ratio)
+            self._next_id += 1
+            self._history.append(rollout)
+        logger.info(f"Start rollout {rollout.id} of {', '.join(config)} to {len(hosts)} hosts "
+                    f"in waves of {', '.join(str(len(wave)) for wave in rollout.waves)}")
+        rollout_thread = threading.Thread(target=self._run, args=(rollout,))
+        rollout_thread.daemon = True
+        rollout_thread.start()
+        return rollout
+
+    def _run(self, rollout):
+        for index, wave in enumerate(rollout.waves):
+            if rollout.abort_requested:
+                break
+            rollout.wave = index + 1
+            with ThreadPoolExecutor(max_workers=min(rollout.max_parallel, len(wave))) as executor:
+                list(executor.map(lambda name: self._apply_host(rollout, name), wave))
+            ratio = rollout.failure_ratio()
+            if ratio > rollout.max_failure_ratio:
+                logger.warning(f"Rollout {rollout.id} stopped after wave {rollout.wave}: failure ratio {ratio:.2f} "
+                               f"exceeds {rollout.max_failure_ratio}")
+                rollout.finish(Rollout.STATE_STOPPED,
+                               f"Failure ratio {ratio:.2f} exceeds {rollout.max_failure_ratio} after wave {rollout.wave}")
+                return
+        if rollout.abort_requested:
+            logger.warning(f"Rollout {rollout.id} aborted after wave {rollout.wave}")
+            rollout.finish(Rollout.STATE_ABORTED, "Aborted")
+            return
+        logger.info(f"Rollout {rollout.id} completed")
+        rollout.finish(Rollout.STATE_COMPLETED)
+
+    def _apply_host(self, rollout, name):
+        if rollout.abort_requested:
+            return
+        rollout.set_host(name, Rollout.HOST_APPLYING)
+        manager = self._fleet.get_manager(name)
+        if manager is None:
+            rollout.set_host(name, Rollout.HOST_FAILED, f"Host is not available: {self._fleet.get_error(name)}")
+            return
+        if not any(manager.get_interface(device) is not None for device in rollout.config):
+            rollout.set_host(name, Rollout.HOST_FAILED, f"None of the interfaces found: {', '.join(rollout.config)}")
+            return
+        try:
+            manager.load_config(rollout.config)
+        except Exception as e:
+            logger.warning(f"Rollout {rollout.id} failed on {name}: {e}")
+            rollout.set_host(name, Rollout.HOST_FAILED, f"{e}")
+            return
+        rollout.set_host(name, Rollout.HOST_APPLIED)
+
+    def abort(self, rollout_id):
+        """
+        Stop a running rollout, the hosts being applied finish and the others are skipped
+
+        :return:
+        The Rollout or None if not found
+        """
+        rollout = self.get(rollout_id)
+        if rollout is not None and rollout.state == Rollout.STATE_RUNNING:
+            rollout.abort_requested = True
+        return rollout
+
+    def get(self, rollout_id):
+        with self._lock:
+            for rollout in self._history:
+                if rollout.id == rollout_id:
+                    return rollout
+            return None
+
+    def get_rollouts(self):
+        with self._lock:
+            rollouts = list(self._history)
+        return [rollout.to_dict() for rollout in rollouts]
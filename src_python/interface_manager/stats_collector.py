@@ -0,0 +1,158 @@
+import logging
+import threading
+import time
+from array import array
+from contextlib import nullcontext
+
+from .adapters.nmcli_adapter import NMCliAdapter
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+COUNTERS = ["rx_bytes", "tx_bytes", "rx_packets", "tx_packets",
+            "rx_errors", "tx_errors", "rx_dropped", "tx_dropped"]
+
+
+class RingBuffer:
+    """
+    Fixed-size buffer of floats, the oldest value is overwritten
+    """
+
+    def __init__(self, size):
+        self._values = array('d', bytes(8 * size))
+        self._size = size
+        self._head = 0
+        self._count = 0
+
+    def append(self, value):
+        self._values[self._head] = value
+        self._head = (self._head + 1) % self._size
+        self._count = min(self._count + 1, self._size)
+
+    def values(self):
+        start = (self._head - self._count) % self._size
+        if start + self._count <= self._size:
+            return self._values[start:start + self._count].tolist()
+        return self._values[start:].tolist() + self._values[:self._head].tolist()
+
+
+class RateHistory:
+    """
+    Rates (per second) of one counter at two resolutions: every sample and per-minute averages
+    """
+
+    def __init__(self, sample_size, minute_size):
+        self.samples = RingBuffer(sample_size)
+        self.minutes = RingBuffer(minute_size)
+        self._minute_sum = 0.0
+        self._minute_time = 0.0
+
+    def add(self, rate, dt):
+        self.samples.append(rate)
+        self._minute_sum += rate * dt
+        self._minute_time += dt
+        if self._minute_time >= 60:
+            self.minutes.append(self._minute_sum / self._minute_time)
+            self._minute_sum = 0.0
+            self._minute_time = 0.0
+
+
+class InterfaceStats:
+    def __init__(self, sample_size, minute_size):
+        self._history = {counter: RateHistory(sample_size, minute_size) for counter in COUNTERS}
+        self._last = None
+        self._last_time = None
+        self.updated = None
+
+    def add(self, counters, now):
+        if self._last is not None:
+            dt = now - self._last_time
+            if dt > 0:
+                for counter, history in self._history.items():
+                    delta = counters.get(counter, 0) - self._last.get(counter, 0)
+                    # Counters start over when the device is re-created
+                    history.add(max(delta, 0) / dt, dt)
+        self._last = counters
+        self._last_time = now
+        self.updated = time.time()
+
+    def get(self, tier, counters):
+        result = {}
+        for counter in counters:
+            history = self._history[counter]
+            buffer = history.minutes if tier == "minute" else history.samples
+            result[counter] = [round(value, 1) for value in buffer.values()]
+        return result
+
+    @property
+    def totals(self):
+        return dict(self._last) if self._last is not None else {}
+
+
+class StatsCollector:
+    """
+    Sample the statistics counters of the managed interfaces and keep the rate history
+    """
+
+    def __init__(self, adapter: NMCliAdapter, def_config, get_interfaces, budget=None):
+        """
+        :param budget: semaphore limiting the concurrent commands of the fleet hosts, None for no limit
+        """
+        self._adapter = adapter
+        self._get_interfaces = get_interfaces
+        self._budget = budget
+        self._lock = threading.RLock()
+        self._stats = {}
+        self._period_s = def_config.getfloat('Stats', 'StatsSamplePeriodSec')
+        self._sample_size = max(1, round(def_config.getfloat('Stats', 'StatsSampleHistorySec') / self._period_s))
+        self._minute_size = max(1, round(def_config.getfloat('Stats', 'StatsMinuteHistoryHours') * 60))
+
+    def start(self):
+        stats_thread = threading.Thread(target=self._run)
+        stats_thread.daemon = True
+        stats_thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                with self._budget or nullcontext():
+                    self.sample()
+            except Exception as e:
+                logger.error(f"Exception while sampling statistics: {e}")
+            time.sleep(self._period_s)
+
+    def sample(self):
+        devices = [interface.device for interface in self._get_interfaces()]
+        samples = {}
+        for device in devices:
+            try:
+                samples[device] = self._adapter.interface_statistics(device)
+            except Exception as e:
+                logger.debug(f"No statistics for {device}: {e}")
+        now = time.monotonic()
+        with self._lock:
+            self._stats = {device: self._stats[device] for device in devices if device in self._stats}
+            for device, counters in samples.items():
+                if device not in self._stats:
+                    self._stats[device] = InterfaceStats(self._sample_size, self._minute_size)
+                self._stats[device].add(counters, now)
+
+    def get_stats(self, device, tier="second", counters=None):
+        if tier not in ["second", "minute"]:
+            raise KeyError(f"Unknown tier {tier}, available tiers are: second, minute")
+        if counters is None:
+            counters = COUNTERS
+        for counter in counters:
+            if counter not in COUNTERS:
+                raise KeyError(f"Unknown counter {counter}, available counters are: {', '.join(COUNTERS)}")
+        with self._lock:
+            stats = self._stats.get(device)
+            if stats is None:
+                return None
+            return {
+                "tier": tier,
+                "period_s": 60 if tier == "minute" else self._period_s,
+                "updated": stats.updated,
+                "totals": stats.totals,
+                "rates": stats.get(tier, counters)
+            }
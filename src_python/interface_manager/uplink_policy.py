@@ -0,0 +1,72 @@
+import logging
+import math
+import time
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+
+class UplinkPolicy:
+    """
+    Rank the connected uplinks by the measured RTT and loss and set the route metrics,
+    so the best uplink carries the default traffic. The current best uplink is only
+    replaced by one that is better by more than the hysteresis and not more often than
+    once per hold period.
+    """
+
+    def __init__(self, def_config):
+        self._best = None
+        self._changed_time = 0.0
+        self._scores = {}
+        self._load_settings(def_config)
+
+    def _load_settings(self, def_config):
+        self._metric_base = def_config.getint('Uplinks', 'RouteMetricBase')
+        self._metric_step = def_config.getint('Uplinks', 'RouteMetricStep')
+        self._loss_penalty_ms = def_config.getfloat('Uplinks', 'LossPenaltyMs')
+        self._hysteresis_ms = def_config.getfloat('Uplinks', 'HysteresisMs')
+        self._hold_s = def_config.getfloat('Uplinks', 'MinHoldSec')
+
+    def apply_def_config(self, def_config, changed):
+        self._load_settings(def_config)
+
+    def _score(self, stats, usable):
+        if stats is None or not usable or stats[0] is None:
+            return math.inf
+        rtt, loss = stats
+        return rtt * 1000 + loss * self._loss_penalty_ms
+
+    def update(self, interfaces, prober):
+        scores = {interface.device: self._score(prober.get_stats(interface.device), prober.is_usable(interface.device))
+                  for interface in interfaces}
+        self._scores = scores
+        if not scores:
+            self._best = None
+            return
+        ranking = sorted(scores, key=lambda device: (scores[device], device))
+        candidate = ranking[0]
+        if self._best in scores and candidate != self._best:
+            better_by = scores[self._best] - scores[candidate]
+            # A failed uplink is replaced right away
+            if math.isfinite(scores[self._best]) and \
+                    (better_by <= self._hysteresis_ms or time.monotonic() - self._changed_time < self._hold_s):
+                candidate = self._best
+        if candidate != self._best:
+            logger.info(f"Best uplink {self._best} -> {candidate} (score {scores[candidate]:.1f})")
+            self._best = candidate
+            self._changed_time = time.monotonic()
+        ranking.remove(candidate)
+        ranking.insert(0, candidate)
+        for rank, device in enumerate(ranking):
+            interface = next(interface for interface in interfaces if interface.device == device)
+            try:
+                interface.set_route_metric(self._metric_base + rank * self._metric_step)
+            except Exception as e:
+                logger.error(f"Failed to set route metric for {device}: {e}")
+
+    def get_status(self, device):
+        score = self._scores.get(device)
+        return {
+            "best": device == self._best,
+            "score": None if score is None or math.isinf(score) else round(score, 1)
+        }
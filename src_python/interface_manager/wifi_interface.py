@@ -1,14 +1,17 @@
 import logging
+import threading
 import time
+from collections import deque
 from enum import Enum
 
 from .adapters.nmcli_adapter import NMCliAdapter
+from .channel_planner import ChannelPlanner, ChannelPlanning
 from .network_interface_base import NetworkInterface, InterfaceTypes
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-class WiFiInterface(NetworkInterface):
+class WiFiInterface(ChannelPlanning, NetworkInterface):
     WAIT_FOR_CONNECTION_UP_S = 5
 
     class ConnectionType(str, Enum):
@@ -24,6 +27,26 @@ class WiFiInterface(NetworkInterface):
                 available_types = ", ".join([e.value for e in cls])
                 raise ValueError(f"Invalid connection type: {value}, available types are: {available_types}")
 
+    class BandPreference(str, Enum):
+        BAND_ANY = "any"
+        BAND_2_4_GHZ = "2.4"
+        BAND_5_GHZ = "5"
+
+        @classmethod
+        def from_string(cls, value: str):
+            try:
+                return cls(value)
+            except ValueError:
+                available_bands = ", ".join([e.value for e in cls])
+                raise ValueError(f"Invalid band preference: {value}, available bands are: {available_bands}")
+
+        def matches(self, freq):
+            if self == self.BAND_2_4_GHZ:
+                return freq < 3000
+            elif self == self.BAND_5_GHZ:
+                return 4900 <= freq < 5925
+            return True
+
     TYPE = InterfaceTypes.INTERFACE_TYPE_WIFI
 
     def __init__(self, device, adapter: NMCliAdapter, def_config):
@@ -33,6 +56,14 @@ class WiFiInterface(NetworkInterface):
         self._ssid = ""
         self._passphrase = ""
         self._ip_read_only = True
+        self._link = {}
+        self._power_save_state = None
+        self._link_history = deque(maxlen=def_config.getint('WiFi', 'LinkHistorySize'))
+        self._scan_results = []
+        self._last_roam_check = time.time()
+        self._roam_running = False
+        self._roam_generation = 0
+        self._channel_planner = ChannelPlanner(def_config)
         self._load_defaults()
 
     def _load_defaults(self):
@@ -42,28 +73,70 @@ class WiFiInterface(NetworkInterface):
         self._route = self._def_config.get('WiFi', 'DefaultWiFiRoute')
         self._ssid = self._def_config.get('WiFi', 'DefaultWiFiSSID')
         self._passphrase = self._def_config.get('WiFi', 'DefaultWiFiPassphrase')
+        self._band_preference = self.BandPreference.from_string(self._def_config.get('WiFi', 'DefaultWiFiBandPreference'))
+        self._min_signal = self._def_config.getint('WiFi', 'DefaultWiFiMinSignal')
+        self._bssid = self._def_config.get('WiFi', 'DefaultWiFiBSSID').lower()
+        self._roaming = self._def_config.getboolean('WiFi', 'DefaultWiFiRoaming')
+        self._power_save = self._parse_power_save(self._def_config.get('WiFi', 'DefaultWiFiPowerSave'))
+        self._roam_signal_threshold = self._def_config.getint('WiFi', 'RoamSignalThreshold')
+        self._roam_min_improvement = self._def_config.getint('WiFi', 'RoamMinImprovement')
+        self._roam_check_period_s = self._def_config.getfloat('WiFi', 'RoamCheckPeriodSec')
+
+    def _parse_config(self, cfg):
+        parameters = ["connection_type", "ip", "mask", "route", "ssid", "passphrase"]
+        for parameter in parameters:
+            if parameter not in cfg:
+                raise Exception(f"Configuration missing parameters: {parameter}")
+        # The station selection policy is optional
+        return self._parse_qdisc(cfg) | {
+            "connection_type": self.ConnectionType.from_string(cfg["connection_type"]),
+            "ip": cfg["ip"],
+            "mask": cfg["mask"],
+            "route": cfg["route"],
+            "ssid": cfg["ssid"],
+            "passphrase": cfg["passphrase"],
+            "band_preference": self.BandPreference.from_string(cfg.get("band_preference", self._band_preference.value)),
+            "min_signal": int(cfg.get("min_signal", self._min_signal)),
+            "bssid": str(cfg.get("bssid", self._bssid)).lower(),
+            "roaming": self._to_bool(cfg.get("roaming", self._roaming)),
+            "power_save": self._parse_power_save(cfg.get("power_save", self._power_save))
+        }
 
     def load_config(self, config):
         with self._lock:
             try:
-                print(config)
-                cfg = config[self._device]
-                parameters = ["connection_type", "ip", "mask", "route", "ssid", "passphrase"]
-                for parameter in parameters:
-                    if parameter not in cfg:
-                        raise Exception(f"Configuration missing parameters: {parameter}")
-                self._connection_type = self.ConnectionType.from_string(cfg["connection_type"])
-                self._ip = cfg["ip"]
-                self._mask = cfg["mask"]
-                self._route = cfg["route"]
-                self._ssid = cfg["ssid"]
-                self._passphrase = cfg["passphrase"]
+                values = self._parse_config(config[self._device])
+                self._load_qdisc(values)
+                self._connection_type = values["connection_type"]
+                self._ip = values["ip"]
+                self._mask = values["mask"]
+                self._route = values["route"]
+                self._ssid = values["ssid"]
+                self._passphrase = values["passphrase"]
+                self._band_preference = values["band_preference"]
+                self._min_signal = values["min_signal"]
+                self._bssid = values["bssid"]
+                self._roaming = values["roaming"]
+                self._power_save = values["power_save"]
                 logger.info(f"Read parameters for {self._device}: {self._connection_type} | IP {self._ip} | Mask {self._mask} | Route {self._route} | SSID {self._ssid}")
                 self.reload()
             except Exception as e:
                 logger.warning(f"Failed to apply configuration {config} for {self._device}: ({e})")
                 raise Exception(f"Failed to apply configuration {config} for {self._device}: ({e})")
 
+    def snapshot_config(self):
+        with self._lock:
+            conf = self.get_config()
+            # The passphrase is hidden in station mode, but is needed to restore the connection
+            conf[self._device]["passphrase"] = self._passphrase
+            return conf
+
+    def _uplink_connection(self):
+        # Station profiles are created by NetworkManager and named after the SSID
+        if self._connection_type == self.ConnectionType.CONNECTION_TYPE_STATION and self._ssid:
+            return self._ssid
+        return None
+
     def get_config(self):
         with self._lock:
             conf = {
@@ -73,12 +146,33 @@ class WiFiInterface(NetworkInterface):
                     "ip": self._ip,
                     "mask": self._mask,
                     "route": self._route,
+                    "qdisc": self._qdisc,
+                    "qdisc_bandwidth": self._qdisc_bandwidth,
                     "ssid": self._ssid,
-                    "passphrase": self._passphrase if self._connection_type == self.ConnectionType.CONNECTION_TYPE_AP else ""
+                    "passphrase": self._passphrase if self._connection_type == self.ConnectionType.CONNECTION_TYPE_AP else "",
+                    "band_preference": self._band_preference.value,
+                    "min_signal": self._min_signal,
+                    "bssid": self._bssid,
+                    "roaming": self._roaming,
+                    "power_save": self._power_save,
+                    "channel": self._channel_planner.plan["channel"] if self._channel_planner.plan else None,
+                    "channel_score": self._channel_planner.plan["score"] if self._channel_planner.plan else None
                 }
             }
             return conf
 
+    def _hotspot_settings(self, plan=None):
+        settings = {'connection.interface-name': self._device,
+                    '802-11-wireless.mode': 'ap',
+                    '802-11-wireless.ssid': self._ssid}
+        if plan is not None:
+            settings |= {'802-11-wireless.band': plan["band"],
+                         '802-11-wireless.channel': str(plan["channel"])}
+        return settings | {'802-11-wireless-security.key-mgmt': 'wpa-psk',
+                           '802-11-wireless-security.psk': self._passphrase,
+                           '802-11-wireless-security.pmf': 'disable',
+                           'ipv4.method': 'shared'}
+
     def initialise(self):
         connections = self._adapter.connection()
         hotspot_found = False
@@ -111,7 +205,8 @@ class WiFiInterface(NetworkInterface):
 
         if not hotspot_found:
             logger.info(f"{self._device} Hotspot connection {self._hotspot_connection} not found, create")
-            self._adapter.connection_add(conn_type='wifi', options={'con-name': self._hotspot_connection}, ifname=self._device, autoconnect=False, ssid=self._ssid)
+            self._adapter.provision_profiles([{'name': self._hotspot_connection, 'type': 'wifi', 'ifname': self._device,
+                                               'settings': self._hotspot_settings() | {'connection.autoconnect': 'no'}}])
             self.reload()
 
         self.refresh()
@@ -152,6 +247,80 @@ class WiFiInterface(NetworkInterface):
             if self._passphrase != value:
                 self._passphrase = value
 
+    @property
+    def link(self):
+        with self._lock:
+            return dict(self._link)
+
+    @property
+    def link_history(self):
+        with self._lock:
+            return [{"time": sample[0], "signal": sample[1], "tx_bitrate": sample[2],
+                     "rx_bitrate": sample[3], "freq": sample[4]} for sample in self._link_history]
+
+    def get_status(self):
+        with self._lock:
+            status = super().get_status()
+            if self._link:
+                status[self._device]["link"] = dict(self._link)
+            status[self._device]["power_save"] = self._power_save_state
+            return status
+
+    @property
+    def band_preference(self):
+        with self._lock:
+            return self._band_preference.value
+
+    @band_preference.setter
+    def band_preference(self, value):
+        with self._lock:
+            if self._band_preference != value:
+                self._band_preference = self.BandPreference.from_string(value)
+
+    @property
+    def min_signal(self):
+        with self._lock:
+            return self._min_signal
+
+    @min_signal.setter
+    def min_signal(self, value):
+        with self._lock:
+            if self._min_signal != value:
+                self._min_signal = int(value)
+
+    @property
+    def bssid(self):
+        with self._lock:
+            return self._bssid
+
+    @bssid.setter
+    def bssid(self, value):
+        with self._lock:
+            if self._bssid != value:
+                self._bssid = str(value).lower()
+
+    @property
+    def roaming(self):
+        with self._lock:
+            return self._roaming
+
+    @roaming.setter
+    def roaming(self, value):
+        with self._lock:
+            if self._roaming != value:
+                self._roaming = self._to_bool(value)
+
+    @property
+    def power_save(self):
+        with self._lock:
+            return self._power_save
+
+    @power_save.setter
+    def power_save(self, value):
+        with self._lock:
+            self._power_save = self._parse_power_save(value)
+            self._apply_power_save()
+
     @property
     def scan(self):
         with self._lock:
@@ -161,12 +330,102 @@ class WiFiInterface(NetworkInterface):
         wifi_list = set()
         logger.info(f'Start scan on {self._device}')
         results = self._adapter.device_wifi(ifname=self._device)
+        self._scan_results = results
         for result in results:
             if result.ssid:
                 wifi_list.add(result.ssid)
-        logger.info(f'Scan results {self._device}: {wifi_list}')
+        logger.debug(f'Scan results {self._device}: {wifi_list}')
         return list(wifi_list)
 
+    def _selection_enabled(self):
+        return bool(self._bssid) or self._roaming or self._min_signal > 0 or \
+            self._band_preference != self.BandPreference.BAND_ANY
+
+    def _select_bssid(self):
+        """
+        Pick the BSSID of the configured SSID: the pinned one, otherwise the strongest one
+        above the minimum signal, in the preferred band if there is any
+        """
+        if self._bssid:
+            return self._bssid
+        candidates = [result for result in self._scan_results
+                      if result.ssid == self._ssid and result.bssid and result.signal >= self._min_signal]
+        preferred = [result for result in candidates if self._band_preference.matches(result.freq)]
+        if preferred:
+            candidates = preferred
+        if not candidates:
+            return None
+        return max(candidates, key=lambda result: result.signal).bssid.lower()
+
+    def _connect(self, bssid=None):
+        if bssid is None:
+            # Clear a BSSID pinned by a previous selection
+            try:
+                self._adapter.connection_modify(name=self._ssid, options={'802-11-wireless.bssid': ''})
+            except Exception:
+                pass
+        logger.info(f'Connecting to {bytes(self._ssid, "utf-8")} {bssid or ""}')
+        self._adapter.device_wifi_connect(ssid=f'{self._ssid}',
+                                          password=f'{self._passphrase}',
+                                          ifname=self._device,
+                                          bssid=bssid)
+
+    def _start_roam(self):
+        # The scan takes seconds, it runs in the background without the lock
+        if self._roam_running or time.time() - self._last_roam_check < self._roam_check_period_s:
+            return
+        current_bssid = self._link.get("bssid")
+        if not current_bssid:
+            return
+        self._last_roam_check = time.time()
+        self._roam_running = True
+        roam_thread = threading.Thread(target=self._roam, args=(current_bssid, self._roam_generation))
+        roam_thread.daemon = True
+        roam_thread.start()
+
+    def _roam(self, current_bssid, generation):
+        try:
+            results = self._adapter.device_wifi(ifname=self._device)
+            with self._lock:
+                # The configuration or the link changed while scanning
+                if generation != self._roam_generation or self._update_pending or not self._roaming or self._bssid or \
+                        self._connection_type != self.ConnectionType.CONNECTION_TYPE_STATION or \
+                        self._link.get("bssid") != current_bssid:
+                    return
+                self._scan_results = results
+                current = [result for result in results if result.bssid.lower() == current_bssid]
+                if not current or current[0].signal >= self._roam_signal_threshold:
+                    return
+                bssid = self._select_bssid()
+                best = [result for result in results if result.bssid.lower() == bssid]
+                if not best or best[0].signal - current[0].signal < self._roam_min_improvement:
+                    return
+                logger.info(f'Roaming {self._device} from {current_bssid} ({current[0].signal}) to {bssid} ({best[0].signal})')
+                self._status_message(f'Roaming to {bssid}...')
+                try:
+                    self._connect(bssid)
+                except Exception as e:
+                    self._status_message(f'Roaming: {e}', error=True)
+        except Exception as e:
+            logger.warning(f"Roaming check on {self._device} failed: {e}")
+        finally:
+            with self._lock:
+                self._roam_running = False
+
+    def _ap_active(self):
+        return self._connection_type == self.ConnectionType.CONNECTION_TYPE_AP
+
+    def _channel_scan_results(self):
+        self._scan()
+        return self._scan_results
+
+    def _power_save_connection(self):
+        if self._connection_type == self.ConnectionType.CONNECTION_TYPE_STATION and self._ssid:
+            return self._ssid
+        elif self._connection_type == self.ConnectionType.CONNECTION_TYPE_AP:
+            return self._hotspot_connection
+        return None
+
     def _reset_wifi(self, leave_active_name=''):
         return
         # # self._adapter.stop_dnsmasq()
@@ -188,6 +447,8 @@ class WiFiInterface(NetworkInterface):
     def reload(self):
         with self._lock:
             logging.info(f"Reload {self._device}...")
+            # A roaming check in progress is based on the previous configuration
+            self._roam_generation += 1
             try:
                 self._update_pending = True
                 if self._connection_type == self.ConnectionType.CONNECTION_TYPE_DISABLED:
@@ -217,10 +478,9 @@ class WiFiInterface(NetworkInterface):
                                 else:
                                     self._status_message(f'Connecting to {self._ssid}...')
                                 # TODO: Check timeout
-                                logger.info(f'Connecting to {bytes(self._ssid, "utf-8")}')
-                                self._adapter.device_wifi_connect(ssid=f'{self._ssid}',
-                                                                  password=f'{self._passphrase}')
+                                self._connect(self._select_bssid() if self._selection_enabled() else None)
                                 self._adapter.connection_modify(name=self._ssid, options={'connection.autoconnect': 'yes'})
+                                self._apply_power_save()
                                 self._status_message(f'{self.status}')
                                 self._update_pending = False
                                 break
@@ -230,6 +490,8 @@ class WiFiInterface(NetworkInterface):
                     else:
                         self._status_message(f'Enter the credentials', error=True)
                 elif self._connection_type == self.ConnectionType.CONNECTION_TYPE_AP:
+                    self._status_message('Selecting channel...')
+                    plan = self._plan_channel()
                     for tries in range(2):
                         try:
                             self._status_message('Resetting...')
@@ -239,15 +501,10 @@ class WiFiInterface(NetworkInterface):
                                 self._status_message(f'Creating access point try {tries}...')
                             else:
                                 self._status_message('Creating access point...')
-                            self._adapter.connection_modify(name=self._hotspot_connection, options={'connection.interface-name': self._device})
-                            self._adapter.connection_modify(name=self._hotspot_connection, options={'connection.autoconnect': 'yes'})
-                            self._adapter.connection_modify(name=self._hotspot_connection, options={'802-11-wireless.mode': 'ap'})
-                            self._adapter.connection_modify(name=self._hotspot_connection, options={'802-11-wireless.ssid': self._ssid})
-                            self._adapter.connection_modify(name=self._hotspot_connection, options={'802-11-wireless-security.key-mgmt': 'wpa-psk'})
-                            self._adapter.connection_modify(name=self._hotspot_connection, options={'802-11-wireless-security.psk': self._passphrase})
-                            self._adapter.connection_modify(name=self._hotspot_connection, options={'802-11-wireless-security.pmf': 'disable'})
-                            self._adapter.connection_modify(name=self._hotspot_connection, options={'ipv4.method': 'shared'})
+                            self._adapter.connection_modify(name=self._hotspot_connection,
+                                                            options=self._hotspot_settings(plan) | {'connection.autoconnect': 'yes'})
                             self._adapter.connection_up(name=self._hotspot_connection, wait=self.WAIT_FOR_CONNECTION_UP_S)
+                            self._apply_power_save()
 
                             # Alternative:
                             # nmcli con add type wifi ifname wlan0 con-name Hostspot autoconnect yes ssid Hostspot
@@ -272,7 +529,8 @@ class WiFiInterface(NetworkInterface):
             try:
                 if self._update_pending:
                     self.reload()
-                self._status_message(self.status)
+                self._refresh_status_message()
+                self._refresh_qdisc()
                 iface = self._adapter.ifconfig(self._device)
 
                 ipv4_addr = iface.ipv4_addr
@@ -288,7 +546,21 @@ class WiFiInterface(NetworkInterface):
                     ipv4_bcast = '0.0.0.0'
 
                 if self._connection_type == self.ConnectionType.CONNECTION_TYPE_STATION:
-                    self._ssid = self._adapter.iw_dev_link(self._device)
+                    self._link = self._adapter.iw_dev_link_info(self._device)
+                    self._ssid = self._link["ssid"]
+                    self._link_history.append((time.time(), self._link["signal"], self._link["tx_bitrate"],
+                                               self._link["rx_bitrate"], self._link["freq"]))
+                    if self._roaming and not self._bssid:
+                        self._start_roam()
+                    self._power_save_state = self._adapter.iw_dev_power_save(self._device)
+                elif self._connection_type == self.ConnectionType.CONNECTION_TYPE_AP:
+                    self._link = {}
+                    if self._channel_planner.reevaluate_due():
+                        self._replan_channel()
+                    self._power_save_state = self._adapter.iw_dev_power_save(self._device)
+                else:
+                    self._link = {}
+                    self._power_save_state = None
 
                 self._ip = ipv4_addr
                 self._mask = ipv4_mask
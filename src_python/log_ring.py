@@ -0,0 +1,143 @@
+import logging
+import threading
+from collections import deque
+
+
+class LogRing(logging.Handler):
+    """
+    Keep the recent log records in memory for /api/logs. A message repeated by the
+    same logger updates the count of its last record instead of adding a new one,
+    the record gets a new sequence number so that polling with `since` sees the count.
+    """
+
+    def __init__(self, size, level=logging.INFO):
+        super().__init__(level)
+        self._records = deque(maxlen=size)
+        # Logger name to (last entry, number of entries appended before it)
+        self._last = {}
+        self._appended = 0
+        self._seq = 0
+        self._ring_lock = threading.Lock()
+
+    def emit(self, record):
+        try:
+            message = record.getMessage()
+        except Exception:
+            self.handleError(record)
+            return
+        with self._ring_lock:
+            last, index = self._last.get(record.name, (None, 0))
+            # Only while the entry is still in the ring, an evicted one can't be seen
+            if last is not None and self._appended - index < self._records.maxlen and \
+                    last["message"] == message and last["level"] == record.levelname:
+                self._seq += 1
+                last["seq"] = self._seq
+                last["count"] += 1
+                last["last_time"] = record.created
+                return
+            self._seq += 1
+            entry = {
+                "seq": self._seq,
+                "time": record.created,
+                "last_time": record.created,
+                "level": record.levelname,
+                "logger": record.name,
+                "thread": record.threadName,
+                "message": message,
+                "count": 1
+            }
+            self._records.append(entry)
+            self._appended += 1
+            self._last[record.name] = (entry, self._appended)
+
+    @staticmethod
+    def _parse_level(level):
+        value = logging.getLevelName(str(level).upper())
+        if not isinstance(value, int):
+            raise ValueError(f"Unknown level {level}, available levels are: DEBUG, INFO, WARNING, ERROR, CRITICAL")
+        return value
+
+    def query(self, level=None, logger=None, contains=None, since=None, limit=200):
+        """
+        :param level: minimum level name (e.g. WARNING)
+        :param logger: logger name prefix (e.g. interface_manager.wifi_interface)
+        :param contains: text the message must contain
+        :param since: only records with a sequence number above this one (for polling)
+        :param limit: maximum number of the newest records
+        :return:
+        A list of records with 'seq', 'time', 'last_time' (of the last repeat), 'level',
+        'logger', 'thread', 'message' and 'count' (repeats), oldest first
+        """
+        min_level = self._parse_level(level) if level else logging.NOTSET
+        with self._ring_lock:
+            records = [dict(entry) for entry in self._records
+                       if logging.getLevelName(entry["level"]) >= min_level
+                       and (not logger or entry["logger"].startswith(logger))
+                       and (not contains or contains in entry["message"])
+                       and (since is None or entry["seq"] > since)]
+        return records[-limit:] if limit > 0 else []
+
+
+class JournalFilter(logging.Filter):
+    """
+    Limit what is written to the journal: a message repeated by the same logger is
+    written again only after `dedup_s` (with the repeat count), and every logger may
+    write `rate` records below WARNING per `period_s`.
+    """
+
+    def __init__(self, dedup_s, rate, period_s):
+        super().__init__()
+        self._dedup_s = dedup_s
+        self._rate = rate
+        self._period_s = period_s
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        message = record.getMessage()
+        now = record.created
+        with self._lock:
+            source = self._sources.get(record.name)
+            if source is None:
+                source = {"message": None, "time": 0.0, "repeated": 0, "suppressed": 0,
+                          "tokens": float(self._rate), "refill": now}
+                self._sources[record.name] = source
+            if message == source["message"] and now - source["time"] < self._dedup_s:
+                source["repeated"] += 1
+                return False
+            if record.levelno < logging.WARNING:
+                source["tokens"] = min(self._rate, source["tokens"] + (now - source["refill"]) * self._rate / self._period_s)
+                source["refill"] = now
+                if source["tokens"] < 1:
+                    source["suppressed"] += 1
+                    return False
+                source["tokens"] -= 1
+            notes = []
+            if source["repeated"]:
+                notes.append(f"previous message repeated {source['repeated']} times")
+            if source["suppressed"]:
+                notes.append(f"{source['suppressed']} messages suppressed")
+            source.update(message=message, time=now, repeated=0, suppressed=0)
+        if notes:
+            record.msg = f"{message} ({', '.join(notes)})"
+            record.args = None
+        return True
+
+
+def setup_logging(def_config):
+    """
+    Add the journal filter to the existing handlers and the in-memory ring to the root logger
+
+    :return:
+    The LogRing
+    """
+    root = logging.getLogger()
+    journal_filter = JournalFilter(def_config.getfloat('Logging', 'JournalDedupSec'),
+                                   def_config.getint('Logging', 'JournalRateLimit'),
+                                   def_config.getfloat('Logging', 'JournalRatePeriodSec'))
+    for handler in root.handlers:
+        handler.addFilter(journal_filter)
+    ring = LogRing(def_config.getint('Logging', 'LogRingSize'))
+    # The ring goes first, it must see the messages before the journal filter annotates them
+    root.handlers.insert(0, ring)
+    return ring
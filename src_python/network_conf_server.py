@@ -11,7 +11,11 @@ from flask import Flask, render_template, jsonify
 # Add current folder to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from interface_manager.config_watcher import ConfigWatcher
+from interface_manager.fleet import Fleet
 from interface_manager.inteface_manager import InterfaceManager
+from log_ring import setup_logging
+from static_assets import StaticAssets
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -56,8 +60,15 @@ class ReverseProxied(object):
 
 
 class NetworkConfigurationService:
-    def __init__(self, def_config):
-        self.manager = InterfaceManager(def_config=def_config)
+    def __init__(self, def_config, config_files=(), log_ring=None):
+        self._log_ring = log_ring
+        self.manager = None
+        self.fleet = None
+        if def_config.getboolean('Fleet', 'EnableFleet'):
+            self.fleet = Fleet(def_config)
+        else:
+            self.manager = InterfaceManager(def_config=def_config)
+        self._reverse_proxied = None
         self._static_folder = def_config.get('Server', 'StaticFolder')
         self._start_server = def_config.getboolean('Server', 'EnableServer')
         self._port = def_config.getint('Server', 'Port')
@@ -65,6 +76,9 @@ class NetworkConfigurationService:
         self._ap_hide_in_ui = def_config.getboolean('AP', 'APHideInUI')
         self._ap_interface = def_config.get('AP', 'APInterfaceDevice')
         self._reverse_proxy_path = def_config.get('Server', 'ReverseProxyPath')
+        self._config_watcher = ConfigWatcher(config_files, def_config, self.apply_def_config,
+                                             period_s=def_config.getfloat('Global', 'ConfigReloadPeriodSec'))
+        self._config_watcher.start()
         if self._start_server:
             self.start_server()
         else:
@@ -72,23 +86,81 @@ class NetworkConfigurationService:
             while True:
                 time.sleep(100)
 
+    def apply_def_config(self, def_config, changed):
+        for option in ['EnableServer', 'Port', 'Address', 'StaticFolder']:
+            if ConfigWatcher.is_changed(changed, 'Server', option):
+                logger.warning(f"Changing Server.{option} requires a restart, ignored")
+        if any(section == 'Logging' for section, _ in changed):
+            logger.warning("Changing the Logging settings requires a restart, ignored")
+        if ConfigWatcher.is_changed(changed, 'Fleet', 'EnableFleet'):
+            logger.warning("Changing Fleet.EnableFleet requires a restart, ignored")
+        self._ap_hide_in_ui = def_config.getboolean('AP', 'APHideInUI')
+        self._ap_interface = def_config.get('AP', 'APInterfaceDevice')
+        self._reverse_proxy_path = def_config.get('Server', 'ReverseProxyPath')
+        if self._reverse_proxied is not None:
+            self._reverse_proxied.script_name = self._reverse_proxy_path
+        if self.fleet is not None:
+            self.fleet.apply_def_config(def_config, changed)
+        else:
+            self.manager.apply_def_config(def_config, changed)
+
+    def _get_manager(self, host):
+        """
+        Get the manager of a host (/api/hosts/<host>/...) or the only one (/api/...)
+
+        :return:
+        A tuple of the manager and None, or None and the error response
+        """
+        if self.fleet is None:
+            if host is not None:
+                return None, (jsonify({'error': 'Fleet mode is disabled'}), 404)
+            return self.manager, None
+        if host is None:
+            return None, (jsonify({'error': 'Fleet mode is enabled, use /api/hosts/<host>/...'}), 400)
+        if host not in self.fleet.hosts():
+            return None, (jsonify({'error': f'Host {host} not found. '
+                                            f'Acceptable hosts are: {", ".join(self.fleet.hosts())}'}), 404)
+        manager = self.fleet.get_manager(host)
+        if manager is None:
+            return None, (jsonify({'error': f'Host {host} is not available: {self.fleet.get_error(host)}'}), 503)
+        return manager, None
+
+    @staticmethod
+    def _interface_not_found(manager, interface_id):
+        return jsonify({'error': f'Interface {interface_id} not found. '
+                                 f'Acceptable interfaces are: {", ".join(manager.interfaces_by_device)}'}), 404
+
     def start_server(self):
-        app = Flask(__name__,
-                    static_folder= self._static_folder)
-        app.wsgi_app = ReverseProxied(app.wsgi_app, script_name=self._reverse_proxy_path)
+        # Static files are served by StaticAssets (cache headers, precompressed variants)
+        app = Flask(__name__, static_folder=None)
+        assets = StaticAssets(self._static_folder)
+        self._reverse_proxied = ReverseProxied(app.wsgi_app, script_name=self._reverse_proxy_path)
+        app.wsgi_app = self._reverse_proxied
 
         @app.route('/')
         def index():
-            return app.send_static_file('index.html')
+            return assets.send('index.html')
+
+        @app.route('/static/<path:filename>')
+        def static_files(filename):
+            return assets.send(filename)
 
-        @app.route('/api/status', methods=['GET'])
-        def status_control():
-            return jsonify(self.manager.get_status()), 200
+        @app.route('/api/status', methods=['GET'], defaults={'host': None})
+        @app.route('/api/hosts/<host>/status', methods=['GET'])
+        def status_control(host):
+            manager, error = self._get_manager(host)
+            if error is not None:
+                return error
+            return jsonify(manager.get_status()), 200
 
-        @app.route('/api/config', methods=['GET', 'POST'])
-        def config_control():
+        @app.route('/api/config', methods=['GET', 'POST'], defaults={'host': None})
+        @app.route('/api/hosts/<host>/config', methods=['GET', 'POST'])
+        def config_control(host):
+            manager, error = self._get_manager(host)
+            if error is not None:
+                return error
             if request.method == 'GET':
-                conf = self.manager.get_conf()
+                conf = manager.get_conf()
                 if self._ap_hide_in_ui:
                     try:
                         conf.pop(self._ap_interface)
@@ -98,54 +170,193 @@ class NetworkConfigurationService:
             elif request.method == 'POST':
                 config = request.get_json()
                 logger.info(f"Received config: {config}")
-                self.manager.load_config(config)
+                try:
+                    manager.load_config(config)
+                except Exception as e:
+                    return jsonify({'error': f'{e}'}), 500
                 return jsonify("OK"), 200
 
-        @app.route('/api/<interface_id>/config', methods=['GET', 'POST'])
-        def config_interface_control(interface_id):
+        @app.route('/api/<interface_id>/config', methods=['GET', 'POST'], defaults={'host': None})
+        @app.route('/api/hosts/<host>/<interface_id>/config', methods=['GET', 'POST'])
+        def config_interface_control(interface_id, host):
+            manager, error = self._get_manager(host)
+            if error is not None:
+                return error
             try:
-                for interface in self.manager.interfaces:
-                    if interface_id == interface.device:
-                        if request.method == 'GET':
-                            return jsonify(interface.get_conf()), 200
-                        elif request.method == 'POST':
-                            config = request.get_json()
-                            logger.info(f"Received config: {config}")
-                            interface.load_config({interface_id: config})
-                            return jsonify("OK"), 200
-                return jsonify({'error': f'Interface {interface_id} not found. Acceptable interfaces are: {", ".join(self.manager.interfaces)}'}), 404
+                interface = manager.get_interface(interface_id)
+                if interface is None:
+                    return self._interface_not_found(manager, interface_id)
+                if request.method == 'GET':
+                    return jsonify(interface.get_config()), 200
+                elif request.method == 'POST':
+                    config = request.get_json()
+                    logger.info(f"Received config: {config}")
+                    interface.load_config({interface_id: config})
+                    return jsonify("OK"), 200
             except Exception as e:
                 return jsonify({'error': f'{e}'}), 500
 
-        @app.route('/api/interfaces', methods=['GET'])
-        def interfaces_control():
+        @app.route('/api/interfaces', methods=['GET'], defaults={'host': None})
+        @app.route('/api/hosts/<host>/interfaces', methods=['GET'])
+        def interfaces_control(host):
+            manager, error = self._get_manager(host)
+            if error is not None:
+                return error
             interfaces = []
-            for interface in self.manager.interfaces:
+            for interface in manager.interfaces:
                 if self._ap_hide_in_ui and interface.device == self._ap_interface:
                     continue
                 interfaces.append(interface.device)
             return jsonify(interfaces), 200
 
-        @app.route('/api/param/<interface_id>/<parameter>', methods=['GET', 'POST'])
-        def parameter_control(interface_id: str, parameter: str):
+        @app.route('/api/stats/<interface_id>', methods=['GET'], defaults={'host': None})
+        @app.route('/api/hosts/<host>/stats/<interface_id>', methods=['GET'])
+        def stats_control(interface_id, host):
+            manager, error = self._get_manager(host)
+            if error is not None:
+                return error
+            if manager.stats is None:
+                return jsonify({'error': 'Statistics are disabled'}), 404
+            if manager.get_interface(interface_id) is None:
+                return self._interface_not_found(manager, interface_id)
+            counters = request.args.get('counters')
+            try:
+                stats = manager.stats.get_stats(interface_id,
+                                                tier=request.args.get('tier', 'second'),
+                                                counters=counters.split(',') if counters else None)
+            except KeyError as e:
+                return jsonify({'error': f'{e}'}), 400
+            if stats is None:
+                return jsonify({'error': f'No statistics for {interface_id} yet'}), 404
+            return jsonify(stats), 200
+
+        @app.route('/api/hosts', methods=['GET'])
+        def hosts_control():
+            if self.fleet is None:
+                return jsonify({'error': 'Fleet mode is disabled'}), 404
+            return jsonify(self.fleet.hosts()), 200
+
+        @app.route('/api/fleet/status', methods=['GET'])
+        def fleet_status_control():
+            if self.fleet is None:
+                return jsonify({'error': 'Fleet mode is disabled'}), 404
+            return jsonify(self.fleet.get_status()), 200
+
+        @app.route('/api/fleet/rollouts', methods=['GET', 'POST'])
+        def rollouts_control():
+            if self.fleet is None:
+                return jsonify({'error': 'Fleet mode is disabled'}), 404
+            if request.method == 'GET':
+                return jsonify(self.fleet.rollouts.get_rollouts()), 200
+            body = request.get_json(silent=True)
+            if not isinstance(body, dict):
+                return jsonify({'error': 'Expected a JSON object with config, hosts, waves, '
+                                         'max_parallel and max_failure_ratio'}), 400
+            logger.info(f"Received rollout: {body}")
             try:
-                for interface in self.manager.interfaces:
-                    if interface_id == interface.device:
-                        if parameter in interface.parameters():
-                            if request.method == 'GET':
-                                return jsonify(interface[parameter]), 200
-                            elif request.method == 'POST':
-                                try:
-                                    interface[parameter] = request.form.to_dict(flat=False)
-                                    return jsonify(interface[parameter]), 200
-                                except Exception as e:
-                                    return jsonify({'error': f'Could not process request, internal error: {e}'}), 500
-                            else:
-                                return jsonify({'error': f'Method {request.method} not allowed'}), 405
-                        else:
-                            return jsonify({'error': f'Unknown parameter {parameter} for interface {interface_id}. '
-                                                     f'Acceptable parameters are: {", ".join(interface.parameters())}'}), 404
-                    return jsonify({'error': f'Interface {interface_id} not found. Acceptable interfaces are: {", ".join(self.manager.interfaces)}'}), 404
+                rollout = self.fleet.rollouts.start(body.get('config'),
+                                                    hosts=body.get('hosts'),
+                                                    waves=body.get('waves'),
+                                                    max_parallel=body.get('max_parallel'),
+                                                    max_failure_ratio=body.get('max_failure_ratio'))
+            except (ValueError, TypeError) as e:
+                return jsonify({'error': f'{e}'}), 400
+            return jsonify(rollout.to_dict()), 202
+
+        @app.route('/api/fleet/rollouts/<int:rollout_id>', methods=['GET', 'DELETE'])
+        def rollout_control(rollout_id):
+            if self.fleet is None:
+                return jsonify({'error': 'Fleet mode is disabled'}), 404
+            if request.method == 'DELETE':
+                rollout = self.fleet.rollouts.abort(rollout_id)
+            else:
+                rollout = self.fleet.rollouts.get(rollout_id)
+            if rollout is None:
+                return jsonify({'error': f'Rollout {rollout_id} not found'}), 404
+            return jsonify(rollout.to_dict()), 200
+
+        @app.route('/api/logs', methods=['GET'])
+        def logs_control():
+            if self._log_ring is None:
+                return jsonify({'error': 'Log ring is disabled'}), 404
+            try:
+                records = self._log_ring.query(level=request.args.get('level'),
+                                               logger=request.args.get('logger'),
+                                               contains=request.args.get('contains'),
+                                               since=request.args.get('since', type=int),
+                                               limit=request.args.get('limit', default=200, type=int))
+            except ValueError as e:
+                return jsonify({'error': f'{e}'}), 400
+            return jsonify(records), 200
+
+        @app.route('/api/adapter/queries', methods=['GET'], defaults={'host': None})
+        @app.route('/api/hosts/<host>/adapter/queries', methods=['GET'])
+        def adapter_queries_control(host):
+            manager, error = self._get_manager(host)
+            if error is not None:
+                return error
+            return jsonify(manager.adapter.query_stats()), 200
+
+        @app.route('/api/adapter/commands', methods=['GET'], defaults={'host': None})
+        @app.route('/api/hosts/<host>/adapter/commands', methods=['GET'])
+        def adapter_commands_control(host):
+            manager, error = self._get_manager(host)
+            if error is not None:
+                return error
+            return jsonify(manager.adapter.command_stats()), 200
+
+        @app.route('/api/changes/<interface_id>', methods=['GET'], defaults={'host': None})
+        @app.route('/api/hosts/<host>/changes/<interface_id>', methods=['GET'])
+        def changes_control(interface_id, host):
+            manager, error = self._get_manager(host)
+            if error is not None:
+                return error
+            if manager.get_interface(interface_id) is None:
+                return self._interface_not_found(manager, interface_id)
+            return jsonify(manager.parameter_changes.get_changes(interface_id)), 200
+
+        @app.route('/api/changes/<interface_id>/<int:change_id>', methods=['GET'], defaults={'host': None})
+        @app.route('/api/hosts/<host>/changes/<interface_id>/<int:change_id>', methods=['GET'])
+        def change_control(interface_id, change_id, host):
+            manager, error = self._get_manager(host)
+            if error is not None:
+                return error
+            change = manager.parameter_changes.get_change(interface_id, change_id)
+            if change is None:
+                return jsonify({'error': f'Change {change_id} not found for interface {interface_id}'}), 404
+            return jsonify(change), 200
+
+        @app.route('/api/param/<interface_id>/<parameter>', methods=['GET', 'POST'], defaults={'host': None})
+        @app.route('/api/hosts/<host>/param/<interface_id>/<parameter>', methods=['GET', 'POST'])
+        def parameter_control(interface_id: str, parameter: str, host: str):
+            manager, error = self._get_manager(host)
+            if error is not None:
+                return error
+            try:
+                interface = manager.get_interface(interface_id)
+                if interface is None:
+                    return self._interface_not_found(manager, interface_id)
+                if parameter not in interface.parameters():
+                    return jsonify({'error': f'Unknown parameter {parameter} for interface {interface_id}. '
+                                             f'Acceptable parameters are: {", ".join(interface.parameters())}'}), 404
+                if request.method == 'GET':
+                    return jsonify(interface[parameter]), 200
+                elif request.method == 'POST':
+                    # The value is the JSON body or the `value` form field
+                    value = request.get_json(silent=True)
+                    if value is None:
+                        value = request.form.get('value')
+                    try:
+                        # Writes are collected and applied together, see /api/changes/<interface_id>/<change_id>
+                        change = manager.parameter_changes.write(interface, parameter, value)
+                    except KeyError as e:
+                        return jsonify({'error': f'{e}'}), 400
+                    except Exception as e:
+                        return jsonify({'error': f'Could not process request, internal error: {e}'}), 500
+                    change = change.to_dict()
+                    return jsonify(change), 202 if change['state'] == 'pending' else 200
+                else:
+                    return jsonify({'error': f'Method {request.method} not allowed'}), 405
             except Exception as e:
                 return jsonify({'error': f'{e}'}), 500
 
@@ -164,15 +375,18 @@ def main():
     try:
         def_config = ConfigParser()
         def_config.read(DEFAULT_CONFIG)
+        config_files = [DEFAULT_CONFIG]
         try:
             if args.conf is not None and os.path.isfile(args.conf):
                 def_config.read(args.conf)
+                config_files.append(args.conf)
             else:
                 logger.warning("Configuration file not provided, using default configuration")
         except:
             logger.warning("Error in the configuration file, using default configuration")
 
-        NetworkConfigurationService(def_config)
+        log_ring = setup_logging(def_config)
+        NetworkConfigurationService(def_config, config_files, log_ring)
     except Exception as e:
         logger.error(f"Exception: {e}")
         if USE_FULL_BACKTRACE:
@@ -0,0 +1,131 @@
+import os
+import re
+import sys
+import grp
+import argparse
+import logging
+import socketserver
+import subprocess
+
+# Add current folder to Python path
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from interface_manager.adapters.helper_client import send_frame, recv_frame
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+VERSION = "1.0"
+
+DEFAULT_SOCKET = "/run/network-configurator/helper.sock"
+
+DESCRIPTION = """
+Runs the privileged operations of the network configuration service, so that the service
+does not need root or sudo. Only the operations below are accepted, with validated arguments.
+"""
+
+DEVICE_PATTERN = re.compile(r'^[A-Za-z0-9_.:-]{1,15}$')
+PHY_PATTERN = re.compile(r'^phy[0-9]+$')
+MAC_PATTERN = re.compile(r'^([0-9A-Fa-f]{2}:){5}[0-9A-Fa-f]{2}$')
+INTERFACE_TYPES = ['managed', 'ap', '__ap']
+SYSCTLS = {'net.ipv4.ip_forward': ['0', '1']}
+
+
+def _match(args, name, pattern):
+    value = args.get(name)
+    if not isinstance(value, str) or not pattern.match(value):
+        raise ValueError(f"Invalid {name}: {value}")
+    return value
+
+
+def _choice(args, name, choices):
+    value = str(args.get(name))
+    if value not in choices:
+        raise ValueError(f"Invalid {name}: {value}, acceptable values are: {', '.join(choices)}")
+    return value
+
+
+def _sysctl(args):
+    key = _choice(args, 'key', list(SYSCTLS))
+    return ['sysctl', '-w', f'{key}={_choice(args, "value", SYSCTLS[key])}']
+
+
+# Operation name to the command built from the validated arguments
+OPERATIONS = {
+    'link_up': lambda args: ['ip', 'link', 'set', 'dev', _match(args, 'device', DEVICE_PATTERN), 'up'],
+    'link_down': lambda args: ['ip', 'link', 'set', 'dev', _match(args, 'device', DEVICE_PATTERN), 'down'],
+    'set_mac': lambda args: ['ip', 'link', 'set', 'dev', _match(args, 'device', DEVICE_PATTERN),
+                             'address', _match(args, 'mac', MAC_PATTERN)],
+    'add_interface': lambda args: ['iw', 'phy', _match(args, 'phy', PHY_PATTERN), 'interface', 'add',
+                                   _match(args, 'device', DEVICE_PATTERN),
+                                   'type', _choice(args, 'type', INTERFACE_TYPES)],
+    'sysctl': _sysctl,
+    'read_addresses': lambda args: ['ifconfig', _match(args, 'device', DEVICE_PATTERN)],
+}
+
+
+class HelperServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, timeout_s):
+        self.timeout_s = timeout_s
+        super().__init__(socket_path, HelperRequestHandler)
+
+    def execute(self, request):
+        try:
+            if not isinstance(request, dict) or not isinstance(request.get("args", {}), dict):
+                raise ValueError("Invalid request")
+            op = request.get("op")
+            if op not in OPERATIONS:
+                raise ValueError(f"Unknown operation {op}")
+            command = OPERATIONS[op](request.get("args", {}))
+        except Exception as e:
+            logger.warning(f"Rejected {request}: {e}")
+            return {"ok": False, "error": f"{e}"}
+        logger.info(f"Run {' '.join(command)}")
+        try:
+            result = subprocess.run(command, capture_output=True, timeout=self.timeout_s)
+        except Exception as e:
+            logger.warning(f"{' '.join(command)} failed: {e}")
+            return {"ok": False, "error": f"{e}"}
+        output = (result.stdout + result.stderr).decode("utf-8", errors="replace").rstrip('\n')
+        return {"ok": True, "returncode": result.returncode, "output": output}
+
+
+class HelperRequestHandler(socketserver.BaseRequestHandler):
+
+    def handle(self):
+        while True:
+            try:
+                request = recv_frame(self.request)
+            except EOFError:
+                return
+            except Exception as e:
+                logger.warning(f"Invalid frame, closing the connection: {e}")
+                return
+            send_frame(self.request, self.server.execute(request))
+
+
+def main():
+    parser = argparse.ArgumentParser(prog=f"Network Configuration Privileged Helper {VERSION}",
+                                     description=DESCRIPTION)
+    parser.add_argument("-s", "--socket", help="Unix socket path", type=str, default=DEFAULT_SOCKET)
+    parser.add_argument("-g", "--group", help="Group allowed to connect (the service user)", type=str, required=True)
+    parser.add_argument("-t", "--timeout", help="Command timeout in seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.socket), exist_ok=True)
+    if os.path.exists(args.socket):
+        os.unlink(args.socket)
+    # Only the owner and the group may connect, also before the permissions are set below
+    os.umask(0o117)
+    server = HelperServer(args.socket, args.timeout)
+    os.chown(args.socket, 0, grp.getgrnam(args.group).gr_gid)
+    os.chmod(args.socket, 0o660)
+    logger.info(f"Listening on {args.socket} for {args.group}, operations: {', '.join(OPERATIONS)}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import json
+import logging
+import mimetypes
+import os
+
+from flask import abort, request, send_file
+from werkzeug.security import safe_join
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+MANIFEST = "manifest.json"
+# Content encoding -> suffix of the precompressed file, in order of preference
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+IMMUTABLE_MAX_AGE_S = 365 * 24 * 3600
+
+
+class StaticAssets:
+    """
+    Serve the web interface assets built by scripts/build_static.py: the content-hashed
+    files are cached by the clients for good, other files (index.html) are revalidated.
+    Precompressed variants are selected by Accept-Encoding.
+    """
+
+    def __init__(self, folder):
+        self._folder = os.path.abspath(folder)
+        self._immutable = set()
+        manifest_path = os.path.join(self._folder, MANIFEST)
+        if os.path.isfile(manifest_path):
+            with open(manifest_path) as file:
+                self._immutable = set(json.load(file).values())
+        else:
+            logger.warning(f"{MANIFEST} not found in {folder}, assets are not built and will be revalidated on every load")
+
+    def _negotiate(self, path):
+        for encoding, suffix in ENCODINGS.items():
+            if request.accept_encodings[encoding] > 0 and os.path.isfile(path + suffix):
+                return encoding, path + suffix
+        return None, path
+
+    def send(self, filename):
+        path = safe_join(self._folder, filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        encoding, send_path = self._negotiate(path)
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        response = send_file(send_path, mimetype=mimetype, conditional=True, etag=True)
+        if encoding is not None:
+            response.headers["Content-Encoding"] = encoding
+        response.headers["Vary"] = "Accept-Encoding"
+        if filename in self._immutable:
+            response.headers["Cache-Control"] = f"public, max-age={IMMUTABLE_MAX_AGE_S}, immutable"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        return response
@@ -0,0 +1,45 @@
+import logging
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_ring import LogRing
+
+
+class LogRingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = LogRing(3)
+
+    def _log(self, name, message, level=logging.INFO):
+        self.ring.emit(logging.LogRecord(name, level, __file__, 0, message, None, None))
+
+    def test_repeats_update_the_last_record(self):
+        self._log('wifi', 'Connecting')
+        self._log('wifi', 'Connecting')
+        records = self.ring.query()
+        self.assertEqual([(record["message"], record["count"]) for record in records], [('Connecting', 2)])
+
+    def test_repeat_gets_a_new_sequence_number(self):
+        self._log('wifi', 'Connecting')
+        since = self.ring.query()[-1]["seq"]
+        self._log('wifi', 'Connecting')
+        records = self.ring.query(since=since)
+        self.assertEqual([(record["message"], record["count"]) for record in records], [('Connecting', 2)])
+
+    def test_repeat_of_an_evicted_record_is_added_again(self):
+        self._log('wifi', 'Connecting')
+        self._log('ethernet', 'one')
+        self._log('ethernet', 'two')
+        self._log('ethernet', 'three')
+        self._log('wifi', 'Connecting')
+        self._log('wifi', 'Connecting')
+        records = self.ring.query()
+        self.assertEqual([(record["message"], record["count"]) for record in records],
+                         [('two', 1), ('three', 1), ('Connecting', 2)])
+
+
+if __name__ == '__main__':
+    unittest.main()
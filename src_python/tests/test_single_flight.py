@@ -0,0 +1,72 @@
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from interface_manager.adapters.single_flight import SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def _start_blocked_call(self, flight, key, result):
+        started = threading.Event()
+        release = threading.Event()
+        results = []
+
+        def query():
+            started.set()
+            release.wait(5)
+            return result
+
+        thread = threading.Thread(target=lambda: results.append(flight.do(key, query)))
+        thread.start()
+        self.assertTrue(started.wait(5))
+        return thread, release, results
+
+    def test_concurrent_callers_share_the_call(self):
+        flight = SingleFlight()
+        thread, release, results = self._start_blocked_call(flight, 'device', 'first')
+        follower_results = []
+        follower = threading.Thread(target=lambda: follower_results.append(flight.do('device', lambda: 'second')))
+        follower.start()
+        for _ in range(500):
+            if flight.stats()["deduplicated"]:
+                break
+            time.sleep(0.01)
+        release.set()
+        thread.join(5)
+        follower.join(5)
+        self.assertEqual(results, ['first'])
+        self.assertEqual(follower_results, ['first'])
+        self.assertEqual(flight.stats()["executed"], 1)
+
+    def test_invalidate_detaches_the_call_in_flight(self):
+        flight = SingleFlight(ttl_s=60)
+        thread, release, results = self._start_blocked_call(flight, 'device', 'before')
+        flight.invalidate()
+        self.assertEqual(flight.stats()["in_flight"], 0)
+        # A caller after the change does not join the call that started before it
+        self.assertEqual(flight.do('device', lambda: 'after'), 'after')
+        release.set()
+        thread.join(5)
+        self.assertEqual(results, ['before'])
+        self.assertEqual(flight.stats()["in_flight"], 0)
+        # The stale result is not cached, the fresh one is
+        self.assertEqual(flight.do('device', lambda: 'other'), 'after')
+
+    def test_errors_are_shared_and_not_cached(self):
+        flight = SingleFlight(ttl_s=60)
+
+        def fail():
+            raise OSError("failed")
+
+        with self.assertRaises(OSError):
+            flight.do('device', fail)
+        self.assertEqual(flight.do('device', lambda: 'ok'), 'ok')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,9 @@
-const editingFields = new Set();
+// Host whose API is used, null when the service manages a single host (fleet mode disabled)
+var host = null;
+
+function apiUrl(path) {
+  return host === null ? `api/${path}` : `api/hosts/${encodeURIComponent(host)}/${path}`;
+}
 
 async function fetchData(url, method = "GET", body = null, timeout = 5000) {
   const options = {
@@ -47,7 +52,7 @@ async function wifiScan(intf) {
   const wifiScanResults = document.getElementById(`scan-list-${intf}`);
   wifiScanResults.innerHTML = '<div class="spinner-container"><div class="spinner"></div></div>';
 
-  const scanResult = (await fetchData(`api/param/${intf}/scan`, "GET", null, 30000)).response;
+  const scanResult = (await fetchData(apiUrl(`param/${intf}/scan`), "GET", null, 30000)).response;
 
   wifiScanResults.innerHTML = "";
   const selectElement = document.createElement("select");
@@ -85,7 +90,7 @@ async function applyConfig(intf, ifaceType) {
   }
   
   const { status, response } = await fetchData(
-    `api/${intf}/config`,
+    apiUrl(`${intf}/config`),
     "POST",
     data
   );
@@ -93,173 +98,219 @@ async function applyConfig(intf, ifaceType) {
     const fault = response["error"];
     alert(`Failed to apply configuration: ${fault}`);
   } else {
+    markApplied(intf);
     alert("Configuration applied successfully");
   }
 }
 
-async function loadInterfaces(interfaces, config, status) {
-  const container = document.getElementById("interfaces-container");
-  container.innerHTML = "";
-
-  for (const intf of interfaces) {
-    const ifaceConfig = config[intf] || {};
-    const ifaceType = ifaceConfig.type || "undefined";
-
-    let wifiSection = "";
-    if (ifaceType === "wifi") {
-      wifiSection = `
-        <tr>
-          <td colspan="2">
-            <h4>Available Networks</h4>
-            <div id="scan-list-${intf}">(Press scan to show the list of networks)</div>
-            <div style="display: flex; justify-content: right;"><button onclick="wifiScan('${intf}')">Scan</button></div>
-          </td>
-        </tr>
-        <tr>
-          <td>SSID:</td>
-          <td><input id="ssid-${intf}" type="text" value="" /></td>
-        </tr>
-        <tr>
-          <td>Password:</td>
-          <td><input id="passphrase-${intf}" type="password" value="" /></td>
-        </tr>
-      `;
-    }
+// Client-side model: the last rendered payloads (as JSON text, an unchanged payload is not rendered
+// again) and a panel per interface. Only the DOM nodes whose values changed are updated.
+const model = {
+  interfaces: null,
+  config: null,
+  status: null,
+};
+const panels = new Map();
+
+function setText(element, text) {
+  if (element.textContent !== text) {
+    element.textContent = text;
+  }
+}
 
-    const connectionOptions =
-      ifaceType === "wifi"
-        ? '<option value="disabled">Disabled</option><option value="station">Station</option><option value="ap">AP</option>'
-        : '<option value="disabled">Disabled</option><option value="static_ip">Static IP</option><option value="dynamic_ip">Dynamic IP</option><option value="dhcp_server">DHCP</option>';
-
-    const ipPattern = "^((25[0-5]|(2[0-4]|1\\d|[1-9]|)\\d)\\.?\\b){4}$";
-    container.innerHTML += `
-      <div class="interface-block">
-        <h3 id="header-${intf}">${intf} - ${ifaceType}</h3>
-        <h4 id="status-message-${intf}"></h4>
-        <table>
-          <tr>
-            <td>Connection Type:</td>
-            <td>
-              <select id="connection-${intf}" onchange="connectionTypeChanged('${intf}')">
-                ${connectionOptions}
-              </select>
-            </td>
-          </tr>
-          ${wifiSection}
-          <tr>
-            <td>IP:</td>
-            <td><input class="ip" id="ip-${intf}" type="text" minlength="7" maxlength="15" size="15" pattern="${ipPattern}" value="0.0.0.0" /></td>
-          </tr>
-          <tr>
-            <td>Mask:</td>
-            <td><input class="ip" id="mask-${intf}" type="text" minlength="7" maxlength="15" size="15" pattern="${ipPattern}" value="0.0.0.0" /></td>
-          </tr>
-          <tr>
-            <td>Router:</td>
-            <td><input class="ip" id="router-${intf}" type="text" minlength="7" maxlength="15" size="15" pattern="${ipPattern}" value="0.0.0.0" /></td>
-          </tr>
-          <tr>
-            <td colspan="2" style="text-align: right; width: 100%;">
-              <button onclick="applyConfig('${intf}', '${ifaceType}')">Apply</button>
-            </td>
-          </tr>
-        </table>
-      </div>
+function setClass(element, name, enabled) {
+  if (element.classList.contains(name) !== enabled) {
+    element.classList.toggle(name, enabled);
+  }
+}
+
+function createPanel(intf, ifaceType) {
+  let wifiSection = "";
+  if (ifaceType === "wifi") {
+    wifiSection = `
+      <tr>
+        <td colspan="2">
+          <h4>Available Networks</h4>
+          <div id="scan-list-${intf}">(Press scan to show the list of networks)</div>
+          <div style="display: flex; justify-content: right;"><button onclick="wifiScan('${intf}')">Scan</button></div>
+        </td>
+      </tr>
+      <tr>
+        <td>SSID:</td>
+        <td><input id="ssid-${intf}" type="text" value="" /></td>
+      </tr>
+      <tr>
+        <td>Password:</td>
+        <td><input id="passphrase-${intf}" type="password" value="" /></td>
+      </tr>
     `;
   }
+
+  let connectionOptions =
+    '<option value="disabled">Disabled</option><option value="static_ip">Static IP</option><option value="dynamic_ip">Dynamic IP</option><option value="dhcp_server">DHCP</option>';
+  if (ifaceType === "wifi") {
+    connectionOptions =
+      '<option value="disabled">Disabled</option><option value="station">Station</option><option value="ap">AP</option>';
+  } else if (ifaceType === "bond") {
+    connectionOptions =
+      '<option value="disabled">Disabled</option><option value="static_ip">Static IP</option><option value="dynamic_ip">Dynamic IP</option>';
+  }
+
+  const ipPattern = "^((25[0-5]|(2[0-4]|1\\d|[1-9]|)\\d)\\.?\\b){4}$";
+  const element = document.createElement("div");
+  element.className = "interface-block";
+  element.innerHTML = `
+    <h3 id="header-${intf}">${intf} - ${ifaceType}</h3>
+    <h4 id="status-message-${intf}"></h4>
+    <table>
+      <tr>
+        <td>Connection Type:</td>
+        <td>
+          <select id="connection-${intf}" onchange="connectionTypeChanged('${intf}')">
+            ${connectionOptions}
+          </select>
+        </td>
+      </tr>
+      ${wifiSection}
+      <tr>
+        <td>IP:</td>
+        <td><input class="ip" id="ip-${intf}" type="text" minlength="7" maxlength="15" size="15" pattern="${ipPattern}" value="0.0.0.0" /></td>
+      </tr>
+      <tr>
+        <td>Mask:</td>
+        <td><input class="ip" id="mask-${intf}" type="text" minlength="7" maxlength="15" size="15" pattern="${ipPattern}" value="0.0.0.0" /></td>
+      </tr>
+      <tr>
+        <td>Router:</td>
+        <td><input class="ip" id="router-${intf}" type="text" minlength="7" maxlength="15" size="15" pattern="${ipPattern}" value="0.0.0.0" /></td>
+      </tr>
+      <tr>
+        <td>Traffic:</td>
+        <td>
+          <canvas class="sparkline" id="traffic-${intf}" width="240" height="40"></canvas>
+          <div class="traffic-label" id="traffic-label-${intf}"></div>
+        </td>
+      </tr>
+      <tr>
+        <td colspan="2" style="text-align: right; width: 100%;">
+          <button onclick="applyConfig('${intf}', '${ifaceType}')">Apply</button>
+        </td>
+      </tr>
+    </table>
+  `;
+  return {
+    type: ifaceType,
+    element,
+    header: element.querySelector("h3"),
+    message: element.querySelector("h4"),
+    // Field id to the value last written by the refresh, a different value is a user edit
+    rendered: {},
+    // The configuration changed while the panel was being edited
+    stale: true,
+  };
 }
 
-async function refresh(interfaces, config, status) {
-  const container = document.getElementById("interfaces-container");
+function panelFields(intf, panel) {
+  const fields = [`connection-${intf}`, `ip-${intf}`, `mask-${intf}`, `router-${intf}`];
+  if (panel.type === "wifi") {
+    fields.push(`ssid-${intf}`, `passphrase-${intf}`);
+  }
+  return fields;
+}
+
+function isEditing(intf, panel) {
+  const focused = document.activeElement;
+  if (focused && panel.element.contains(focused) && ["INPUT", "SELECT", "TEXTAREA"].includes(focused.tagName)) {
+    return true;
+  }
+  return panelFields(intf, panel).some(
+    (id) => id in panel.rendered && document.getElementById(id).value !== panel.rendered[id]
+  );
+}
+
+function markApplied(intf) {
+  // The submitted values are the new baseline, the next configuration payload is rendered
+  const panel = panels.get(intf);
+  if (!panel) {
+    return;
+  }
+  for (const id of panelFields(intf, panel)) {
+    panel.rendered[id] = document.getElementById(id).value;
+  }
+  panel.stale = true;
+  model.config = null;
+}
 
-  const focusedElement = document.activeElement;
-  for (const intf of interfaces) {
-    const ifaceConfig = config[intf] || {};
-    const ifaceType = ifaceConfig.type || "undefined";
-    const ifaceConnType = ifaceConfig.connection_type || "disabled";
-    const ifaceStatus = status[intf] || {};
-    const ifaceStatusError = ifaceStatus.error;
-    const ifaceStatusStatus = ifaceStatus.status || "";
-    const ifaceStatusMessage = ifaceStatus.message || "";
-
-    document.getElementById(
-      `header-${intf}`
-    ).innerHTML = `${intf} - ${ifaceType} (${ifaceStatusStatus})`;
-    document.getElementById(
-      `status-message-${intf}`
-    ).innerHTML = `${ifaceStatusMessage}`;
-    if (ifaceStatusError) {
-      document.getElementById(`status-message-${intf}`).classList.add("error");
-    } else {
-      document.getElementById(`status-message-${intf}`).classList.remove("error");
-    }    
-
-    var edited = false;
-    const connection_type = document.getElementById(`connection-${intf}`);
-    const ip = document.getElementById(`ip-${intf}`);
-    const mask = document.getElementById(`mask-${intf}`);
-    const router = document.getElementById(`router-${intf}`);
-    if (
-      focusedElement === ip ||
-      focusedElement === mask ||
-      focusedElement === router ||
-      focusedElement === connection_type
-    ) {
-      edited = true;
+function renderPanels(interfaces, config) {
+  const container = document.getElementById("interfaces-container");
+  for (const [intf, panel] of panels) {
+    if (!interfaces.includes(intf)) {
+      panel.element.remove();
+      panels.delete(intf);
     }
-    if (ifaceType === "wifi") {
-      const ssid = document.getElementById(`ssid-${intf}`);
-      const passphrase = document.getElementById(`passphrase-${intf}`);
-      const ssidSelected = document.getElementById(`wifi-scan-select-${intf}`);
-      if (
-        focusedElement === ssid ||
-        focusedElement === passphrase ||
-        focusedElement === ssidSelected
-      ) {
-        edited = true;
-      }
+  }
+  interfaces.forEach((intf, index) => {
+    const ifaceType = (config[intf] || {}).type || "undefined";
+    let panel = panels.get(intf);
+    if (panel && panel.type !== ifaceType) {
+      panel.element.remove();
+      panel = undefined;
     }
-
-    if (!edited) {
-      ip.value = `${ifaceConfig.ip || ""}`;
-      mask.value = `${ifaceConfig.mask || ""}`;
-      router.value = `${ifaceConfig.route || ""}`;
-      connection_type.value = ifaceConnType;
+    if (!panel) {
+      panel = createPanel(intf, ifaceType);
+      panels.set(intf, panel);
     }
-    if (ifaceType === "wifi") {
-      const ssid = document.getElementById(`ssid-${intf}`);
-      const passphrase = document.getElementById(`passphrase-${intf}`);
-      if (!edited) {
-        ssid.value = `${ifaceConfig.ssid || ""}`;
-        passphrase.value = `${ifaceConfig.passphrase || ""}`;
-      }
+    if (container.children[index] !== panel.element) {
+      container.insertBefore(panel.element, container.children[index] || null);
     }
+  });
+}
 
-    connectionTypeChanged(intf);
+function renderFields(intf, panel, ifaceConfig) {
+  const values = {
+    [`connection-${intf}`]: ifaceConfig.connection_type || "disabled",
+    [`ip-${intf}`]: `${ifaceConfig.ip || ""}`,
+    [`mask-${intf}`]: `${ifaceConfig.mask || ""}`,
+    [`router-${intf}`]: `${ifaceConfig.route || ""}`,
+  };
+  if (panel.type === "wifi") {
+    values[`ssid-${intf}`] = `${ifaceConfig.ssid || ""}`;
+    values[`passphrase-${intf}`] = `${ifaceConfig.passphrase || ""}`;
   }
+  for (const [id, value] of Object.entries(values)) {
+    const element = document.getElementById(id);
+    if (element.value !== value) {
+      element.value = value;
+    }
+    // A select keeps its value if the option does not exist, compare with what it shows
+    panel.rendered[id] = element.value;
+  }
+  panel.stale = false;
+  connectionTypeChanged(intf);
+}
+
+function renderStatus(intf, panel, ifaceStatus) {
+  setText(panel.header, `${intf} - ${panel.type} (${ifaceStatus.status || ""})`);
+  setText(panel.message, `${ifaceStatus.message || ""}`);
+  setClass(panel.message, "error", Boolean(ifaceStatus.error));
 }
 
 function connectionTypeChanged(intf) {
   const connectionType = document.getElementById(`connection-${intf}`).value;
-  const ip = document.getElementById(`ip-${intf}`);
-  const mask = document.getElementById(`mask-${intf}`);
-  const router = document.getElementById(`router-${intf}`);
-
-  if (connectionType === "dynamic_ip" || connectionType === "station" || connectionType === "disabled") {
-    ip.disabled = true;
-    mask.disabled = true;
-    router.disabled = true;
-  } else {
-    ip.disabled = false;
-    mask.disabled = false;
-    router.disabled = false;
+  const disabled = connectionType === "dynamic_ip" || connectionType === "station" || connectionType === "disabled";
+
+  for (const field of ["ip", "mask", "router"]) {
+    const element = document.getElementById(`${field}-${intf}`);
+    if (element.disabled !== disabled) {
+      element.disabled = disabled;
+    }
   }
 }
 
 async function connectToWifi(ssid) {
   const password = prompt(`Enter password for ${ssid}`);
   if (password !== null) {
-    await fetch(`api/param/wifi/connect`, {
+    await fetch(apiUrl("param/wifi/connect"), {
       method: "POST",
       body: JSON.stringify({ ssid, password }),
     });
@@ -270,35 +321,173 @@ async function connectToWifi(ssid) {
 async function connectToWifiManual(intf) {
   const ssid = document.getElementById(`ssid-${intf}`).value;
   const password = document.getElementById(`password-${intf}`).value;
-  await fetch(`api/param/${intf}/wifi/connect`, {
+  await fetch(apiUrl(`param/${intf}/wifi/connect`), {
     method: "POST",
     body: JSON.stringify({ ssid, password }),
   });
   alert(`Connecting to ${ssid}`);
 }
 
+function formatRate(bytesPerSecond) {
+  const bits = bytesPerSecond * 8;
+  if (bits >= 1e6) {
+    return `${(bits / 1e6).toFixed(1)} Mbit/s`;
+  }
+  if (bits >= 1e3) {
+    return `${(bits / 1e3).toFixed(1)} kbit/s`;
+  }
+  return `${bits.toFixed(0)} bit/s`;
+}
+
+function drawSparkline(canvas, series, colors) {
+  const ctx = canvas.getContext("2d");
+  ctx.clearRect(0, 0, canvas.width, canvas.height);
+  const max = Math.max(1, ...series.flat());
+  series.forEach((values, idx) => {
+    if (values.length < 2) {
+      return;
+    }
+    const step = canvas.width / (values.length - 1);
+    ctx.strokeStyle = colors[idx];
+    ctx.lineWidth = 1.5;
+    ctx.beginPath();
+    values.forEach((value, i) => {
+      const y = canvas.height - (value / max) * (canvas.height - 2) - 1;
+      if (i === 0) {
+        ctx.moveTo(0, y);
+      } else {
+        ctx.lineTo(i * step, y);
+      }
+    });
+    ctx.stroke();
+  });
+}
+
+// Series drawn on each canvas, a canvas is only redrawn when its series changed
+const drawnTraffic = new WeakMap();
+var trafficRefreshing = false;
+
+async function refreshTraffic(interfaces) {
+  // On slow devices a refresh can take longer than the period, don't start another one
+  if (trafficRefreshing) {
+    return;
+  }
+  trafficRefreshing = true;
+  try {
+    for (const intf of interfaces) {
+      const canvas = document.getElementById(`traffic-${intf}`);
+      if (!canvas) {
+        continue;
+      }
+      const requestHost = host;
+      const { status, response } = await fetchData(
+        apiUrl(`stats/${intf}?tier=second&counters=rx_bytes,tx_bytes`)
+      );
+      if (!status || requestHost !== host) {
+        continue;
+      }
+      const rx = response.rates.rx_bytes.slice(-120);
+      const tx = response.rates.tx_bytes.slice(-120);
+      const series = JSON.stringify([rx, tx]);
+      if (drawnTraffic.get(canvas) === series) {
+        continue;
+      }
+      drawnTraffic.set(canvas, series);
+      drawSparkline(canvas, [rx, tx], ["#007bff", "#e63946"]);
+      setText(document.getElementById(`traffic-label-${intf}`),
+        `RX ${formatRate(rx[rx.length - 1] || 0)} / TX ${formatRate(tx[tx.length - 1] || 0)}`);
+    }
+  } finally {
+    trafficRefreshing = false;
+  }
+}
+
 var connected = false;
 
 async function periodicRefresh() {
-  const interfaces = (await fetchData("api/interfaces")).response;
-  const config = (await fetchData("api/config")).response;
-  const status = (await fetchData("api/status")).response;
+  const requestHost = host;
+  const [interfaces, config, status] = await Promise.all([
+    fetchData(apiUrl("interfaces")),
+    fetchData(apiUrl("config")),
+    fetchData(apiUrl("status")),
+  ]);
+  // The payloads of the previously selected host are dropped
+  if (requestHost !== host) {
+    return;
+  }
+  const container = document.getElementById("interfaces-container");
 
-  if (!connected) {
-    if (interfaces && config && status) {
-      loadInterfaces(interfaces, config, status);
-      refresh(interfaces, config, status);
-      connected = true;
-    }
-  } else {
-    if (!config || !status) {
-      const container = document.getElementById("interfaces-container");
+  if (!interfaces.status || !config.status || !status.status) {
+    if (connected) {
+      panels.clear();
+      model.interfaces = model.config = model.status = null;
       container.innerHTML = '<p class="disconnected">Disconnected</p>';
       connected = false;
     }
-    refresh(interfaces, config, status);
+    return;
+  }
+  if (!connected) {
+    container.replaceChildren();
+    connected = true;
+  }
+
+  const payloads = {
+    interfaces: JSON.stringify(interfaces.response),
+    config: JSON.stringify(config.response),
+    status: JSON.stringify(status.response),
+  };
+  const layoutChanged = payloads.interfaces !== model.interfaces || payloads.config !== model.config;
+  const configChanged = payloads.config !== model.config;
+  const statusChanged = payloads.status !== model.status;
+
+  if (layoutChanged) {
+    renderPanels(interfaces.response, config.response);
+  }
+  for (const intf of interfaces.response) {
+    const panel = panels.get(intf);
+    if (configChanged) {
+      panel.stale = true;
+    }
+    // The fields of a panel being edited are left alone until the edit is applied or undone
+    if (panel.stale && !isEditing(intf, panel)) {
+      renderFields(intf, panel, config.response[intf] || {});
+    }
+    if (statusChanged || layoutChanged) {
+      renderStatus(intf, panel, status.response[intf] || {});
+    }
+  }
+  Object.assign(model, payloads);
+
+  refreshTraffic(interfaces.response);
+}
+
+function hostChanged() {
+  host = document.getElementById("host-select").value;
+  panels.clear();
+  model.interfaces = model.config = model.status = null;
+  document.getElementById("interfaces-container").textContent = "Loading interfaces...";
+  connected = false;
+  periodicRefresh();
+}
+
+// In fleet mode (/api/hosts answers) every host has its own API, the selected host is shown
+async function loadHosts() {
+  const { status, response } = await fetchData("api/hosts");
+  if (!status || !Array.isArray(response) || response.length === 0) {
+    return;
+  }
+  const select = document.getElementById("host-select");
+  for (const name of response) {
+    const option = document.createElement("option");
+    option.value = name;
+    option.textContent = name;
+    select.appendChild(option);
   }
+  host = response[0];
+  document.getElementById("host-selector").hidden = false;
 }
 
-setInterval(periodicRefresh, 2000);
-periodicRefresh();
+loadHosts().then(() => {
+  setInterval(periodicRefresh, 2000);
+  periodicRefresh();
+});